@@ -0,0 +1,3 @@
+"""
+Benchmarks of the permission hot paths, run by ``runbenchmarks.py``.
+"""
@@ -0,0 +1,91 @@
+"""
+Filter permissions on querysets and objects, and decoding of filters.
+"""
+
+from rest_framework_fine_permissions.codec import decode, encode
+from rest_framework_fine_permissions.filters import FilterPermissionBackend
+from rest_framework_fine_permissions.permissions import FilterPermission
+from rest_framework_fine_permissions.qcache import (
+    filter_digest, load_filter, q_cache)
+from rest_framework_fine_permissions.serializers import QSerializer
+
+from django.db.models import Q
+
+from tests.models import Service
+
+from .fixtures import get_data, get_request
+from .utils import benchmark
+
+
+def large_filter(children):
+    """ Return a filter made of many nested lookups. """
+    q = Q()
+    for i in range(children):
+        q |= Q(name__startswith='service%s' % i) & ~Q(id__in=[i, i + 1])
+    return q
+
+
+@benchmark('qserializer', params=(1, 50))
+def loads(children):
+    legacy = QSerializer(base64=True).dumps(large_filter(children))
+    data = encode(large_filter(children))
+    # computed once by the snapshot loading the filter
+    digest = filter_digest(data)
+
+    def cached():
+        return load_filter(data, digest)
+
+    def uncached():
+        q_cache.clear()
+        return load_filter(data, digest)
+
+    return {
+        'baseline': lambda: QSerializer(base64=True).loads(legacy),
+        'compact': lambda: decode(data),
+        'load_filter': cached,
+        'load_filter miss': uncached,
+    }
+
+
+@benchmark('filter', params=(10, 1000))
+def filter_queryset(rows):
+    data = get_data()
+    backend = FilterPermissionBackend()
+    queryset = Service.objects.order_by('pk')
+
+    def filtered(user):
+        def run():
+            return list(backend.filter_queryset(
+                get_request(user), queryset, None)[:rows])
+        return run
+
+    return {
+        'baseline': lambda: list(queryset[:rows]),
+        'without filter': filtered(data['user']),
+        'with filter': filtered(data['filtered_user']),
+    }
+
+
+@benchmark('permission', params=(10, 1000))
+def object_permission(rows):
+    data = get_data()
+    permission = FilterPermission()
+    objects = list(Service.objects.order_by('pk')[:rows])
+
+    def check(user):
+        def run():
+            request = get_request(user)
+            return [obj for obj in objects if permission
+                    .has_object_permission(request, None, obj)]
+        return run
+
+    def batch():
+        return FilterPermission.filter_permitted(
+            data['filtered_user'], objects)
+
+    return {
+        'baseline': lambda: list(objects),
+        'without filter': check(data['user']),
+        'with filter': check(data['filtered_user']),
+        'filter_permitted': batch,
+    }
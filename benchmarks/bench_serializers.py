@@ -0,0 +1,93 @@
+"""
+Rendering of ModelPermissionsSerializer compared to a plain ModelSerializer.
+"""
+
+from rest_framework import serializers as drf_serializers
+from rest_framework_fine_permissions.serializers import (
+    ModelPermissionsSerializer)
+
+from tests import serializers
+from tests.models import Card, Service
+
+from .fixtures import get_data, get_request
+from .utils import benchmark
+
+
+class BaselineServiceSerializer(drf_serializers.ModelSerializer):
+
+    class Meta:
+        model = Service
+        fields = '__all__'
+
+
+class BaselineCardSerializer(drf_serializers.ModelSerializer):
+
+    service_names = BaselineServiceSerializer(source='services', many=True)
+
+    class Meta:
+        model = Card
+        fields = ('id', 'service_names')
+
+
+def nested_serializers(depth):
+    """ Return a fine permissions and a plain serializer of given depth. """
+    meta = {'model': Card, 'fields': '__all__', 'depth': depth}
+    return (
+        type('CardDepthSerializer', (ModelPermissionsSerializer,),
+             {'Meta': type('Meta', (), meta)}),
+        type('BaselineCardDepthSerializer', (drf_serializers.ModelSerializer,),
+             {'Meta': type('Meta', (), meta)}),
+    )
+
+
+def _render(serializer_cls, queryset, user=None):
+    def render():
+        context = {'request': get_request(user)} if user else {}
+        return serializer_cls(queryset.all(), many=True, context=context).data
+    return render
+
+
+@benchmark('serializer', params=(10, 1000, 10000))
+def list_rendering(rows):
+    data = get_data()
+    queryset = Service.objects.order_by('pk')[:rows]
+    return {
+        'baseline': _render(BaselineServiceSerializer, queryset),
+        'fine permissions': _render(
+            serializers.ServiceSerializer, queryset, data['user']),
+        'superuser': _render(
+            serializers.ServiceSerializer, queryset, data['superuser']),
+    }
+
+
+@benchmark('serializer', params=(0, 1, 2))
+def nesting_depth(depth):
+    data = get_data()
+    queryset = Card.objects.order_by('pk')[:100]
+    serializer_cls, baseline_cls = nested_serializers(depth)
+    return {
+        'baseline': _render(baseline_cls, queryset),
+        'fine permissions': _render(serializer_cls, queryset, data['user']),
+    }
+
+
+@benchmark('field', params=(10, 100))
+def many_relations(rows):
+    data = get_data()
+    queryset = Card.objects.order_by('pk')[:rows]
+
+    class CardSerializer(ModelPermissionsSerializer):
+        service_names = serializers.fields.ModelPermissionsField(
+            serializers.ServiceSerializer, source='services')
+
+        class Meta:
+            model = Card
+            fields = ('id', 'service_names')
+
+    return {
+        'baseline': _render(BaselineCardSerializer, queryset),
+        'fine permissions': _render(CardSerializer, queryset, data['user']),
+        'prefetched': _render(CardSerializer,
+                              queryset.prefetch_related('services'),
+                              data['user']),
+    }
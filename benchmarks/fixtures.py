@@ -0,0 +1,78 @@
+"""
+Data shared by the benchmarks, created once.
+"""
+
+import datetime
+
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.models import (
+    FieldPermission, FilterPermissionModel, UserFieldPermissions)
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.http import HttpRequest
+
+from tests.models import Account, Card, Service, TestUser
+
+MAX_ROWS = 10000
+ACCOUNTS = 1000
+SERVICES_PER_CARD = 3
+
+_data = {}
+
+
+def _grant_all_fields(user):
+    """ Grant every field of the tests models to a user. """
+    ufp = UserFieldPermissions.objects.create(user=user)
+    for model, names in (
+            (Card, ('id', 'account', 'services', 'service_names')),
+            (Account, ('id', 'user', 'expired_date', 'cards')),
+            (TestUser, ('id', 'username')),
+            (Service, ('id', 'name'))):
+        ct = ContentType.objects.get_for_model(model)
+        ufp.permissions.add(*[
+            FieldPermission.objects.create(content_type=ct, name=name)
+            for name in names])
+
+
+def get_data():
+    """ Create the benchmark data on first call. """
+    if _data:
+        return _data
+
+    test_users = TestUser.objects.bulk_create(
+        TestUser(username='user%s' % i) for i in range(ACCOUNTS))
+    accounts = Account.objects.bulk_create(
+        Account(user=test_user, expired_date=datetime.datetime(2030, 1, 1))
+        for test_user in test_users)
+    services = Service.objects.bulk_create(
+        Service(name='service%s' % i) for i in range(MAX_ROWS))
+    cards = Card.objects.bulk_create(
+        Card(account=accounts[i % ACCOUNTS]) for i in range(MAX_ROWS))
+    Card.services.through.objects.bulk_create(
+        Card.services.through(card=card,
+                              service=services[(i + j) % MAX_ROWS])
+        for i, card in enumerate(cards) for j in range(SERVICES_PER_CARD))
+
+    user = User.objects.create(username='bench')
+    _grant_all_fields(user)
+    filtered_user = User.objects.create(username='bench_filtered')
+    _grant_all_fields(filtered_user)
+    FilterPermissionModel.objects.create(
+        user=filtered_user,
+        content_type=ContentType.objects.get_for_model(Service),
+        filter=encode(
+            Q(name__startswith='service1') | Q(id__lte=500)))
+
+    _data.update(user=user, filtered_user=filtered_user,
+                 superuser=User.objects.create(username='bench_admin',
+                                               is_superuser=True))
+    return _data
+
+
+def get_request(user):
+    """ Return a new request, so that no permission is shared. """
+    request = HttpRequest()
+    request.user = user
+    return request
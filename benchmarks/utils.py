@@ -0,0 +1,80 @@
+"""
+"""
+
+import gc
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+Result = namedtuple('Result', ['group', 'scenario', 'variant', 'seconds',
+                               'queries', 'peak_memory'])
+
+BENCHMARKS = []
+
+
+def benchmark(group, params=(None,)):
+    """ Register a scenario, run once for each parameter.
+
+    The decorated function receives the parameter and returns a mapping of
+    variant names to callables, the ``baseline`` variant being the
+    reference the others are compared to.
+    """
+    def decorator(func):
+        BENCHMARKS.append((group, func, params))
+        return func
+    return decorator
+
+
+def measure(func, repeat):
+    """ Return the best time, the query count and the peak memory. """
+    func()  # warm up the caches of django and rest framework
+
+    with CaptureQueriesContext(connection) as queries:
+        func()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(queries), peak_memory
+
+
+def run(repeat=3, select=None):
+    """ Run the registered scenarios and yield their results. """
+    for group, func, params in BENCHMARKS:
+        for param in params:
+            scenario = func.__name__ if param is None \
+                else '%s[%s]' % (func.__name__, param)
+            if select and select not in '%s.%s' % (group, scenario):
+                continue
+            for variant, variant_func in func(param).items():
+                yield Result(group, scenario, variant,
+                             *measure(variant_func, repeat))
+
+
+def format_results(results):
+    """ Format results as a table, with the ratio to the baseline. """
+    lines = ['%-12s %-32s %-20s %12s %8s %12s %8s' % (
+        'group', 'scenario', 'variant', 'time (ms)', 'queries',
+        'memory (kB)', 'ratio')]
+    baselines = {(r.group, r.scenario): r.seconds
+                 for r in results if r.variant == 'baseline'}
+    for r in results:
+        baseline = baselines.get((r.group, r.scenario))
+        ratio = '%.2fx' % (r.seconds / baseline) if baseline else '-'
+        lines.append('%-12s %-32s %-20s %12.3f %8d %12.1f %8s' % (
+            r.group, r.scenario, r.variant, r.seconds * 1000, r.queries,
+            r.peak_memory / 1024, ratio))
+    return '\n'.join(lines)
@@ -5,14 +5,36 @@ from django import forms
 from django.contrib import admin
 from django.contrib.admin.widgets import FilteredSelectMultiple
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldError
 from django.db.models import Q
 from django.utils.html import format_html, format_html_join
 
-from .fields import ModelPermissionsField
+from .bulk import get_content_type_ids, get_field_permission_ids
+from .codec import decode, encode
+from .conf import get_setting
 from .models import (
-    FieldPermission, FilterPermissionModel, UserFieldPermissions)
-from .utils import get_field_permissions
+    FilterPermissionModel, GroupFieldPermissions, GroupFilterPermissionModel,
+    UserFieldPermissions)
+from .resolver import resolve_filter
+from .utils import get_registry
 from .serializers import QSerializer
+from .widgets import ContentTypeAutocomplete, FieldPermissionsAutocomplete
+
+
+def _autocomplete(field, widget):
+    """ Replace the widget of a form field by an autocomplete one. """
+    widget.is_required = field.required
+    field.widget = widget
+
+
+class FieldPermissionsChoiceField(forms.MultipleChoiceField):
+
+    """
+    choices of the registry, checked without scanning all of them
+    """
+
+    def valid_value(self, value):
+        return value in get_registry().serializers
 
 
 class UserFieldPermissionsForm(forms.ModelForm):
@@ -20,7 +42,7 @@ class UserFieldPermissionsForm(forms.ModelForm):
     """
     """
 
-    permissions = forms.MultipleChoiceField(
+    permissions = FieldPermissionsChoiceField(
         widget=FilteredSelectMultiple(
             verbose_name='User field permissions',
             is_stacked=False,
@@ -34,24 +56,17 @@ class UserFieldPermissionsForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(UserFieldPermissionsForm, self).__init__(*args, **kwargs)
 
-        # Choices
-        def choice_str(model, field, sep):
-            return '{model[0]}{sep}{model[1]}{sep}{field}'\
-                .format(model=model.split('.'), field=field, sep=sep)
-
-        choices = []
-        self.field_permissions = get_field_permissions()
-        self.field_serializers = {}
-
-        for model, values in self.field_permissions.items():
-            fields, ser = values
-            choices += [(
-                choice_str(model, field, '.'),
-                choice_str(model, field, ' | '))
-                for field in fields]
-            self.field_serializers.update(
-                {choice_str(model, field, '.'): ser for field in fields})
-        self.fields['permissions'].choices = sorted(choices)
+        # Choices, built once
+        registry = get_registry()
+        self.field_permissions = registry.field_permissions
+        self.field_serializers = registry.serializers
+        self.nested_serializers = registry.nested_serializers
+        if get_setting('ADMIN_AUTOCOMPLETE'):
+            # only the selected choices are rendered
+            _autocomplete(self.fields['permissions'],
+                          FieldPermissionsAutocomplete())
+        else:
+            self.fields['permissions'].choices = registry.choices
 
         # Initial datas
         instance = kwargs.get('instance')
@@ -66,36 +81,36 @@ class UserFieldPermissionsForm(forms.ModelForm):
 
     def clean(self):
         cleaned = self.cleaned_data
-        field_permissions = []
+        permissions = [permission.split('.')
+                       for permission in cleaned.get('permissions', [])]
+
+        # a query for the content types, one or two for the permissions
+        ct_ids = get_content_type_ids(
+            (app_label, model_name) for app_label, model_name, _ in permissions)
+        unknown = {'%s.%s' % key for key in
+                   {(app_label, model_name)
+                    for app_label, model_name, _ in permissions} - set(ct_ids)}
+        if unknown:
+            raise forms.ValidationError(
+                'Unknown models: %s' % ', '.join(sorted(unknown)))
+        fp_ids = get_field_permission_ids(
+            (ct_ids[app_label, model_name], field_name)
+            for app_label, model_name, field_name in permissions)
+        field_permissions = [
+            fp_ids[ct_ids[app_label, model_name], field_name]
+            for app_label, model_name, field_name in permissions]
+
+        # Check for each added permission if there is a recursive call
+        # between two ModelPermissionsField fields
         model_perms = {}
         conflicts = []
-
         for permission in cleaned.get('permissions', []):
-            app_label, model_name, field_name = permission.split('.')
-            ct = ContentType.objects.get_by_natural_key(app_label, model_name)
-            fp = FieldPermission.objects.get_or_create(
-                content_type=ct,
-                name=field_name
-            )[0]
-            field_permissions.append(fp.pk)
-
-            # Check for each added permission if there is a recursive call
-            # between two ModelPermissionsField fields
-            app = '%s.%s' % (app_label, model_name)
-            values = self.field_permissions.get(app)
-            fields = values[0] if values else []
-
-            if field_name in fields:
-                field = self.field_permissions.get(app)
-                field = field[0][field_name] if field else None
-
-                if isinstance(field, ModelPermissionsField):
-                    name = '{0.__module__}.{0.__name__}'.format(
-                        field.serializer)
-                    model_perms[self.field_serializers[permission]] = permission
-
-                    if name in model_perms:
-                        conflicts.append((permission, model_perms[name]))
+            name = self.nested_serializers.get(permission)
+            if name is not None:
+                model_perms[self.field_serializers[permission]] = permission
+
+                if name in model_perms:
+                    conflicts.append((permission, model_perms[name]))
 
         if conflicts:
             raise forms.ValidationError(
@@ -117,10 +132,39 @@ class UserFieldPermissionsAdmin(admin.ModelAdmin):
     """
     """
     list_display = ('user', )
+    list_select_related = ('user',)
     form = UserFieldPermissionsForm
     ordering = ('user__username',)
 
 
+class GroupFieldPermissionsForm(UserFieldPermissionsForm):
+
+    """
+    field permissions shared by the members of a group
+    """
+
+    permissions = FieldPermissionsChoiceField(
+        widget=FilteredSelectMultiple(
+            verbose_name='Group field permissions',
+            is_stacked=False,
+        )
+    )
+
+    class Meta:
+        model = GroupFieldPermissions
+        exclude = ()
+
+
+class GroupFieldPermissionsAdmin(admin.ModelAdmin):
+
+    """
+    """
+    list_display = ('group', )
+    list_select_related = ('group',)
+    form = GroupFieldPermissionsForm
+    ordering = ('group__name',)
+
+
 class ContentTypeChoiceField(forms.ModelChoiceField):
     def label_from_instance(self, obj):
         return "%s | %s" % (obj.app_label, obj.model)
@@ -132,6 +176,8 @@ class UserFilterPermissionsForm(forms.ModelForm):
     """
 
     current_filter = forms.CharField(required=False)
+    # edited as indented json, stored with the compact codec
+    filter = forms.CharField(widget=forms.Textarea)
     content_type = ContentTypeChoiceField(
         queryset=ContentType.objects.all().order_by('app_label', 'model'))
 
@@ -141,6 +187,9 @@ class UserFilterPermissionsForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super(UserFilterPermissionsForm, self).__init__(*args, **kwargs)
+        if get_setting('ADMIN_AUTOCOMPLETE'):
+            _autocomplete(self.fields['content_type'],
+                          ContentTypeAutocomplete())
 
         # Initial datas
         instance = kwargs.get('instance')
@@ -148,7 +197,7 @@ class UserFilterPermissionsForm(forms.ModelForm):
         self.fields['current_filter'].widget.attrs['size'] = 130
 
         if instance:
-            myq = QSerializer(base64=True).loads(instance.filter)
+            myq = decode(instance.filter)
             current_filter = myq.__str__()
         else:
             myq = Q(myfield="myvalue")
@@ -169,11 +218,22 @@ class UserFilterPermissionsForm(forms.ModelForm):
                 raise forms.ValidationError(
                     "filter is not a valid entry for a q object !")
             else:
-                if isinstance(myq, Q):
-                    data = QSerializer(base64=True).dumps(myq)
-                else:
+                if not isinstance(myq, Q):
                     raise forms.ValidationError("filter is not a q object !")
 
+            content_type = self.cleaned_data.get('content_type')
+            plans = None
+            if content_type is not None:
+                model = content_type.model_class()
+                if model is None:
+                    raise forms.ValidationError(
+                        "the model of this content type is not installed !")
+                try:
+                    plans = resolve_filter(myq, model)
+                except FieldError as e:
+                    raise forms.ValidationError(str(e))
+            data = encode(myq, plans)
+
         return data
 
     def save(self, commit=True):
@@ -191,8 +251,31 @@ class UserFilterPermissionsAdmin(admin.ModelAdmin):
     filter permissions admin
     """
     list_display = ('user', 'content_type')
+    list_select_related = ('user', 'content_type')
     form = UserFilterPermissionsForm
 
 
+class GroupFilterPermissionsForm(UserFilterPermissionsForm):
+    """
+    filter permissions of a group, combined with the other filters of its
+    members
+    """
+
+    class Meta:
+        model = GroupFilterPermissionModel
+        exclude = []
+
+
+class GroupFilterPermissionsAdmin(admin.ModelAdmin):
+    """
+    group filter permissions admin
+    """
+    list_display = ('group', 'content_type')
+    list_select_related = ('group', 'content_type')
+    form = GroupFilterPermissionsForm
+
+
 admin.site.register(UserFieldPermissions, UserFieldPermissionsAdmin)
+admin.site.register(GroupFieldPermissions, GroupFieldPermissionsAdmin)
 admin.site.register(FilterPermissionModel, UserFilterPermissionsAdmin)
+admin.site.register(GroupFilterPermissionModel, GroupFilterPermissionsAdmin)
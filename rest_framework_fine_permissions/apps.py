@@ -5,3 +5,6 @@ class FinePermissionsConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'rest_framework_fine_permissions'
     verbose_name = 'Rest Framework Fine Permissions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
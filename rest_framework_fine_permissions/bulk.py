@@ -0,0 +1,262 @@
+""" Bulk loading and dumping of the permissions of many users.
+
+Records are the objects written by ``fine_permissions_dump``::
+
+    {"username": "john", "fields_permissions": [
+        {"app_label": "tests", "model": "account", "name": "user"}],
+     "filters_permissions": [
+        {"app_label": "auth", "model": "user", "filter": {"v": 2, ...}}]}
+
+Filters are only dumped on demand. Only the permissions granted to users
+are dumped and loaded, not the ones of groups. A file holds a single record,
+a list of records, or one record per line (JSON Lines) which is read as a
+stream.
+"""
+
+import heapq
+import json
+from functools import partial
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from .cache import invalidate_filters, invalidate_users
+from .codec import upgrade
+from .conf import get_setting
+from .materialized import refresh_users
+from .models import (
+    FieldPermission, FilterPermissionModel, UserFieldPermissions)
+
+CHUNK_SIZE = 1000
+
+
+def read_records(stream):
+    """ Iterate over the records of a file, JSON Lines are not read at once.
+    """
+    for first in stream:
+        if first.strip():
+            break
+    else:
+        return
+
+    try:
+        record = json.loads(first)
+    except ValueError:
+        # the first line of an indented document
+        record = None
+    if isinstance(record, dict):
+        yield record
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    data = json.loads(first + stream.read())
+    if isinstance(data, dict):
+        yield data
+    else:
+        yield from data
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def get_content_type_ids(natural_keys):
+    """ Return the ids of content types by ``(app_label, model)`` with a
+    query, the unknown ones are left out. """
+    natural_keys = set(natural_keys)
+    if not natural_keys:
+        return {}
+    return {
+        (app_label, model): pk
+        for pk, app_label, model in ContentType.objects.filter(
+            app_label__in={app_label for app_label, _ in natural_keys},
+            model__in={model for _, model in natural_keys},
+        ).values_list('pk', 'app_label', 'model')
+        if (app_label, model) in natural_keys}
+
+
+def get_field_permission_ids(keys):
+    """ Return the ids of field permissions by ``(content_type_id, name)``,
+    the missing ones are created. """
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    def fetch(keys):
+        ids = {}
+        # the oldest permission wins over duplicates
+        for pk, ct_id, name in FieldPermission.objects.filter(
+                content_type_id__in={ct_id for ct_id, _ in keys},
+                name__in={name for _, name in keys},
+        ).order_by('-pk').values_list('pk', 'content_type_id', 'name'):
+            if (ct_id, name) in keys:
+                ids[ct_id, name] = pk
+        return ids
+
+    ids = fetch(keys)
+    created = FieldPermission.objects.bulk_create([
+        FieldPermission(content_type_id=ct_id, name=name)
+        for ct_id, name in sorted(keys - set(ids))])
+    if any(permission.pk is None for permission in created):
+        # the database doesn't return the ids of inserted rows
+        ids = fetch(keys)
+    else:
+        ids.update(((permission.content_type_id, permission.name),
+                    permission.pk) for permission in created)
+    return ids
+
+
+def get_user_field_permissions_ids(user_ids):
+    """ Return the ids of the user field permissions by user id, the missing
+    ones are created. """
+    user_ids = set(user_ids)
+
+    def fetch():
+        return dict(UserFieldPermissions.objects.filter(
+            user_id__in=user_ids).values_list('user_id', 'pk'))
+
+    ids = fetch()
+    created = UserFieldPermissions.objects.bulk_create([
+        UserFieldPermissions(user_id=user_id)
+        for user_id in user_ids - set(ids)])
+    if any(ufp.pk is None for ufp in created):
+        ids = fetch()
+    else:
+        ids.update((ufp.user_id, ufp.pk) for ufp in created)
+    return ids
+
+
+def _get_users(usernames):
+    User = get_user_model()
+    users = dict(User._default_manager.filter(**{
+        '%s__in' % User.USERNAME_FIELD: usernames,
+    }).values_list(User.USERNAME_FIELD, 'pk'))
+    unknown = set(usernames) - set(users)
+    if unknown:
+        raise User.DoesNotExist("These users don't exist in the database: %s"
+                                % ', '.join(sorted(unknown)))
+    return users
+
+
+def load_chunk(records, username=None, replace=False):
+    """ Grant the permissions of some records in a transaction.
+
+    ``username`` overrides the user of the records, their former field
+    permissions are removed first with ``replace``, their filters replace
+    the ones on the same models.
+    """
+    through = UserFieldPermissions.permissions.through
+    with transaction.atomic():
+        users = _get_users({username or record['username']
+                            for record in records})
+        grants = {user_id: set() for user_id in users.values()}
+        for record in records:
+            keys = grants[users[username or record['username']]]
+            for field in record.get('fields_permissions', ()):
+                # content types are cached by their manager
+                content_type = ContentType.objects.get_by_natural_key(
+                    field['app_label'], field['model'])
+                keys.add((content_type.pk, field['name']))
+
+        permission_ids = get_field_permission_ids(
+            set().union(*grants.values()))
+        ufp_ids = get_user_field_permissions_ids(grants)
+        if replace:
+            through.objects.filter(
+                userfieldpermissions_id__in=ufp_ids.values()).delete()
+        through.objects.bulk_create([
+            through(userfieldpermissions_id=ufp_ids[user_id],
+                    fieldpermission_id=permission_ids[key])
+            for user_id, keys in grants.items() for key in sorted(keys)
+        ], ignore_conflicts=True)
+
+        filters = {}
+        for record in records:
+            user_id = users[username or record['username']]
+            for item in record.get('filters_permissions', ()):
+                content_type = ContentType.objects.get_by_natural_key(
+                    item['app_label'], item['model'])
+                filters[user_id, content_type.pk] = upgrade(item['filter'])
+        if filters:
+            FilterPermissionModel.objects.bulk_create([
+                FilterPermissionModel(user_id=user_id, content_type_id=ct_id,
+                                      filter=data)
+                for (user_id, ct_id), data in filters.items()
+            ], update_conflicts=True, unique_fields=['user', 'content_type'],
+                update_fields=['filter'])
+
+        # the signals are not sent by bulk inserts
+        if get_setting('MATERIALIZE'):
+            refresh_users(grants)
+        transaction.on_commit(partial(invalidate_users, set(grants)))
+        transaction.on_commit(partial(
+            invalidate_filters, {user_id for user_id, _ in filters}))
+    return len(grants)
+
+
+def load_records(records, username=None, chunk_size=CHUNK_SIZE,
+                 replace=False):
+    """ Grant the permissions of records, a transaction per chunk of
+    records. Return the number of users. """
+    count = 0
+    for chunk in _chunks(records, chunk_size):
+        count += load_chunk(chunk, username, replace)
+    return count
+
+
+def _dump_rows(queryset, kind, columns, chunk_size):
+    for row in queryset.values_list(*columns).iterator(chunk_size=chunk_size):
+        yield row[0], kind, row[1], row[2:]
+
+
+def dump_records(users=None, filters=False, chunk_size=CHUNK_SIZE):
+    """ Iterate over the records of the users having permissions, by user
+    id, ``users`` is a queryset restricting them.
+
+    Permissions are read with a query per kind, joined to their content
+    types, and streamed by chunks so that memory stays flat.
+    """
+    User = get_user_model()
+    username = User.USERNAME_FIELD
+    through = UserFieldPermissions.permissions.through
+    fields = through.objects.order_by(
+        'userfieldpermissions__user_id', 'fieldpermission_id')
+    if users is not None:
+        fields = fields.filter(userfieldpermissions__user__in=users)
+    streams = [_dump_rows(fields, 0, (
+        'userfieldpermissions__user_id',
+        'userfieldpermissions__user__%s' % username,
+        'fieldpermission__content_type__app_label',
+        'fieldpermission__content_type__model',
+        'fieldpermission__name'), chunk_size)]
+    if filters:
+        filter_permissions = FilterPermissionModel.objects.order_by(
+            'user_id', 'pk')
+        if users is not None:
+            filter_permissions = filter_permissions.filter(user__in=users)
+        streams.append(_dump_rows(filter_permissions, 1, (
+            'user_id', 'user__%s' % username, 'content_type__app_label',
+            'content_type__model', 'filter'), chunk_size))
+
+    for _, rows in groupby(heapq.merge(*streams, key=itemgetter(0, 1)),
+                           key=itemgetter(0)):
+        record = {'username': None, 'fields_permissions': []}
+        if filters:
+            record['filters_permissions'] = []
+        for _, kind, record['username'], (app_label, model, value) in rows:
+            if kind:
+                record['filters_permissions'].append({
+                    'app_label': app_label, 'model': model, 'filter': value})
+            else:
+                record['fields_permissions'].append({
+                    'app_label': app_label, 'model': model, 'name': value})
+        yield record
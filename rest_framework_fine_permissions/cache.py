@@ -0,0 +1,212 @@
+""" Cache of the field permissions shared between requests.
+
+Allowed field names are stored under a key made of the user, a generation
+token of the user and the model. The token is read before the permissions
+are loaded, changing it invalidates every entry of the user at once.
+
+Field grants of groups are stored by set of groups, shared by all the users
+of the same groups, under a generation token common to all the groups.
+
+Filters of a user, their own and their groups' ones, are stored under a
+single key made of the user and their generation token.
+
+Functions prefixed with ``a`` are the async versions used by
+``PermissionSnapshot.aload()``.
+"""
+
+import hashlib
+import uuid
+
+from django.core.cache import caches
+
+from .conf import get_setting
+
+KEY_PREFIX = 'drffp'
+
+
+def get_cache():
+    """ Return the configured cache, or ``None`` when it is disabled. """
+    alias = get_setting('CACHE')
+    return caches[alias] if alias else None
+
+
+def _generation_key(user_id):
+    return '%s:generation:%s' % (KEY_PREFIX, user_id)
+
+
+def _fields_key(user_id, generation, label):
+    return '%s:fields:%s:%s:%s' % (KEY_PREFIX, user_id, generation, label)
+
+
+def _filters_key(user_id, generation):
+    return '%s:filters:%s:%s' % (KEY_PREFIX, user_id, generation)
+
+
+def _groups_generation_key():
+    return '%s:generation:groups' % KEY_PREFIX
+
+
+def _groups_key(generation, group_ids):
+    digest = hashlib.sha1(','.join(
+        str(group_id) for group_id in sorted(group_ids)).encode('utf-8'))
+    return '%s:groups:%s:%s' % (KEY_PREFIX, generation, digest.hexdigest())
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def _get_token(cache, key):
+    generation = cache.get(key)
+    if generation is None:
+        # a fresh token never matches entries written before an eviction
+        generation = _new_generation()
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+async def _aget_token(cache, key):
+    generation = await cache.aget(key)
+    if generation is None:
+        generation = _new_generation()
+        if not await cache.aadd(key, generation, timeout=None):
+            generation = await cache.aget(key, generation)
+    return generation
+
+
+def get_generation(cache, user_id):
+    """ Return the current generation token of a user. """
+    return _get_token(cache, _generation_key(user_id))
+
+
+async def aget_generation(cache, user_id):
+    """ Async version of ``get_generation``. """
+    return await _aget_token(cache, _generation_key(user_id))
+
+
+def get_generations(cache, user_ids):
+    """ Return the current generation tokens of some users, by user id. """
+    keys = {_generation_key(user_id): user_id for user_id in user_ids}
+    generations = {keys[key]: generation
+                   for key, generation in cache.get_many(keys).items()}
+    missing = {_generation_key(user_id): _new_generation()
+               for user_id in user_ids if user_id not in generations}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        generations.update((keys[key], generation)
+                           for key, generation in missing.items())
+    return generations
+
+
+def get_groups_generation(cache):
+    """ Return the current generation token of the groups. """
+    return _get_token(cache, _groups_generation_key())
+
+
+async def aget_groups_generation(cache):
+    """ Async version of ``get_groups_generation``. """
+    return await _aget_token(cache, _groups_generation_key())
+
+
+def get_allowed_fields(cache, user_id, generation, label):
+    """ Return the cached allowed field names, ``None`` if not cached. """
+    return cache.get(_fields_key(user_id, generation, label))
+
+
+def set_allowed_fields(cache, user_id, generation, label, names):
+    """ Cache the allowed field names of a user on a model. """
+    cache.set(_fields_key(user_id, generation, label), names,
+              timeout=get_setting('CACHE_TIMEOUT'))
+
+
+def set_many_allowed_fields(cache, fields):
+    """ Cache allowed field names at once, ``fields`` maps
+    ``(user_id, generation, label)`` to the names. """
+    cache.set_many({_fields_key(*key): names for key, names in fields.items()},
+                   timeout=get_setting('CACHE_TIMEOUT'))
+
+
+def get_filter_permissions(cache, user_id, generation):
+    """ Return the cached filters of a user, ``None`` if not cached. """
+    return cache.get(_filters_key(user_id, generation))
+
+
+def set_filter_permissions(cache, user_id, generation, filters):
+    """ Cache the filters of a user. """
+    cache.set(_filters_key(user_id, generation), filters,
+              timeout=get_setting('CACHE_TIMEOUT'))
+
+
+async def aget_filter_permissions(cache, user_id, generation):
+    """ Async version of ``get_filter_permissions``. """
+    return await cache.aget(_filters_key(user_id, generation))
+
+
+async def aset_filter_permissions(cache, user_id, generation, filters):
+    """ Async version of ``set_filter_permissions``. """
+    await cache.aset(_filters_key(user_id, generation), filters,
+                     timeout=get_setting('CACHE_TIMEOUT'))
+
+
+def set_many_filter_permissions(cache, filters):
+    """ Cache the filters of several users at once, ``filters`` maps
+    ``(user_id, generation)`` to their filters. """
+    cache.set_many({_filters_key(*key): value
+                    for key, value in filters.items()},
+                   timeout=get_setting('CACHE_TIMEOUT'))
+
+
+def get_group_field_permissions(cache, generation, group_ids):
+    """ Return the cached field grants of a set of groups, ``None`` if not
+    cached. """
+    return cache.get(_groups_key(generation, group_ids))
+
+
+def set_group_field_permissions(cache, generation, group_ids, grants):
+    """ Cache the field grants of a set of groups. """
+    cache.set(_groups_key(generation, group_ids), grants,
+              timeout=get_setting('CACHE_TIMEOUT'))
+
+
+async def aget_group_field_permissions(cache, generation, group_ids):
+    """ Async version of ``get_group_field_permissions``. """
+    return await cache.aget(_groups_key(generation, group_ids))
+
+
+async def aset_group_field_permissions(cache, generation, group_ids, grants):
+    """ Async version of ``set_group_field_permissions``. """
+    await cache.aset(_groups_key(generation, group_ids), grants,
+                     timeout=get_setting('CACHE_TIMEOUT'))
+
+
+def invalidate_groups():
+    """ Invalidate the cached field grants of all the sets of groups. """
+    cache = get_cache()
+    if cache is not None:
+        cache.set(_groups_generation_key(), _new_generation(), timeout=None)
+
+
+def invalidate_users(user_ids):
+    """ Invalidate the cached field permissions of some users.
+
+    The generation token of the users is changed rather than their entries
+    deleted: a request reading the former rows before the change was
+    committed caches them under the former token, which is not read again.
+    """
+    cache = get_cache()
+    user_ids = set(user_ids)
+    if cache is None or not user_ids:
+        return
+
+    cache.set_many({_generation_key(user_id): _new_generation()
+                    for user_id in user_ids}, timeout=None)
+
+
+def invalidate_filters(user_ids):
+    """ Invalidate the cached filters of some users.
+
+    Filters are stored under the generation token of the users, changed by
+    ``invalidate_users``, which drops their cached field permissions too.
+    """
+    invalidate_users(user_ids)
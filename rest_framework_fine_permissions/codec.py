@@ -0,0 +1,124 @@
+""" Storage format of the filter permissions.
+
+Filters are stored as a JSON document carrying its format version::
+
+    {"v": 2, "q": {"o": "OR", "n": 1, "c": [["name", "a"], {"c": [...]}]}}
+
+A node only lists its connector (``o``) and negation (``n``) when they
+differ from ``AND`` and false, its children (``c``) are lookups, written as
+``[lookup, value]`` pairs, or nested nodes.
+
+Filters saved against a model also carry the plan of each lookup, see
+``rest_framework_fine_permissions.resolver``::
+
+    "p": {"account__user__username": [["account", "user"], "username", [],
+                                      "exact"]}
+
+Version 1 is the former ``QSerializer(base64=True)`` text, still read from
+the rows written before the migration to a JSON column.
+"""
+
+import copy
+import json
+from datetime import date, datetime
+from time import mktime
+
+from django.core.serializers.base import SerializationError
+from django.db.models import Q
+
+from .resolver import LookupPlan
+from .serializers import QSerializer, _timestamp_bounds
+
+FORMAT_VERSION = 2
+
+
+def _encode_value(value):
+    if isinstance(value, date):
+        return mktime(value.timetuple())
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def _encode_node(q):
+    node = {'c': [
+        _encode_node(child) if isinstance(child, Q)
+        else [child[0], _encode_value(child[1])]
+        for child in q.children
+    ]}
+    if q.connector != Q.AND:
+        node['o'] = q.connector
+    if q.negated:
+        node['n'] = 1
+    return node
+
+
+def _decode_node(node, bounds):
+    q = Q()
+    q.connector = node.get('o', Q.AND)
+    q.negated = bool(node.get('n'))
+    children = []
+    for child in node['c']:
+        if isinstance(child, dict):
+            children.append(_decode_node(child, bounds))
+            continue
+        lookup, value = child
+        if lookup.endswith('__range') and len(value) == 2:
+            value = (datetime.fromtimestamp(value[0] or bounds[0]),
+                     datetime.fromtimestamp(value[1] or bounds[1]))
+        children.append((lookup, value))
+    q.children = children
+    return q
+
+
+def encode(q, plans=None):
+    """ Encode a Q object, and the plans of its lookups, into the current
+    storage format. """
+    if not isinstance(q, Q):
+        raise SerializationError
+    data = {'v': FORMAT_VERSION, 'q': _encode_node(q)}
+    if plans is not None:
+        data['p'] = {lookup: [list(plan.joins), plan.field,
+                              list(plan.transforms), plan.lookup]
+                     for lookup, plan in plans.items()}
+    return data
+
+
+def decode(data):
+    """ Decode a stored filter, whatever its format version. """
+    if isinstance(data, str):
+        if data.lstrip().startswith('{'):
+            data = json.loads(data)
+        else:
+            return QSerializer(base64=True).loads(data)
+    version = data.get('v', 1)
+    if version == 1:
+        return QSerializer().deserialize(copy.deepcopy(data))
+    if version != FORMAT_VERSION:
+        raise SerializationError(
+            'Unsupported filter format version %r' % version)
+    return _decode_node(data['q'], _timestamp_bounds())
+
+
+def decode_plans(data):
+    """ Return the stored plans of a filter, ``None`` when not resolved. """
+    if not isinstance(data, dict) or 'p' not in data:
+        return None
+    return {lookup: LookupPlan(tuple(joins), field, tuple(transforms),
+                               lookup_name)
+            for lookup, (joins, field, transforms, lookup_name)
+            in data['p'].items()}
+
+
+def upgrade(data):
+    """ Convert a stored filter to the current format. """
+    if isinstance(data, dict) and data.get('v') == FORMAT_VERSION:
+        return data
+    return encode(decode(data))
+
+
+def downgrade(data):
+    """ Convert a stored filter back to the version 1 text. """
+    if isinstance(data, str):
+        return data
+    return QSerializer(base64=True).dumps(decode(data))
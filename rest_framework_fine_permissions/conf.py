@@ -0,0 +1,32 @@
+""" Settings of the application, all prefixed by ``FINE_PERMISSIONS_``.
+"""
+
+from django.conf import settings
+
+DEFAULTS = {
+    # Alias of the django cache sharing permissions between requests,
+    # ``None`` disables the cache.
+    'CACHE': None,
+    # Lifetime of the cached permissions, in seconds.
+    'CACHE_TIMEOUT': 300,
+    # Load the permissions of a user into the cache when they log in.
+    'PRELOAD_ON_LOGIN': False,
+    # Read the field permissions from the table maintained by
+    # ``rest_framework_fine_permissions.materialized``.
+    'MATERIALIZE': False,
+    # Number of decoded filters kept in memory by each process.
+    'FILTER_CACHE_SIZE': 256,
+    # Let RelatedPermissionBackend load only the columns the user can see.
+    'PRUNE_COLUMNS': False,
+    # Dotted path of the class measuring the permission resolution, see
+    # ``rest_framework_fine_permissions.instrumentation``.
+    'INSTRUMENTATION': None,
+    # Search the field permissions and content types of the admin forms
+    # instead of rendering all of them.
+    'ADMIN_AUTOCOMPLETE': False,
+}
+
+
+def get_setting(name):
+    """ Return the value of a ``FINE_PERMISSIONS_<name>`` setting. """
+    return getattr(settings, 'FINE_PERMISSIONS_%s' % name, DEFAULTS[name])
@@ -0,0 +1,259 @@
+""" Evaluation of filter permissions against objects already in memory.
+
+Lookups on local fields are checked in Python. Lookups crossing relations,
+not supported here, or on text compared differently by the database, are
+unknown and leave the decision to the database.
+"""
+
+import operator
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+
+
+def _text_lookup(test, insensitive=False):
+    def check(value, arg):
+        if not isinstance(value, str) or not isinstance(arg, str):
+            raise TypeError
+        if insensitive:
+            value, arg = value.lower(), arg.lower()
+        return test(value, arg)
+    return check
+
+
+LOOKUPS = {
+    'exact': operator.eq,
+    # compared as text by the database, whatever the field
+    'iexact': _text_lookup(operator.eq, insensitive=True),
+    'in': lambda value, arg: value in arg,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'range': lambda value, arg: arg[0] <= value <= arg[1],
+    'contains': _text_lookup(operator.contains),
+    'icontains': _text_lookup(operator.contains, insensitive=True),
+    'startswith': _text_lookup(str.startswith),
+    'istartswith': _text_lookup(str.startswith, insensitive=True),
+    'endswith': _text_lookup(str.endswith),
+    'iendswith': _text_lookup(str.endswith, insensitive=True),
+}
+
+
+# lookups on text giving the same answer in Python as in the database, by
+# vendor, with its default collations
+TEXT_LOOKUPS = {
+    'postgresql': {'exact', 'in', 'contains', 'startswith', 'endswith'},
+    'oracle': {'exact', 'in', 'contains', 'startswith', 'endswith'},
+    # LIKE ignores the case on SQLite
+    'sqlite': {'exact', 'in'},
+}
+
+
+class UnsupportedLookup(Exception):
+
+    """ The lookup can only be checked by the database. """
+
+
+def get_local_field(model, lookup, plan=None):
+    """ Split a lookup into a local model field and a lookup name.
+
+    The resolved plan of the lookup spares its parsing when given.
+    """
+    if plan is not None:
+        if plan.joins or plan.transforms or not (
+                plan.lookup in LOOKUPS or plan.lookup == 'isnull'):
+            raise UnsupportedLookup(lookup)
+        parts, lookup_name = [plan.field], plan.lookup
+    else:
+        parts = lookup.split(LOOKUP_SEP)
+        lookup_name = 'exact'
+        if len(parts) > 1 and (
+                parts[-1] in LOOKUPS or parts[-1] == 'isnull'):
+            lookup_name = parts.pop()
+    if len(parts) != 1:
+        raise UnsupportedLookup(lookup)
+
+    name = parts[0]
+    try:
+        field = model._meta.pk if name == 'pk' else \
+            model._meta.get_field(name)
+    except FieldDoesNotExist:
+        raise UnsupportedLookup(lookup)
+    if not field.concrete or field.many_to_many:
+        raise UnsupportedLookup(lookup)
+    return field, lookup_name
+
+
+def get_filter_columns(q, model):
+    """ Return the local columns read by a Q object. """
+    columns = set()
+    for child in q.children:
+        if isinstance(child, Q):
+            columns |= get_filter_columns(child, model)
+            continue
+        name = child[0].split(LOOKUP_SEP)[0]
+        try:
+            field = model._meta.pk if name == 'pk' else \
+                model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.many_to_many:
+            columns.add(field.name)
+    return columns
+
+
+def _to_python(field, value):
+    if field.is_relation:
+        field = field.target_field
+    try:
+        return field.to_python(value)
+    except ValidationError:
+        raise UnsupportedLookup(field.name)
+
+
+def check_lookup(obj, lookup, arg, plan=None):
+    """ Check a single lookup against an object. """
+    field, lookup_name = get_local_field(obj.__class__, lookup, plan)
+    if field.attname in obj.get_deferred_fields():
+        # loading the value would cost the query we are trying to save
+        raise UnsupportedLookup(lookup)
+    value = getattr(obj, field.attname)
+
+    if lookup_name == 'isnull':
+        return (value is None) == bool(arg)
+    if arg is None and lookup_name in ('exact', 'iexact'):
+        return value is None
+    if value is None:
+        return False
+
+    if lookup_name in ('in', 'range'):
+        arg = [_to_python(field, item) for item in arg]
+    elif lookup_name in ('exact', 'gt', 'gte', 'lt', 'lte'):
+        arg = _to_python(field, arg)
+
+    if isinstance(value, str):
+        vendor = connections[router.db_for_read(obj.__class__)].vendor
+        if lookup_name not in TEXT_LOOKUPS.get(vendor, ()):
+            raise UnsupportedLookup(lookup)
+
+    try:
+        return bool(LOOKUPS[lookup_name](value, arg))
+    except TypeError:
+        raise UnsupportedLookup(lookup)
+
+
+def evaluate(q, obj, plans=None):
+    """ Evaluate a Q object against an object.
+
+    Return ``True`` or ``False``, or ``None`` when only the database can
+    tell.
+    """
+    results = []
+    for child in q.children:
+        if isinstance(child, Q):
+            result = evaluate(child, obj, plans)
+        else:
+            try:
+                result = check_lookup(
+                    obj, child[0], child[1],
+                    plans.get(child[0]) if plans else None)
+            except UnsupportedLookup:
+                result = None
+
+        if q.connector == Q.AND and result is False:
+            results = [False]
+            break
+        if q.connector == Q.OR and result is True:
+            results = [True]
+            break
+        results.append(result)
+
+    if None in results:
+        return None
+    if q.connector == Q.OR:
+        result = any(results)
+    elif q.connector == Q.XOR:
+        result = sum(results) % 2 == 1
+    else:
+        result = all(results)
+    return not result if q.negated else result
+
+
+def matches(q, obj, plans=None):
+    """ Check that an object matches a Q object.
+
+    The database is queried only when the Q object can not be evaluated in
+    memory.
+    """
+    result = evaluate(q, obj, plans)
+    if result is None:
+        result = obj.__class__._default_manager.filter(q)\
+            .filter(pk=obj.pk).exists()
+    return result
+
+
+async def amatches(q, obj, plans=None):
+    """ Async version of ``matches``. """
+    result = evaluate(q, obj, plans)
+    if result is None:
+        result = await obj.__class__._default_manager.filter(q)\
+            .filter(pk=obj.pk).aexists()
+    return result
+
+
+def _split_matching(q, objects, plans):
+    matching = []
+    unknown = []
+    for obj in objects:
+        result = evaluate(q, obj, plans)
+        if result is None:
+            unknown.append(obj)
+        elif result:
+            matching.append(obj)
+    return matching, unknown
+
+
+def _permitted_queries(q, model, pks):
+    max_params = connections[router.db_for_read(model)]\
+        .features.max_query_params
+    # keep room for the parameters of the filter itself
+    batch_size = max(max_params - 100, 1) if max_params else len(pks)
+    for start in range(0, len(pks), batch_size):
+        yield model._default_manager.filter(q).filter(
+            pk__in=pks[start:start + batch_size]
+        ).values_list('pk', flat=True)
+
+
+def filter_matching(q, model, objects, plans=None):
+    """ Return the objects of a model matching a Q object.
+
+    Objects that can not be evaluated in memory are checked together, with
+    a single ``pk__in`` query.
+    """
+    matching, unknown = _split_matching(q, objects, plans)
+    if not unknown:
+        return matching
+
+    permitted = set()
+    for queryset in _permitted_queries(q, model,
+                                       [obj.pk for obj in unknown]):
+        permitted.update(queryset)
+    matching.extend(obj for obj in unknown if obj.pk in permitted)
+    return matching
+
+
+async def afilter_matching(q, model, objects, plans=None):
+    """ Async version of ``filter_matching``. """
+    matching, unknown = _split_matching(q, objects, plans)
+    if not unknown:
+        return matching
+
+    permitted = set()
+    for queryset in _permitted_queries(q, model,
+                                       [obj.pk for obj in unknown]):
+        permitted.update([pk async for pk in queryset])
+    matching.extend(obj for obj in unknown if obj.pk in permitted)
+    return matching
@@ -11,6 +11,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.utils.encoding import smart_str
 
+from .instrumentation import get_instrumentation
 from .serializers import ModelPermissionsSerializer
 from .utils import get_serializer
 
@@ -65,6 +66,7 @@ class ModelPermissionsField(Field):
             extra_params['cached_allowed_fields'] =\
                 self.parent.cached_allowed_fields
 
-        ser = self.serializer(obj, context=self.context, many=many,
-                              **extra_params)
-        return ser.data
+        with get_instrumentation().phase('nested_render'):
+            ser = self.serializer(obj, context=self.context, many=many,
+                                  **extra_params)
+            return ser.data
@@ -1,12 +1,23 @@
+import collections
+import logging
+
 from rest_framework.filters import BaseFilterBackend
-from rest_framework_fine_permissions.serializers import QSerializer
-from rest_framework_fine_permissions.models import FilterPermissionModel
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_fine_permissions.conf import get_setting
+from rest_framework_fine_permissions.evaluator import get_filter_columns
+from rest_framework_fine_permissions.instrumentation import get_instrumentation
+from rest_framework_fine_permissions.permissions import FilterPermission
+from rest_framework_fine_permissions.planner import optimize_queryset
+from rest_framework_fine_permissions.qcache import load_granted_filter
+from rest_framework_fine_permissions.snapshot import (
+    aget_permission_snapshot, get_permission_snapshot)
 
-from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
+from django.core.exceptions import FieldError
+from django.db.models import Model, Q
 from django.db.models.query import QuerySet
 
+logger = logging.getLogger(__name__)
+
 
 class FilterPermissionBackend(BaseFilterBackend):
     """
@@ -15,15 +26,92 @@ class FilterPermissionBackend(BaseFilterBackend):
 
     def filter_queryset(self, request, queryset, view):
         user = request.user
-        if not user.is_superuser and not user.is_anonymous and isinstance(queryset, QuerySet):
-            try:
-                model = queryset.model
-                ct = ContentType.objects.get_for_model(model)
-                fpm = FilterPermissionModel.objects.get(user=user,
-                                                        content_type=ct)
-                myfilter = QSerializer(base64=True).loads(fpm.filter)
-            except ObjectDoesNotExist:
+        if user.is_superuser or user.is_anonymous:
+            return queryset
+        elif isinstance(queryset, QuerySet):
+            grants = get_permission_snapshot(request)\
+                .get_filter_permissions(queryset.model)
+            if grants:
+                with get_instrumentation().phase('filter_decode'):
+                    try:
+                        myfilter, _ = load_granted_filter(
+                            grants, queryset.model)
+                    except FieldError as e:
+                        # an invalid filter never grants access
+                        logger.warning('Invalid filter permissions %s: %s',
+                                       [grant.pk for grant in grants], e)
+                        return queryset.none()
+            else:
                 myfilter = Q()
             return queryset.filter(myfilter)
+        elif isinstance(queryset, collections.abc.Iterable) and \
+                not isinstance(queryset, (str, bytes, dict)):
+            return self.filter_objects(request, queryset)
         else:
             return queryset
+
+    async def afilter_queryset(self, request, queryset, view):
+        """ Async version of filter_queryset, for async views. """
+        user = request.user
+        if user.is_superuser or user.is_anonymous:
+            return queryset
+        # the filters are then read from memory
+        await aget_permission_snapshot(request)
+        if not isinstance(queryset, QuerySet) and \
+                isinstance(queryset, collections.abc.Iterable) and \
+                not isinstance(queryset, (str, bytes, dict)):
+            return await self.afilter_objects(request, queryset)
+        return self.filter_queryset(request, queryset, view)
+
+    def filter_objects(self, request, objects):
+        """ Filter a plain iterable of objects. """
+        objects = list(objects)
+        permitted = set(map(id, FilterPermission.filter_permitted(
+            request.user, [obj for obj in objects if isinstance(obj, Model)],
+            request=request)))
+        return [obj for obj in objects
+                if id(obj) in permitted or not isinstance(obj, Model)]
+
+    async def afilter_objects(self, request, objects):
+        """ Async version of filter_objects. """
+        objects = list(objects)
+        permitted = set(map(id, await FilterPermission.afilter_permitted(
+            request.user, [obj for obj in objects if isinstance(obj, Model)],
+            request=request)))
+        return [obj for obj in objects
+                if id(obj) in permitted or not isinstance(obj, Model)]
+
+
+class RelatedPermissionBackend(BaseFilterBackend):
+    """
+    Select and prefetch the relations rendered by the view's serializer,
+    as far as the user is allowed to see them
+
+    With the ``FINE_PERMISSIONS_PRUNE_COLUMNS`` setting, only the columns
+    rendered for the user, the primary keys and the columns read by the
+    user's filter are loaded, by read-only requests
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not isinstance(queryset, QuerySet) or \
+                not hasattr(view, 'get_serializer'):
+            return queryset
+
+        # an instance saved without some of its columns would only update
+        # the loaded ones
+        only = get_setting('PRUNE_COLUMNS') and \
+            request.method in SAFE_METHODS
+        extra_columns = set()
+        user = request.user
+        if only and not user.is_superuser and not user.is_anonymous:
+            grants = get_permission_snapshot(request)\
+                .get_filter_permissions(queryset.model)
+            if grants:
+                try:
+                    myfilter, _ = load_granted_filter(grants, queryset.model)
+                except FieldError:
+                    # the queryset is emptied by FilterPermissionBackend
+                    myfilter = Q()
+                extra_columns = get_filter_columns(myfilter, queryset.model)
+        return optimize_queryset(queryset, view.get_serializer(), only,
+                                 extra_columns)
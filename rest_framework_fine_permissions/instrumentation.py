@@ -0,0 +1,158 @@
+""" Measure the cost of the permission resolution.
+
+The class set by ``FINE_PERMISSIONS_INSTRUMENTATION`` is called around each
+phase of the resolution and on each cache access. The default one does
+nothing, so that it can stay enabled under load.
+
+Phases are ``allowed_fields``, ``get_fields``, ``filter_decode``,
+``object_check`` and ``nested_render``, caches are ``fields``, ``groups``,
+``filter_grants`` and ``filters``.
+"""
+
+import contextlib
+import contextvars
+import time
+from collections import defaultdict
+
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import Signal, receiver
+from django.utils.module_loading import import_string
+
+from .conf import get_setting
+
+# sent by TimingInstrumentation with phase, duration and queries arguments
+phase_finished = Signal()
+# sent by TimingInstrumentation with cache and hit arguments
+cache_accessed = Signal()
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_instrumentation = None
+
+
+class BaseInstrumentation(object):
+
+    """ Instrumentation doing nothing. """
+
+    def phase(self, name):
+        """ Return a context manager wrapping a phase. """
+        return _NULL_CONTEXT
+
+    def cache_event(self, name, hit):
+        """ Called on each access to a cache. """
+
+
+class PermissionStats(object):
+
+    """ Cost of the permission resolution during a request. """
+
+    def __init__(self):
+        # phase -> [calls, seconds, queries]
+        self.phases = defaultdict(lambda: [0, 0.0, 0])
+        # cache -> [hits, misses]
+        self.caches = defaultdict(lambda: [0, 0])
+
+    def hit_rate(self, name):
+        hits, misses = self.caches[name]
+        return hits / (hits + misses) if hits + misses else None
+
+    def as_dict(self):
+        return {
+            'phases': {
+                name: {'calls': calls, 'seconds': seconds,
+                       'queries': queries}
+                for name, (calls, seconds, queries) in self.phases.items()},
+            'caches': {
+                name: {'hits': hits, 'misses': misses,
+                       'hit_rate': self.hit_rate(name)}
+                for name, (hits, misses) in self.caches.items()},
+        }
+
+
+_stats = contextvars.ContextVar('fine_permissions_stats', default=None)
+
+
+def get_stats():
+    """ Return the statistics of the current request. """
+    stats = _stats.get()
+    if stats is None:
+        stats = PermissionStats()
+        _stats.set(stats)
+    return stats
+
+
+def reset_stats():
+    """ Start new statistics, at the beginning of a request. """
+    stats = PermissionStats()
+    _stats.set(stats)
+    return stats
+
+
+class TimingInstrumentation(BaseInstrumentation):
+
+    """ Measure time and queries of each phase.
+
+    Measures are added to the statistics of the current request and sent
+    with the ``phase_finished`` and ``cache_accessed`` signals.
+    """
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all(initialized_only=True):
+                stack.enter_context(
+                    connection.execute_wrapper(count_queries))
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                duration = time.perf_counter() - start
+
+        measure = get_stats().phases[name]
+        measure[0] += 1
+        measure[1] += duration
+        measure[2] += queries[0]
+        phase_finished.send(sender=self.__class__, phase=name,
+                            duration=duration, queries=queries[0])
+
+    def cache_event(self, name, hit):
+        get_stats().caches[name][0 if hit else 1] += 1
+        cache_accessed.send(sender=self.__class__, cache=name, hit=hit)
+
+
+def get_instrumentation():
+    """ Return the configured instrumentation. """
+    global _instrumentation
+    if _instrumentation is None:
+        path = get_setting('INSTRUMENTATION')
+        _instrumentation = import_string(path)() if path \
+            else BaseInstrumentation()
+    return _instrumentation
+
+
+@receiver(setting_changed)
+def _reset_instrumentation(setting, **kwargs):
+    global _instrumentation
+    if setting == 'FINE_PERMISSIONS_INSTRUMENTATION':
+        _instrumentation = None
+
+
+class PermissionStatsMiddleware(object):
+
+    """ Expose the cost of the permission resolution of each request.
+
+    Statistics are available as ``request.permission_stats``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.permission_stats = reset_stats()
+        return self.get_response(request)
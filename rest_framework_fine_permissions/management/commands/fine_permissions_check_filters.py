@@ -0,0 +1,60 @@
+from rest_framework_fine_permissions.codec import decode, encode
+from rest_framework_fine_permissions.models import (
+    FilterPermissionModel, GroupFilterPermissionModel)
+from rest_framework_fine_permissions.resolver import resolve_filter
+
+from django.core.exceptions import FieldError
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+
+    help = ("Checks the lookups of the filters' permissions against the "
+            "models, to run after schema migrations")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Store the plans of the valid filters again')
+
+    def handle(self, *args, **options):
+        """
+        check filters permissions
+        """
+        invalid = 0
+        for kind, permission_model in (
+                ('Filter permission', FilterPermissionModel),
+                ('Group filter permission', GroupFilterPermissionModel)):
+            invalid += self.check_filters(
+                kind, permission_model, options['update'])
+
+        if invalid:
+            raise CommandError('%s invalid filter permission(s)' % invalid)
+        self.stdout.write('All filter permissions are valid')
+
+    def check_filters(self, kind, permission_model, update):
+        """ Check the filters of a permission model, return the number of
+        invalid ones. """
+        invalid = 0
+        queryset = permission_model.objects\
+            .select_related('content_type').order_by('pk')
+        for fpm in queryset.iterator():
+            model = fpm.content_type.model_class()
+            try:
+                if model is None:
+                    raise FieldError('Model %s.%s is not installed' % (
+                        fpm.content_type.app_label, fpm.content_type.model))
+                q = decode(fpm.filter)
+                plans = resolve_filter(q, model)
+            except Exception as e:
+                invalid += 1
+                self.stderr.write('%s %s (%s): %s' % (
+                    kind, fpm.pk, fpm.content_type.natural_key(), e))
+                continue
+
+            if update:
+                data = encode(q, plans)
+                if data != fpm.filter:
+                    permission_model.objects.filter(pk=fpm.pk)\
+                        .update(filter=data)
+        return invalid
@@ -1,49 +1,45 @@
-#!/usr/bin/env python
-
 import json
 
-from rest_framework_fine_permissions.models import UserFieldPermissions
+from rest_framework_fine_permissions.bulk import CHUNK_SIZE, dump_records
 
-from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
 
-    help = ("Output the user's fieds permissions of the database as a fixture of the given user ")
-    args = 'user'
+    help = ("Output the users' fieds permissions of the database as JSON "
+            "Lines, a user per line. The permissions of groups are not "
+            "dumped")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*', metavar='user',
+            help='Only these users, all the users by default')
+        parser.add_argument(
+            '--filters', action='store_true',
+            help='Include the filters permissions')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Number of rows read at once')
 
     def handle(self, *args, **options):
         """
-        dump fields permissions for a user
+        dump fields permissions for users
         """
-
-        def get_user(username):
-            try:
-                return User.objects.get(username=username)
-            except ObjectDoesNotExist as e:
-                raise CommandError("This user doesn't exist in the database")
-
-        def get_fields_permissions(user):
-            try:
-                return UserFieldPermissions.objects.get(user=user)
-            except ObjectDoesNotExist as e:
-                raise CommandError("This user doesn't have fields permissions")
-
-        if len(args) !=1:
-            raise CommandError("Specifies a user")
-        else:
-            try:
-                self.stdout.ending = None
-                user = get_user(args[0])
-                fields_permissions  = get_fields_permissions(user)
-                permissions = fields_permissions.permissions.all()
-
-                jsoneatthat = {'username': user.username, 
-                    'fields_permissions' : [ {'app_label': permission.content_type.app_label, 'model' : permission.content_type.model, 'name': permission.name } for permission in permissions]}
-
-                self.stdout.write(json.dumps(jsoneatthat))
-
-            except:
-                raise
+        users = None
+        usernames = set(options['usernames'])
+        if usernames:
+            User = get_user_model()
+            users = User._default_manager.filter(**{
+                '%s__in' % User.USERNAME_FIELD: usernames})
+            unknown = usernames - set(users.values_list(
+                User.USERNAME_FIELD, flat=True))
+            if unknown:
+                raise CommandError(
+                    "These users don't exist in the database: %s"
+                    % ', '.join(sorted(unknown)))
+
+        for record in dump_records(users, filters=options['filters'],
+                                   chunk_size=options['chunk_size']):
+            self.stdout.write(json.dumps(record))
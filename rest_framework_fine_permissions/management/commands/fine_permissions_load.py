@@ -1,67 +1,44 @@
-#!/usr/bin/env python
-
-import json
 import sys
-from optparse import make_option
 
-from rest_framework_fine_permissions.models import UserFieldPermissions, FieldPermission
+from rest_framework_fine_permissions.bulk import (
+    CHUNK_SIZE, load_records, read_records)
 
-from django.contrib.auth.models import User
-from django.contrib.contenttypes.models import ContentType
-from django.core import management, serializers
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 
 
-
 class Command(BaseCommand):
 
-    help = ("Loads the user's fieds permissions into the database from a fixture of the given user ")
-    args = 'json file'
+    help = ("Loads the users' fieds permissions into the database from "
+            "files created by the fine_permissions_dump command. The "
+            "permissions of groups are not part of these files")
 
-
-    option_list = BaseCommand.option_list + (
-        make_option('-u', '--user', help='Specify another user'),
-    )
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='+', metavar='file',
+            help='JSON or JSON Lines file, - for the standard input')
+        parser.add_argument('-u', '--user', help='Specify another user')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Number of users loaded in a transaction')
 
     def handle(self, *args, **options):
         """
-        dump fields permissions for a user
+        load fields permissions for users
         """
-
-        def get_user(username):
-            try:
-                return User.objects.get(username=username)
-            except ObjectDoesNotExist as e:
-                raise CommandError("This user doesn't exist in the database")
-
-        def add_permissions(user_field_permissions, content_type, name):
-
-            p = None
+        count = 0
+        for path in options['files']:
             try:
-                p = FieldPermission.objects.get(content_type=content_type, name=name)
-            except ObjectDoesNotExist:
-                p = FieldPermission(content_type=content_type, name=name)
-                p.save()
-            finally:
-                user_field_permissions.permissions.add(p)
-
-        if len(args) !=1:
-             raise CommandError("Specifies a json file created by the fine_permissions_dump command")
-        else:
-            try:
-                with open(args[0], 'r') as json_file:
-                    myjson = json.load(json_file)
-
-                    user = get_user(options.get('user')) if options['user'] else get_user(myjson['username'])
-                    fields_permissions = myjson['fields_permissions']
-
-                    user_field_permissions = UserFieldPermissions(user=user)
-                    user_field_permissions.save()
-
-                    for f in fields_permissions:
-                        content_type = ContentType.objects.get(app_label=f["app_label"], model=f["model"])
-                        add_permissions(user_field_permissions, content_type, f['name'])
-
-            except Exception as e:
+                if path == '-':
+                    count += self._load(sys.stdin, options)
+                else:
+                    with open(path, 'r') as json_file:
+                        count += self._load(json_file, options)
+            except (OSError, ValueError, KeyError, TypeError,
+                    ObjectDoesNotExist) as e:
                 raise CommandError(e)
+        self.stdout.write('Fields permissions of %s user(s) loaded' % count)
+
+    def _load(self, stream, options):
+        return load_records(read_records(stream), username=options['user'],
+                            chunk_size=options['chunk_size'])
@@ -0,0 +1,22 @@
+from rest_framework_fine_permissions.materialized import BATCH_SIZE, rebuild
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+
+    help = ("Rebuilds the table of the effective fields' permissions, read "
+            "with the FINE_PERMISSIONS_MATERIALIZE setting")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Number of users computed at once')
+
+    def handle(self, *args, **options):
+        """
+        rebuild effective fields permissions
+        """
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write('Effective permissions of %s user(s) rebuilt'
+                          % count)
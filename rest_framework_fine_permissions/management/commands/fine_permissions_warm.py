@@ -0,0 +1,46 @@
+import argparse
+from datetime import datetime, time
+
+from rest_framework_fine_permissions.cache import get_cache
+from rest_framework_fine_permissions.warmup import BATCH_SIZE, warm
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_since(value):
+    """ Parse a date or a datetime, in the current time zone if naive. """
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise argparse.ArgumentTypeError('Invalid date: %r' % value)
+        since = datetime.combine(day, time())
+    if settings.USE_TZ and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+class Command(BaseCommand):
+
+    help = "Loads the users' permissions into the FINE_PERMISSIONS_CACHE"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=parse_since,
+            help='Only the users who logged in since this date')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Number of users loaded at once')
+
+    def handle(self, *args, **options):
+        """
+        warm up the permissions cache
+        """
+        if get_cache() is None:
+            raise CommandError('FINE_PERMISSIONS_CACHE is not set')
+        count = warm(since=options['since'],
+                     batch_size=options['batch_size'])
+        self.stdout.write('Permissions of %s user(s) cached' % count)
@@ -0,0 +1,153 @@
+""" Table of the effective field permissions of the users.
+
+With ``FINE_PERMISSIONS_MATERIALIZE``, the allowed field names of a user on
+a model, their own and their groups' grants merged, are read from a single
+row. Rows are recomputed by the signal receivers on each permission change
+and the whole table by the ``fine_permissions_rebuild`` command.
+"""
+
+import heapq
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from .models import (
+    EffectiveFieldPermissions, GroupFieldPermissions, UserFieldPermissions)
+
+BATCH_SIZE = 500
+
+
+def _get_memberships():
+    """ Return the membership model and its user and group columns. """
+    User = get_user_model()
+    if not hasattr(User, 'groups'):
+        return None
+    field = User._meta.get_field('groups')
+    return (field.remote_field.through, field.m2m_field_name(),
+            field.m2m_reverse_field_name())
+
+
+def _merge(names, extra_names):
+    names.extend(name for name in extra_names if name not in names)
+
+
+def compute_effective_permissions(user_ids):
+    """ Compute the allowed field names of some users, by user and content
+    type id, in the order of the snapshot. """
+    effective = defaultdict(lambda: defaultdict(list))
+    for user_id, ct_id, name in UserFieldPermissions.permissions.through\
+            .objects.filter(userfieldpermissions__user_id__in=user_ids)\
+            .values_list('userfieldpermissions__user_id',
+                         'fieldpermission__content_type_id',
+                         'fieldpermission__name')\
+            .order_by('fieldpermission_id'):
+        effective[user_id][ct_id].append(name)
+
+    memberships = _get_memberships()
+    if memberships is None:
+        return effective
+    through, user_column, group_column = memberships
+    groups = defaultdict(set)
+    for user_id, group_id in through.objects.filter(**{
+            '%s__in' % user_column: user_ids,
+            '%s__groupfieldpermissions__isnull' % group_column: False,
+    }).values_list(user_column, group_column):
+        groups[user_id].add(group_id)
+    if not groups:
+        return effective
+
+    # grants by group, each in the order of the field permissions
+    group_grants = defaultdict(list)
+    for group_id, fp_id, ct_id, name in GroupFieldPermissions.permissions\
+            .through.objects.filter(
+                groupfieldpermissions__group_id__in=set().union(
+                    *groups.values()))\
+            .values_list('groupfieldpermissions__group_id',
+                         'fieldpermission_id',
+                         'fieldpermission__content_type_id',
+                         'fieldpermission__name')\
+            .order_by('fieldpermission_id'):
+        group_grants[group_id].append((fp_id, ct_id, name))
+    for user_id, group_ids in groups.items():
+        extra = defaultdict(list)
+        for _, ct_id, name in heapq.merge(
+                *(group_grants[group_id] for group_id in group_ids)):
+            extra[ct_id].append(name)
+        for ct_id, names in extra.items():
+            _merge(effective[user_id][ct_id], names)
+    return effective
+
+
+def _get_content_type_ids(labels):
+    ct_ids = set()
+    for label in labels:
+        try:
+            ct_ids.add(ContentType.objects.get_by_natural_key(
+                *label.split('.')).pk)
+        except ContentType.DoesNotExist:
+            pass
+    return ct_ids
+
+
+def _refresh(user_ids, ct_ids=None):
+    effective = compute_effective_permissions(user_ids)
+    rows = [
+        EffectiveFieldPermissions(user_id=user_id, content_type_id=ct_id,
+                                  names=names)
+        for user_id, by_ct in effective.items()
+        for ct_id, names in by_ct.items()
+        if ct_ids is None or ct_id in ct_ids
+    ]
+    kept = {(row.user_id, row.content_type_id) for row in rows}
+
+    stale = EffectiveFieldPermissions.objects.filter(user_id__in=user_ids)
+    if ct_ids is not None:
+        stale = stale.filter(content_type_id__in=ct_ids)
+    stale = [pk for pk, user_id, ct_id in stale.values_list(
+        'pk', 'user_id', 'content_type_id') if (user_id, ct_id) not in kept]
+    if stale:
+        EffectiveFieldPermissions.objects.filter(pk__in=stale).delete()
+    if rows:
+        EffectiveFieldPermissions.objects.bulk_create(
+            rows, update_conflicts=True,
+            unique_fields=['user', 'content_type'], update_fields=['names'])
+
+
+def refresh_users(user_ids, labels=None):
+    """ Recompute the rows of some users.
+
+    Only the given models are recomputed when ``labels`` is set.
+    """
+    user_ids = sorted(set(user_ids))
+    ct_ids = None if labels is None else _get_content_type_ids(labels)
+    if not user_ids or ct_ids == set():
+        return
+    with transaction.atomic():
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            _refresh(user_ids[start:start + BATCH_SIZE], ct_ids)
+
+
+def get_granted_users():
+    """ Return the ids of the users granted any field permission. """
+    user_ids = set(UserFieldPermissions.objects.filter(
+        permissions__isnull=False).values_list('user_id', flat=True))
+    memberships = _get_memberships()
+    if memberships is not None:
+        through, user_column, group_column = memberships
+        user_ids.update(through.objects.filter(**{
+            '%s__groupfieldpermissions__permissions__isnull' %
+            group_column: False,
+        }).values_list(user_column, flat=True))
+    return user_ids
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """ Recompute the whole table, return the number of users. """
+    user_ids = sorted(get_granted_users())
+    with transaction.atomic():
+        EffectiveFieldPermissions.objects.all().delete()
+        for start in range(0, len(user_ids), batch_size):
+            _refresh(user_ids[start:start + batch_size])
+    return len(user_ids)
@@ -0,0 +1,101 @@
+import base64
+import json
+
+from django.db import migrations, models
+
+
+# The filter formats as they were when this migration was written, so that
+# later changes of the codec don't change what it writes.
+
+def _v1_to_v2(node):
+    converted = {'c': [
+        _v1_to_v2(child) if isinstance(child, dict) else list(child)
+        for child in node['children']
+    ]}
+    if node.get('connector', 'AND') != 'AND':
+        converted['o'] = node['connector']
+    if node.get('negated'):
+        converted['n'] = 1
+    return converted
+
+
+def _v2_to_v1(node):
+    return {
+        'children': [
+            _v2_to_v1(child) if isinstance(child, dict) else list(child)
+            for child in node['c']
+        ],
+        'connector': node.get('o', 'AND'),
+        'negated': bool(node.get('n')),
+    }
+
+
+def upgrade(text):
+    """ Convert a version 1 filter, base64 or plain JSON, to version 2. """
+    if text.lstrip().startswith('{'):
+        data = json.loads(text)
+    else:
+        data = json.loads(base64.b64decode(text).decode('utf-8'))
+    if data.get('v') == 2:
+        return data
+    return {'v': 2, 'q': _v1_to_v2(data)}
+
+
+def downgrade(data):
+    """ Convert a version 2 filter back to the version 1 base64 text. """
+    if isinstance(data, str):
+        return data
+    string = json.dumps(_v2_to_v1(data['q']), sort_keys=True, indent=4,
+                        separators=(',', ': '))
+    return base64.b64encode(string.encode('utf-8')).decode('utf-8')
+
+
+def convert_filters(apps, schema_editor):
+    FilterPermissionModel = apps.get_model(
+        'rest_framework_fine_permissions', 'FilterPermissionModel')
+    for fpm in FilterPermissionModel.objects.iterator():
+        fpm.filter_data = upgrade(fpm.filter)
+        fpm.save(update_fields=['filter_data'])
+
+
+def convert_filters_back(apps, schema_editor):
+    FilterPermissionModel = apps.get_model(
+        'rest_framework_fine_permissions', 'FilterPermissionModel')
+    for fpm in FilterPermissionModel.objects.iterator():
+        fpm.filter = downgrade(fpm.filter_data)
+        fpm.save(update_fields=['filter'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_framework_fine_permissions', '0002_swappable_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filterpermissionmodel',
+            name='filter_data',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='filterpermissionmodel',
+            name='filter',
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(convert_filters, convert_filters_back),
+        migrations.RemoveField(
+            model_name='filterpermissionmodel',
+            name='filter',
+        ),
+        migrations.RenameField(
+            model_name='filterpermissionmodel',
+            old_name='filter_data',
+            new_name='filter',
+        ),
+        migrations.AlterField(
+            model_name='filterpermissionmodel',
+            name='filter',
+            field=models.JSONField(),
+        ),
+    ]
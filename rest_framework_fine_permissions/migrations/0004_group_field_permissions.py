@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0001_initial'),
+        ('rest_framework_fine_permissions', '0003_filter_json'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupFieldPermissions',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.OneToOneField(on_delete=models.CASCADE, to='auth.group')),
+                ('permissions', models.ManyToManyField(db_table='drf_group_field_permissions_permission', related_name='group_field_permissions', to='rest_framework_fine_permissions.fieldpermission')),
+            ],
+            options={
+                'verbose_name': 'group field permission',
+                'verbose_name_plural': 'group fields permissions',
+                'db_table': 'drf_group_field_permissions',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0001_initial'),
+        ('contenttypes', '0001_initial'),
+        ('rest_framework_fine_permissions', '0004_group_field_permissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupFilterPermissionModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filter', models.JSONField()),
+                ('content_type', models.ForeignKey(on_delete=models.CASCADE, to='contenttypes.contenttype')),
+                ('group', models.ForeignKey(on_delete=models.CASCADE, to='auth.group')),
+            ],
+            options={
+                'verbose_name': 'group filter permission',
+                'verbose_name_plural': 'group filters permissions',
+                'db_table': 'drf_group_filter_permissions',
+                'unique_together': {('group', 'content_type')},
+            },
+        ),
+    ]
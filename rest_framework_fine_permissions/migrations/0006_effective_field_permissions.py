@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0001_initial'),
+        ('rest_framework_fine_permissions', '0005_group_filter_permissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveFieldPermissions',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('names', models.JSONField(default=list)),
+                ('content_type', models.ForeignKey(on_delete=models.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('user', models.ForeignKey(on_delete=models.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'effective field permissions',
+                'verbose_name_plural': 'effective fields permissions',
+                'db_table': 'drf_effective_field_permissions',
+                'unique_together': {('user', 'content_type')},
+            },
+        ),
+    ]
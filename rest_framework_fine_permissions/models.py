@@ -36,10 +36,47 @@ class UserFieldPermissions(models.Model):
         return self.user.username
 
 
+class GroupFieldPermissions(models.Model):
+    group = models.OneToOneField('auth.Group', on_delete=models.CASCADE)
+    permissions = models.ManyToManyField(
+        FieldPermission,
+        related_name='group_field_permissions',
+        db_table='drf_group_field_permissions_permission')
+
+    class Meta:
+        verbose_name = _('group field permission')
+        verbose_name_plural = _('group fields permissions')
+        db_table = 'drf_group_field_permissions'
+
+    def __str__(self):
+        return self.group.name
+
+
+# allowed field names of a user on a model, own and groups' grants merged,
+# see rest_framework_fine_permissions.materialized
+class EffectiveFieldPermissions(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE, related_name='+')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE,
+                                     related_name='+')
+    names = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name = _('effective field permissions')
+        verbose_name_plural = _('effective fields permissions')
+        db_table = 'drf_effective_field_permissions'
+        unique_together = ('user', 'content_type',)
+
+    def __str__(self):
+        return '{0.content_type.app_label} | {0.content_type.model} | {0.user}'\
+            .format(self)
+
+
 class FilterPermissionModel(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
-    filter = models.TextField()
+    # see rest_framework_fine_permissions.codec for the format
+    filter = models.JSONField()
 
     class Meta:
         verbose_name = _('user filter permission')
@@ -50,3 +87,20 @@ class FilterPermissionModel(models.Model):
     def __str__(self):
         return '{0.content_type.app_label} | {0.content_type.model} | {0.user.username} | {0.filter}'\
             .format(self)
+
+
+class GroupFilterPermissionModel(models.Model):
+    group = models.ForeignKey('auth.Group', on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    # see rest_framework_fine_permissions.codec for the format
+    filter = models.JSONField()
+
+    class Meta:
+        verbose_name = _('group filter permission')
+        verbose_name_plural = _('group filters permissions')
+        db_table = 'drf_group_filter_permissions'
+        unique_together = ('group', 'content_type',)
+
+    def __str__(self):
+        return '{0.content_type.app_label} | {0.content_type.model} | {0.group.name} | {0.filter}'\
+            .format(self)
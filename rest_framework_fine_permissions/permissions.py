@@ -1,12 +1,15 @@
 """ Provides new permission policies for django-rest-framework
 """
 
-from rest_framework.permissions import BasePermission, DjangoModelPermissions
-from rest_framework_fine_permissions.models import FilterPermissionModel
-from rest_framework_fine_permissions.serializers import QSerializer
+from collections import defaultdict
 
-from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ObjectDoesNotExist
+from rest_framework.permissions import BasePermission, DjangoModelPermissions
+from rest_framework_fine_permissions.evaluator import (
+    afilter_matching, amatches, filter_matching, matches)
+from rest_framework_fine_permissions.instrumentation import get_instrumentation
+from rest_framework_fine_permissions.qcache import load_granted_filter
+from rest_framework_fine_permissions.snapshot import (
+    aget_permission_snapshot, get_permission_snapshot)
 
 
 class FullDjangoModelPermissions(DjangoModelPermissions):
@@ -45,21 +48,105 @@ class FilterPermission(BasePermission):
         user = request.user
 
         if not user.is_superuser and not user.is_anonymous:
-            valid = False
-            try:
-                ct = ContentType.objects.get_for_model(obj)
-                fpm = FilterPermissionModel.objects.get(user=user,
-                                                        content_type=ct)
-                myq = QSerializer(base64=True).loads(fpm.filter)
+            grants = get_permission_snapshot(request)\
+                .get_filter_permissions(obj.__class__)
+            if not grants:
+                return True
+
+            with get_instrumentation().phase('object_check'):
                 try:
-                    myobj = obj.__class__.objects.filter(myq).distinct().get(pk=obj.pk)
-                    if myobj:
-                        valid = True
-                except ObjectDoesNotExist:
-                    valid = False
-            except ObjectDoesNotExist:
-                valid = True
-            finally:
-                return valid
+                    q, plans = load_granted_filter(grants, obj.__class__)
+                    return matches(q, obj, plans)
+                except Exception:
+                    # an unusable filter never grants access
+                    return False
         else:
             return True
+
+    async def ahas_object_permission(self, request, view, obj):
+        """
+        async version of has_object_permission, for async views
+        """
+
+        user = request.user
+        if user.is_superuser or user.is_anonymous:
+            return True
+
+        snapshot = await aget_permission_snapshot(request)
+        grants = snapshot.get_filter_permissions(obj.__class__)
+        if not grants:
+            return True
+
+        with get_instrumentation().phase('object_check'):
+            try:
+                q, plans = load_granted_filter(grants, obj.__class__)
+                return await amatches(q, obj, plans)
+            except Exception:
+                # an unusable filter never grants access
+                return False
+
+    @staticmethod
+    def _by_model(objects):
+        by_model = defaultdict(list)
+        for obj in objects:
+            by_model[obj.__class__].append(obj)
+        return by_model
+
+    @classmethod
+    def filter_permitted(cls, user, objects, request=None):
+        """
+        return the objects the user is allowed to access, in their order
+
+        objects that can not be checked in memory cost one query per model
+        """
+        objects = list(objects)
+        if user.is_superuser or user.is_anonymous:
+            return objects
+
+        snapshot = get_permission_snapshot(request=request, user=user)
+        by_model = cls._by_model(objects)
+
+        permitted = set()
+        for model, model_objects in by_model.items():
+            grants = snapshot.get_filter_permissions(model)
+            if not grants:
+                permitted.update(map(id, model_objects))
+                continue
+            try:
+                q, plans = load_granted_filter(grants, model)
+                model_objects = filter_matching(q, model, model_objects,
+                                                plans)
+            except Exception:
+                # an unusable filter never grants access
+                continue
+            permitted.update(map(id, model_objects))
+
+        return [obj for obj in objects if id(obj) in permitted]
+
+    @classmethod
+    async def afilter_permitted(cls, user, objects, request=None):
+        """
+        async version of filter_permitted
+        """
+        objects = list(objects)
+        if user.is_superuser or user.is_anonymous:
+            return objects
+
+        snapshot = await aget_permission_snapshot(request=request, user=user)
+        permitted = set()
+        for model, model_objects in cls._by_model(objects).items():
+            grants = snapshot.get_filter_permissions(model)
+            if not grants:
+                permitted.update(map(id, model_objects))
+                continue
+            try:
+                q, plans = load_granted_filter(grants, model)
+                model_objects = await afilter_matching(q, model,
+                                                       model_objects, plans)
+            except Exception:
+                # an unusable filter never grants access
+                continue
+            permitted.update(map(id, model_objects))
+
+        return [obj for obj in objects if id(obj) in permitted]
+
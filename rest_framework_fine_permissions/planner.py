@@ -0,0 +1,201 @@
+""" Plan the relations to load with a queryset from the fields a user sees.
+"""
+
+from rest_framework import relations, serializers
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.constants import LOOKUP_SEP
+
+from .fields import ModelPermissionsField
+from .serializers import ModelPermissionsSerializer
+
+# same bound as the nesting depth accepted by rest framework
+MAX_DEPTH = 10
+
+
+class RelationsPlan(object):
+
+    """ Relations to select and prefetch along with a queryset.
+
+    ``columns`` maps each planned path (``''`` for the queryset itself) to
+    the model columns its rendering reads, or ``None`` when they can't be
+    known.
+    """
+
+    def __init__(self):
+        self.select_related = []
+        self.prefetch_related = []
+        self.models = {}
+        self.columns = {}
+
+    def add(self, path, single, model):
+        lookups = self.select_related if single else self.prefetch_related
+        if path not in lookups:
+            lookups.append(path)
+            self.models[path] = model
+
+    def add_columns(self, path, columns):
+        if path in self.columns and self.columns[path] is None:
+            return
+        if columns is None:
+            self.columns[path] = None
+        else:
+            self.columns.setdefault(path, set()).update(columns)
+
+    def get_only(self, extra_columns=()):
+        """ Return the ``only()`` arguments of the queryset, if prunable. """
+        columns = self.columns.get('')
+        if columns is None:
+            return None
+        only = set(columns) | set(extra_columns)
+        for path in self.select_related:
+            only.add(path)
+            if self.columns.get(path) is not None:
+                only.update(path + LOOKUP_SEP + column
+                            for column in self.columns[path])
+        return sorted(only)
+
+    def get_prefetch(self, path, only=False):
+        """ Return the prefetch lookup of a path. """
+        columns = self.columns.get(path)
+        if not only or columns is None:
+            return path
+        return Prefetch(path, queryset=self.models[path]._default_manager
+                        .only(*sorted(columns)))
+
+    def apply(self, queryset, only=False, extra_columns=()):
+        """ Apply the plan to a queryset.
+
+        With ``only``, the columns that are not rendered are not loaded
+        either, except ``extra_columns``.
+        """
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*[
+                self.get_prefetch(path, only)
+                for path in self.prefetch_related])
+        if only:
+            fields = self.get_only(extra_columns)
+            if fields is not None:
+                queryset = queryset.only(*fields)
+        return queryset
+
+
+def get_child_serializer(field, context):
+    """ Return the serializer rendering a relation, if any. """
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    if isinstance(field, serializers.ModelSerializer):
+        return field
+    if isinstance(field, ModelPermissionsField):
+        serializer_cls = field.serializer
+        if serializer_cls is None or \
+                not issubclass(serializer_cls, serializers.ModelSerializer):
+            return None
+        kwargs = {}
+        if issubclass(serializer_cls, ModelPermissionsSerializer) and \
+                isinstance(field.parent, ModelPermissionsSerializer):
+            kwargs['cached_allowed_fields'] = \
+                field.parent.cached_allowed_fields
+        return serializer_cls(context=context, **kwargs)
+    return None
+
+
+def loads_related_objects(field):
+    """ Check that rendering a field reads the related objects. """
+    if isinstance(field, relations.ManyRelatedField):
+        return True
+    if isinstance(field, relations.RelatedField):
+        return not field.use_pk_only_optimization()
+    return True
+
+
+def get_related_columns(field, related_model):
+    """ Columns of the related objects read by a non serializer field. """
+    if isinstance(field, relations.ManyRelatedField):
+        field = field.child_relation
+    pk_name = related_model._meta.pk.name
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return {pk_name}
+    if isinstance(field, relations.SlugRelatedField) and \
+            LOOKUP_SEP not in field.slug_field:
+        return {pk_name, field.slug_field}
+    return None
+
+
+def _plan(serializer, model, plan, path, single, seen, depth, required=()):
+    columns = {model._meta.pk.name} | set(required)
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        source = field.source
+        try:
+            if not source or source == '*' or '.' in source:
+                raise FieldDoesNotExist
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            # computed values may read any column
+            columns = None
+            continue
+
+        if model_field.is_relation and model_field.related_model is None:
+            # generic foreign keys read columns of their own
+            columns = None
+        elif columns is not None and model_field.concrete and \
+                not model_field.many_to_many:
+            columns.add(model_field.name)
+
+        if not model_field.is_relation or model_field.related_model is None \
+                or not loads_related_objects(field):
+            continue
+
+        related_model = model_field.related_model
+        field_path = path + LOOKUP_SEP + source if path else source
+        field_single = single and (
+            model_field.many_to_one or model_field.one_to_one)
+        plan.add(field_path, field_single, related_model)
+
+        # rows of a reverse relation are matched on their foreign key
+        child_required = ()
+        if model_field.auto_created and not model_field.concrete and \
+                not model_field.many_to_many:
+            child_required = (model_field.field.name,)
+
+        child = get_child_serializer(field, serializer.context)
+        if child is None:
+            related_columns = get_related_columns(field, related_model)
+            if related_columns is not None:
+                related_columns |= set(child_required)
+            plan.add_columns(field_path, related_columns)
+        elif child.__class__ in seen or depth >= MAX_DEPTH:
+            plan.add_columns(field_path, None)
+        else:
+            _plan(child, related_model, plan, field_path, field_single,
+                  seen | {child.__class__}, depth + 1, child_required)
+
+    plan.add_columns(path, columns)
+
+
+def plan_relations(serializer):
+    """ Return the relations rendered by a serializer.
+
+    The serializer fields are built from the user's permissions, so only
+    the relations and columns the user can see are planned.
+    """
+    plan = RelationsPlan()
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is not None:
+        _plan(serializer, model, plan, '', True, {serializer.__class__}, 0)
+    return plan
+
+
+def optimize_queryset(queryset, serializer, only=False, extra_columns=()):
+    """ Load the relations rendered by a serializer along with a queryset.
+
+    With ``only``, the columns that are not rendered are not loaded
+    either, except ``extra_columns``.
+    """
+    return plan_relations(serializer).apply(queryset, only, extra_columns)
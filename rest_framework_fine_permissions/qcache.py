@@ -0,0 +1,194 @@
+""" Bounded cache of the Q objects decoded from filter permissions.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.core.exceptions import FieldError
+from django.db.models import Q
+
+from .conf import get_setting
+from .instrumentation import get_instrumentation
+from .resolver import resolve_filter
+from .codec import decode, decode_plans
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def filter_digest(data):
+    """ Return the digest of a stored filter. """
+    if not isinstance(data, str):
+        data = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def copy_q(q):
+    """ Copy a Q tree, sharing only its immutable values. """
+    clone = Q()
+    clone.connector = q.connector
+    clone.negated = q.negated
+    clone.children = [
+        copy_q(child) if isinstance(child, Q) else (
+            (child[0], list(child[1])) if isinstance(child[1], list)
+            else child)
+        for child in q.children
+    ]
+    return clone
+
+
+class QCache(object):
+
+    """ Thread-safe LRU of decoded Q objects keyed by filter digest.
+
+    Values are copied with ``copy`` when read, read-only values can be
+    cached with ``copy=None``.
+    """
+
+    def __init__(self, maxsize=None, copy=copy_q):
+        self._maxsize = maxsize
+        self._copy = copy
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is None:
+            return get_setting('FILTER_CACHE_SIZE')
+        return self._maxsize
+
+    def get(self, key, default=None):
+        """ Return a copy of the cached Q object. """
+        with self._lock:
+            q = self._data.get(key)
+            if q is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        return self._copy(q) if self._copy else q
+
+    def set(self, key, q):
+        """ Store a Q object, evicting the least recently used ones. """
+        maxsize = self.maxsize
+        if not maxsize:
+            return
+        with self._lock:
+            self._data[key] = q
+            self._data.move_to_end(key)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def info(self):
+        """ Report the cache statistics. """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize,
+                             len(self._data))
+
+    def clear(self):
+        """ Empty the cache and reset its statistics. """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+def _copy_compiled(compiled):
+    if isinstance(compiled, FieldError):
+        return compiled
+    return copy_q(compiled[0]), compiled[1]
+
+
+q_cache = QCache()
+# plans of the lookups, or the FieldError of an invalid filter, by filter
+# digest and model
+plan_cache = QCache(copy=None)
+# filters combined with their plans, or a FieldError, by filter digests and
+# model
+compiled_cache = QCache(copy=_copy_compiled)
+
+
+def load_filter(data, digest=None):
+    """ Decode a stored filter into a Q object, using the cache. """
+    return _load_filter(digest or filter_digest(data), data)
+
+
+def _load_filter(key, data):
+    q = q_cache.get(key)
+    get_instrumentation().cache_event('filters', q is not None)
+    if q is None:
+        q = decode(data)
+        q_cache.set(key, q)
+        q = copy_q(q)
+    return q
+
+
+def load_resolved_filter(data, model, digest=None):
+    """ Decode a stored filter and the plans of its lookups on a model.
+
+    The plans stored with the filter are used as is, the others are resolved
+    once. FieldError is raised when the filter is not valid for the model,
+    so that it never reaches the database.
+    """
+    digest = digest or filter_digest(data)
+    q = _load_filter(digest, data)
+    key = '%s:%s' % (digest, model._meta.label_lower)
+    plans = plan_cache.get(key)
+    if plans is None:
+        plans = decode_plans(data)
+        if plans is None:
+            try:
+                plans = resolve_filter(q, model)
+            except FieldError as e:
+                plans = e
+        plan_cache.set(key, plans)
+    if isinstance(plans, FieldError):
+        raise plans
+    return q, plans
+
+
+def load_effective_filter(datas, model, digests=None):
+    """ Combine stored filters into the Q object matching any of them.
+
+    The combination is compiled once per set of filters and model, so that
+    it is shared by the users of the same groups. Invalid filters grant
+    nothing, FieldError is raised when none of them is valid. The digests
+    of the filters spare their computation when given.
+    """
+    if digests is None:
+        digests = [filter_digest(data) for data in datas]
+    if len(datas) == 1:
+        return load_resolved_filter(datas[0], model, digests[0])
+
+    key = '%s:%s' % (','.join(sorted(digests)), model._meta.label_lower)
+    compiled = compiled_cache.get(key)
+    if compiled is None:
+        q, plans, errors = Q(), {}, []
+        for data, digest in zip(datas, digests):
+            try:
+                data_q, data_plans = load_resolved_filter(data, model, digest)
+            except FieldError as e:
+                errors.append(e)
+                continue
+            if not data_q.children:
+                # an unrestricted filter, Q.__or__ would drop it
+                q, plans, errors = Q(), {}, []
+                break
+            q |= data_q
+            plans.update(data_plans)
+        compiled = errors[0] if len(errors) == len(datas) else (q, plans)
+        compiled_cache.set(key, compiled)
+        compiled = _copy_compiled(compiled)
+    if isinstance(compiled, FieldError):
+        raise compiled
+    return compiled
+
+
+def load_granted_filter(grants, model):
+    """ Combine the filters granted by a snapshot, keyed by the digests
+    computed when they were loaded. """
+    return load_effective_filter(
+        [grant.filter for grant in grants], model,
+        [grant.digest or filter_digest(grant.filter) for grant in grants])
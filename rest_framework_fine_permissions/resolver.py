@@ -0,0 +1,74 @@
+""" Resolution of the lookups of filter permissions against the models.
+
+A lookup such as ``account__user__username__istartswith`` is split into
+the relations to join, the final field, its transforms and the lookup, so
+that a filter is validated once, when it is saved, rather than by the
+database on each request.
+"""
+
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import Col
+
+LookupPlan = namedtuple('LookupPlan', ['joins', 'field', 'transforms',
+                                       'lookup'])
+
+
+def _get_field(opts, name):
+    return opts.pk if name == 'pk' else opts.get_field(name)
+
+
+def resolve_lookup(model, lookup):
+    """ Resolve a lookup into a plan, raise FieldError when invalid. """
+    parts = lookup.split(LOOKUP_SEP)
+    try:
+        field = _get_field(model._meta, parts[0])
+    except FieldDoesNotExist:
+        raise FieldError('Cannot resolve keyword %r into field of %s' % (
+            parts[0], model._meta.label))
+
+    names = [parts[0]]
+    for name in parts[1:]:
+        if not field.is_relation or field.related_model is None:
+            break
+        try:
+            field = _get_field(field.related_model._meta, name)
+        except FieldDoesNotExist:
+            break
+        names.append(name)
+
+    lhs = field
+    rest = parts[len(names):]
+    transforms = []
+    lookup_name = 'exact'
+    for index, name in enumerate(rest):
+        if index == len(rest) - 1 and lhs.get_lookup(name) is not None:
+            lookup_name = name
+            break
+        transform = getattr(lhs, 'get_transform', lambda name: None)(name)
+        if transform is None:
+            raise FieldError('Unsupported lookup %r for %s in %r' % (
+                name, lhs.__class__.__name__, lookup))
+        transforms.append(name)
+        lhs = transform(Col(None, lhs)).output_field
+    if lhs.get_lookup(lookup_name) is None:
+        raise FieldError('Unsupported lookup %r for %s in %r' % (
+            lookup_name, lhs.__class__.__name__, lookup))
+
+    return LookupPlan(tuple(names[:-1]), names[-1], tuple(transforms),
+                      lookup_name)
+
+
+def resolve_filter(q, model):
+    """ Resolve every lookup of a Q object, raise FieldError when invalid.
+    """
+    plans = {}
+    for child in q.children:
+        if isinstance(child, Q):
+            plans.update(resolve_filter(child, model))
+        elif child[0] not in plans:
+            plans[child[0]] = resolve_lookup(model, child[0])
+    return plans
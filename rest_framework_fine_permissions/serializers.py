@@ -2,18 +2,35 @@
 """
 
 import base64
+import copy
 import json
 import time
+import weakref
 from collections import OrderedDict
 from datetime import datetime, date
+from functools import lru_cache
 
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.utils import model_meta
 from rest_framework.utils.field_mapping import get_relation_kwargs
 
 from django.core.serializers.base import SerializationError
 from django.db.models import Q
 
-from .models import FieldPermission
+from .instrumentation import get_instrumentation
+from .snapshot import get_permission_snapshot
+
+_serializer_metadata = weakref.WeakKeyDictionary()
+# methods of ModelSerializer computing the metadata of a serializer class
+_METADATA_HOOKS = ('get_field_names', 'get_default_field_names',
+                   'get_extra_kwargs')
+
+
+@lru_cache(maxsize=None)
+def get_model_info(model):
+    """ Retrieve the fields and relations of a model, once per model. """
+    return model_meta.get_field_info(model)
 
 
 class ModelPermissionsSerializer(serializers.ModelSerializer):
@@ -44,54 +61,133 @@ class ModelPermissionsSerializer(serializers.ModelSerializer):
 
     def _get_user_allowed_fields(self):
         """ Retrieve all allowed field names ofr authenticated user. """
-        model_name = self.Meta.model.__name__.lower()
-        app_label = self.Meta.model._meta.app_label
-        full_model_name = '%s.%s' % (app_label, model_name)
+        full_model_name = self.Meta.model._meta.label_lower
         permissions = self.cached_allowed_fields.get(full_model_name)
 
-        if not permissions:
-            permissions = FieldPermission.objects.filter(
-                user_field_permissions__user=self.user,
-                content_type__model=model_name,
-                content_type__app_label=app_label
-            )
+        if permissions is None:
+            with get_instrumentation().phase('allowed_fields'):
+                permissions = self._get_permission_snapshot()\
+                    .get_allowed_fields(self.Meta.model)
             self.cached_allowed_fields[full_model_name] = permissions
         return permissions
 
+    async def aload_permissions(self):
+        """ Load the permissions of the user with the async ORM, the fields
+        are then built without queries from async views. """
+        await self._get_permission_snapshot().aload()
+        return self
+
+    def _get_permission_snapshot(self):
+        """ Retrieve the permission snapshot shared by the request. """
+        return get_permission_snapshot(request=self.context.get('request'),
+                                       user=self.user, context=self.context)
+
+    def _get_serializer_metadata(self):
+        """ Retrieve the user independent metadata of the serializer class.
+
+        Model info, field names and extra kwargs only depend on the class, so
+        they are computed once and shared by all its instances, unless the
+        class overrides the hooks computing them, which may then depend on
+        the instance.
+        """
+        cls = self.__class__
+        metadata = _serializer_metadata.get(cls)
+        if metadata is None:
+            assert hasattr(self, 'Meta'), (
+                'Class {serializer_class} missing "Meta" attribute'.format(
+                    serializer_class=cls.__name__))
+            assert hasattr(self.Meta, 'model'), (
+                'Class {serializer_class} missing "Meta.model" attribute'
+                .format(serializer_class=cls.__name__))
+            if model_meta.is_abstract_model(self.Meta.model):
+                raise ValueError(
+                    'Cannot use ModelSerializer with Abstract Models.')
+
+            info = get_model_info(self.Meta.model)
+            metadata = (
+                info,
+                self.get_field_names(self._declared_fields, info),
+                self.get_extra_kwargs(),
+            )
+            if not any(getattr(cls, hook) is not getattr(
+                    ModelPermissionsSerializer, hook)
+                    for hook in _METADATA_HOOKS):
+                _serializer_metadata[cls] = metadata
+        return metadata
+
+    def _build_fields(self, field_names, info, extra_kwargs):
+        """ Build the serializer fields of the given names only. """
+        if self.url_field_name is None:
+            self.url_field_name = api_settings.URL_FIELD_NAME
+
+        model = self.Meta.model
+        depth = getattr(self.Meta, 'depth', 0)
+        if depth is not None:
+            assert depth >= 0, "'depth' may not be negative."
+            assert depth <= 10, "'depth' may not be greater than 10."
+        declared_fields = self._declared_fields
+        extra_kwargs, hidden_fields = self.get_uniqueness_extra_kwargs(
+            field_names, declared_fields, dict(extra_kwargs))
+
+        fields = OrderedDict()
+        for field_name in field_names:
+            if field_name in declared_fields:
+                fields[field_name] = copy.deepcopy(declared_fields[field_name])
+                continue
+
+            extra_field_kwargs = copy.deepcopy(
+                extra_kwargs.get(field_name, {}))
+            source = extra_field_kwargs.get('source', '*')
+            if source == '*':
+                source = field_name
+
+            field_class, field_kwargs = self.build_field(
+                source, info, model, depth)
+            field_kwargs = self.include_extra_kwargs(
+                field_kwargs, extra_field_kwargs)
+            fields[field_name] = field_class(**field_kwargs)
+
+        fields.update(hidden_fields)
+        return fields
+
     def get_fields(self):
         """ Calculate fields that can be accessed by authenticated user. """
+        with get_instrumentation().phase('get_fields'):
+            return self._get_permitted_fields()
+
+    def _get_permitted_fields(self):
         ret = OrderedDict()
 
         # no rights to see anything
         if not self.user:
             return ret
 
-        # all fields that can be accessed through serializer
-        fields = super(ModelPermissionsSerializer, self).get_fields()
+        info, field_names, extra_kwargs = self._get_serializer_metadata()
 
         # superuser can see all the fields
         if self.user.is_superuser:
-            return fields
+            return self._build_fields(field_names, info, extra_kwargs)
 
-        # fields that can be accessed by auhtenticated user
+        # only build the fields that can be accessed by authenticated user
         allowed_fields = self._get_user_allowed_fields()
-        for allowed_field in allowed_fields:
-            field = fields[allowed_field.name]
+        fields = self._build_fields(
+            [name for name in field_names if name in allowed_fields],
+            info, extra_kwargs)
 
+        for field_name, field in fields.items():
             # subfields are NestedModelSerializer
             if isinstance(field, ModelPermissionsSerializer):
                 # no rights on subfield's fields
                 # calculate how the relation should be retrieved
                 if not field.get_fields():
                     field_cls = field._related_class
-                    kwargs = get_relation_kwargs(allowed_field.name,
-                                                 field.info)
+                    kwargs = get_relation_kwargs(field_name, field.info)
                     if not issubclass(field_cls,
                                       serializers.HyperlinkedRelatedField):
                         kwargs.pop('view_name', None)
                     field = field_cls(**kwargs)
 
-            ret[allowed_field.name] = field
+            ret[field_name] = field
         return ret
 
     def _get_default_field_names(self, declared_fields, model_info):
@@ -118,6 +214,20 @@ class ModelPermissionsSerializer(serializers.ModelSerializer):
         return NestedModelPermissionSerializer
 
 
+@lru_cache(maxsize=None)
+def _timestamp_bounds():
+    """ Timestamps replacing the missing bounds of a range. """
+    try:
+        min_ts = time.mktime(datetime.min.timetuple())
+    except OverflowError:
+        # This Exception is thrown by some PC / MAC architectures which
+        # can't work with dates before Epoch (01-01-1970). That's why, in
+        # this case we take as minimal value the EPOCH (gmtime(0)).
+        min_ts = time.mktime(time.gmtime(0))
+    max_ts = time.mktime((3000,) + (0,) * 8)
+    return min_ts, max_ts
+
+
 class QSerializer():
     """
     A Q object serializer base class. Use json.
@@ -127,14 +237,7 @@ class QSerializer():
     def __init__(self, base64=False):
         if base64:
             self.b64_enabled = True
-        try:
-            self.min_ts = time.mktime(datetime.min.timetuple())
-        except OverflowError:
-            # This Exception is thrown by some PC / MAC architectures which
-            # can't work with dates before Epoch (01-01-1970). That's why, in
-            # this case we take as minimal value the EPOCH (gmtime(0)).
-            self.min_ts = time.mktime(time.gmtime(0))
-        self.max_ts = time.mktime((3000,) + (0,) * 8)
+        self.min_ts, self.max_ts = _timestamp_bounds()
         self.dt2ts = lambda obj: time.mktime(obj.timetuple()) if isinstance(
             obj, date) else obj
 
@@ -0,0 +1,264 @@
+""" Receivers keeping the permissions cache and the materialized table up to
+date, preloading the permissions of the users logging in, and forgetting
+the registry of the field permissions when the code changes.
+"""
+
+from functools import partial
+
+from django.contrib.auth import get_user_model, user_logged_in
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.autoreload import file_changed
+
+from .cache import (
+    get_cache, invalidate_filters, invalidate_groups, invalidate_users)
+from .conf import get_setting
+from .materialized import refresh_users
+from .models import (
+    FieldPermission, FilterPermissionModel, GroupFieldPermissions,
+    GroupFilterPermissionModel, UserFieldPermissions)
+from .snapshot import get_permission_snapshot
+from .utils import clear_registry
+
+User = get_user_model()
+
+
+def _tracking():
+    """ Check that permission changes have to be propagated. """
+    return get_cache() is not None or get_setting('MATERIALIZE')
+
+
+def _changed(user_ids, labels=None, groups=False):
+    """ Propagate a change of the field grants of some users.
+
+    Only the given models changed when ``labels`` is set, ``groups`` tells
+    that grants of groups changed. The cache is invalidated once the change
+    is committed, by changing the generation tokens read before loading.
+    """
+    user_ids = set(user_ids)
+    if get_setting('MATERIALIZE'):
+        refresh_users(user_ids, labels)
+    if groups:
+        transaction.on_commit(invalidate_groups)
+    transaction.on_commit(partial(invalidate_users, user_ids))
+
+
+def _labels(permissions):
+    return {'%s.%s' % label for label in permissions.values_list(
+        'content_type__app_label', 'content_type__model').distinct()}
+
+
+def _holders(user_field_permissions):
+    return set(user_field_permissions.values_list('user_id', flat=True))
+
+
+def _members(group_ids):
+    if not hasattr(User, 'groups'):
+        return set()
+    return set(User._default_manager.filter(groups__in=group_ids)
+               .values_list('pk', flat=True))
+
+
+def _group_holders(group_field_permissions):
+    return _members(group_field_permissions.values_list('group_id'))
+
+
+def _filter_holders(instance):
+    if isinstance(instance, GroupFilterPermissionModel):
+        return _members([instance.group_id])
+    return {instance.user_id}
+
+
+def _apply_clear(instance):
+    """ Propagate the change remembered before a clear. """
+    change = getattr(instance, '_permissions_clearing', None)
+    if change is not None:
+        del instance._permissions_clearing
+        _changed(*change)
+
+
+@receiver(m2m_changed, sender=UserFieldPermissions.permissions.through)
+def user_field_permissions_changed(sender, instance, action, reverse,
+                                   model, pk_set, **kwargs):
+    """ Propagate the models whose field grants were added or removed. """
+    if not _tracking():
+        return
+
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            _changed(
+                _holders(model.objects.filter(pk__in=pk_set)),
+                _labels(FieldPermission.objects.filter(pk=instance.pk)))
+        else:
+            _changed(
+                [instance.user_id],
+                _labels(model.objects.filter(pk__in=pk_set)))
+    elif action == 'pre_clear':
+        # the grants are gone after the clear, remember them
+        if reverse:
+            instance._permissions_clearing = (
+                _holders(instance.user_field_permissions.all()),
+                _labels(FieldPermission.objects.filter(pk=instance.pk)))
+        else:
+            instance._permissions_clearing = (
+                [instance.user_id], _labels(instance.permissions.all()))
+    elif action == 'post_clear':
+        _apply_clear(instance)
+
+
+@receiver(m2m_changed, sender=GroupFieldPermissions.permissions.through)
+def group_field_permissions_changed(sender, instance, action, reverse,
+                                    model, pk_set, **kwargs):
+    """ Propagate to the members of the groups whose field grants were
+    added or removed. """
+    if not _tracking():
+        return
+
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            _changed(
+                _group_holders(model.objects.filter(pk__in=pk_set)),
+                _labels(FieldPermission.objects.filter(pk=instance.pk)),
+                groups=True)
+        else:
+            _changed(_members([instance.group_id]),
+                     _labels(model.objects.filter(pk__in=pk_set)),
+                     groups=True)
+    elif action == 'pre_clear':
+        if reverse:
+            instance._permissions_clearing = (
+                _group_holders(instance.group_field_permissions.all()),
+                _labels(FieldPermission.objects.filter(pk=instance.pk)),
+                True)
+        else:
+            instance._permissions_clearing = (
+                _members([instance.group_id]),
+                _labels(instance.permissions.all()), True)
+    elif action == 'post_clear':
+        _apply_clear(instance)
+
+
+@receiver(post_save, sender=FieldPermission)
+def field_permission_saved(sender, instance, created, **kwargs):
+    """ Propagate to the users holding a modified field permission. """
+    if not created and _tracking():
+        group_holders = _group_holders(
+            instance.group_field_permissions.all())
+        _changed(
+            _holders(instance.user_field_permissions.all()) | group_holders,
+            groups=bool(group_holders))
+
+
+@receiver(pre_delete, sender=FieldPermission)
+def field_permission_deleting(sender, instance, **kwargs):
+    """ Remember the holders, their grants are gone after the deletion. """
+    if _tracking():
+        group_holders = _group_holders(
+            instance.group_field_permissions.all())
+        instance._cache_invalidation = (
+            _holders(instance.user_field_permissions.all()) | group_holders,
+            _labels(FieldPermission.objects.filter(pk=instance.pk)),
+            bool(group_holders))
+
+
+@receiver(post_delete, sender=FieldPermission)
+def field_permission_deleted(sender, instance, **kwargs):
+    """ Propagate to the users who held a deleted field permission. """
+    invalidation = getattr(instance, '_cache_invalidation', None)
+    if invalidation is not None:
+        _changed(*invalidation)
+
+
+@receiver(post_delete, sender=UserFieldPermissions)
+def user_field_permissions_deleted(sender, instance, **kwargs):
+    """ Propagate to a user whose field permissions were all removed. """
+    if _tracking():
+        _changed([instance.user_id])
+
+
+@receiver(post_delete, sender=GroupFieldPermissions)
+def group_field_permissions_deleted(sender, instance, **kwargs):
+    """ Propagate to the members of a group whose field permissions were
+    all removed. """
+    if _tracking():
+        _changed(_members([instance.group_id]), groups=True)
+
+
+@receiver(pre_save, sender=FilterPermissionModel)
+@receiver(pre_save, sender=GroupFilterPermissionModel)
+def filter_permission_saving(sender, instance, **kwargs):
+    """ Remember the holders of a modified filter, it may change owner. """
+    if get_cache() is not None and instance.pk is not None:
+        previous = sender._default_manager.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._filters_invalidation = _filter_holders(previous)
+
+
+@receiver(post_save, sender=FilterPermissionModel)
+@receiver(post_save, sender=GroupFilterPermissionModel)
+@receiver(post_delete, sender=FilterPermissionModel)
+@receiver(post_delete, sender=GroupFilterPermissionModel)
+def filter_permission_changed(sender, instance, **kwargs):
+    """ Drop the cached filters of the users holding a filter. """
+    if get_cache() is not None:
+        transaction.on_commit(partial(
+            invalidate_filters, _filter_holders(instance) | getattr(
+                instance, '_filters_invalidation', set())))
+
+
+@receiver(user_logged_in)
+def preload_permissions(sender, request, user, **kwargs):
+    """ Load the permissions of a user signing in, with
+    ``FINE_PERMISSIONS_PRELOAD_ON_LOGIN``. """
+    if get_setting('PRELOAD_ON_LOGIN'):
+        get_permission_snapshot(request, user).preload()
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    """ Remember the members, they are gone after the deletion. """
+    if _tracking():
+        instance._cache_invalidation = (_members([instance.pk]), None, True)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    """ Propagate to the members of a deleted group. """
+    invalidation = getattr(instance, '_cache_invalidation', None)
+    if invalidation is not None:
+        _changed(*invalidation)
+
+
+if hasattr(User, 'groups'):
+    @receiver(m2m_changed, sender=User.groups.through)
+    def user_groups_changed(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+        """ Propagate to the users joining or leaving groups. """
+        if not _tracking():
+            return
+
+        if action in ('post_add', 'post_remove'):
+            _changed(pk_set if reverse else [instance.pk])
+        elif action == 'pre_clear':
+            instance._permissions_clearing = (
+                _members([instance.pk]) if reverse else [instance.pk],)
+        elif action == 'post_clear':
+            _apply_clear(instance)
+
+
+@receiver(file_changed)
+def code_changed(sender, file_path, **kwargs):
+    """ Forget the registry when the autoreloader sees a change, the reload
+    goes on. """
+    clear_registry()
+
+
+@receiver(setting_changed)
+def apps_changed(sender, setting, **kwargs):
+    """ Forget the registry when the installed apps change. """
+    if setting == 'INSTALLED_APPS':
+        clear_registry()
@@ -0,0 +1,462 @@
+"""
+"""
+
+import sys
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+from django.db.models import CharField, IntegerField, Value
+
+from . import cache as permissions_cache
+from .conf import get_setting
+from .instrumentation import get_instrumentation
+from .models import (
+    EffectiveFieldPermissions, FieldPermission, FilterPermissionModel,
+    GroupFilterPermissionModel)
+
+SNAPSHOT_ATTRIBUTE = '_fine_permissions_snapshot'
+
+# a stored filter of the user, or of one of their groups, and the digest
+# keying its decoded forms, computed once when it is loaded
+FilterGrant = namedtuple('FilterGrant', ['pk', 'filter', 'group_id',
+                                         'digest'], defaults=(None,))
+
+
+def get_model_label(model, for_concrete_model=False):
+    """ Return the ``app_label.model_name`` key of a model. """
+    if for_concrete_model:
+        model = model._meta.concrete_model
+    return model._meta.label_lower
+
+
+def get_content_type_label(content_type):
+    """ Return the ``app_label.model_name`` key of a content type. """
+    return '%s.%s' % (content_type.app_label, content_type.model)
+
+
+@lru_cache(maxsize=4096)
+def _freeze_names(names):
+    return frozenset(map(sys.intern, names))
+
+
+def freeze_names(names):
+    """ Return the allowed field names as a frozenset of interned strings.
+
+    Identical grants share the same frozenset, so that the users of a same
+    profile cost a single set per model.
+    """
+    return _freeze_names(tuple(sorted(set(names))))
+
+
+def get_field_permission_labels():
+    """ Return the labels of the models having field permissions. """
+    return {'%s.%s' % label for label in FieldPermission.objects.values_list(
+        'content_type__app_label', 'content_type__model').distinct()}
+
+
+def _get_memberships(user):
+    """ Return the group memberships of a user and the name of their group
+    column, ``None`` if the user can't have any. """
+    if user is None or user.pk is None or not hasattr(user, 'groups'):
+        return None
+    field = user._meta.get_field('groups')
+    return (field.remote_field.through._default_manager.filter(
+        **{field.m2m_field_name(): user.pk}), field.m2m_reverse_field_name())
+
+
+def _group_field_permissions_query(group_ids):
+    return FieldPermission.objects.filter(
+        group_field_permissions__group__in=group_ids
+    ).values_list('content_type__app_label', 'content_type__model',
+                  'name').order_by('pk').distinct()
+
+
+def _read_group_field_permissions(rows):
+    grants = defaultdict(list)
+    for app_label, model_name, name in rows:
+        grants['%s.%s' % (app_label, model_name)].append(name)
+    return dict(grants)
+
+
+def load_group_field_permissions(group_ids):
+    """ Load the field grants of a set of groups with a single query. """
+    return _read_group_field_permissions(
+        _group_field_permissions_query(group_ids))
+
+
+async def aload_group_field_permissions(group_ids):
+    """ Async version of ``load_group_field_permissions``. """
+    return _read_group_field_permissions(
+        [row async for row in _group_field_permissions_query(group_ids)])
+
+
+def _merge_group_grants(grants, group_grants):
+    for label, names in group_grants.items():
+        granted = grants[label]
+        granted.extend(name for name in names if name not in granted)
+    return grants
+
+
+class PermissionSnapshot(object):
+
+    """ Field and filter permissions of a user, loaded once on first use.
+
+    Under ASGI, ``aload()`` loads them with the async ORM beforehand, the
+    snapshot is then read without any I/O.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._field_permissions = None
+        self._filter_permissions = None
+        self._group_ids = None
+        self._allowed_fields = {}
+        self._cache_generation = None
+        self._loaded = False
+
+    def _is_anonymous(self):
+        return self.user is None or self.user.pk is None
+
+    def _field_permissions_query(self):
+        """ Return the query of the field grants of the user.
+
+        The user's grants and groups are read with a single query, unless
+        the grants are materialized.
+        """
+        if get_setting('MATERIALIZE'):
+            return EffectiveFieldPermissions.objects.filter(
+                user=self.user
+            ).values_list('content_type__app_label', 'content_type__model',
+                          'names')
+        rows = FieldPermission.objects.filter(
+            user_field_permissions__user=self.user
+        ).values_list('pk', 'content_type__app_label', 'content_type__model',
+                      'name')
+        memberships = _get_memberships(self.user)
+        if memberships is not None and self._group_ids is None:
+            # memberships come with an empty app label
+            empty = Value('', output_field=CharField())
+            queryset, group = memberships
+            rows = rows.union(queryset.values_list(
+                group, empty, empty, empty), all=True)
+        return rows
+
+    def _read_field_permissions(self, rows):
+        grants = defaultdict(list)
+        if get_setting('MATERIALIZE'):
+            for app_label, model_name, names in rows:
+                grants['%s.%s' % (app_label, model_name)] = names
+            return grants
+
+        group_ids = set()
+        for pk, app_label, model_name, name in sorted(rows):
+            if app_label:
+                grants['%s.%s' % (app_label, model_name)].append(name)
+            else:
+                group_ids.add(pk)
+        if self._group_ids is None:
+            self._group_ids = frozenset(group_ids)
+        return grants
+
+    def _load_field_permissions(self):
+        """ Load the field grants of the user and of their groups, the
+        grants of the groups are shared by group set. """
+        if self._is_anonymous():
+            return defaultdict(list)
+        grants = self._read_field_permissions(self._field_permissions_query())
+        if get_setting('MATERIALIZE'):
+            return grants
+        return _merge_group_grants(
+            grants, self._load_group_field_permissions())
+
+    async def _aload_field_permissions(self):
+        if self._is_anonymous():
+            return defaultdict(list)
+        grants = self._read_field_permissions(
+            [row async for row in self._field_permissions_query()])
+        if get_setting('MATERIALIZE'):
+            return grants
+        return _merge_group_grants(
+            grants, await self._aload_group_field_permissions())
+
+    def _load_group_field_permissions(self):
+        """ Load the field grants of the groups, shared by group set. """
+        group_ids = self.group_ids
+        if not group_ids:
+            return {}
+
+        cache = permissions_cache.get_cache()
+        if cache is not None:
+            generation = permissions_cache.get_groups_generation(cache)
+            grants = permissions_cache.get_group_field_permissions(
+                cache, generation, group_ids)
+            get_instrumentation().cache_event('groups', grants is not None)
+            if grants is not None:
+                return grants
+
+        grants = load_group_field_permissions(group_ids)
+        if cache is not None:
+            permissions_cache.set_group_field_permissions(
+                cache, generation, group_ids, grants)
+        return grants
+
+    async def _aload_group_field_permissions(self):
+        # the group ids were read along with the user's grants
+        group_ids = self._group_ids
+        if not group_ids:
+            return {}
+
+        cache = permissions_cache.get_cache()
+        if cache is not None:
+            generation = await permissions_cache.aget_groups_generation(cache)
+            grants = await permissions_cache.aget_group_field_permissions(
+                cache, generation, group_ids)
+            get_instrumentation().cache_event('groups', grants is not None)
+            if grants is not None:
+                return grants
+
+        grants = await aload_group_field_permissions(group_ids)
+        if cache is not None:
+            await permissions_cache.aset_group_field_permissions(
+                cache, generation, group_ids, grants)
+        return grants
+
+    def _filter_permissions_query(self):
+        """ Return the query of the filters of the user and of their groups.
+        """
+        rows = FilterPermissionModel.objects.filter(
+            user=self.user
+        ).values_list('content_type__app_label', 'content_type__model', 'pk',
+                      'filter', Value(None, output_field=IntegerField()))
+        memberships = _get_memberships(self.user)
+        if memberships is not None and self._group_ids != frozenset():
+            queryset, group = memberships
+            group_ids = self._group_ids if self._group_ids is not None \
+                else queryset.values(group)
+            rows = rows.union(GroupFilterPermissionModel.objects.filter(
+                group__in=group_ids
+            ).values_list('content_type__app_label', 'content_type__model',
+                          'pk', 'filter', 'group_id'), all=True)
+        return rows
+
+    def _read_filter_permissions(self, rows):
+        # the qcache module imports the serializers, which import this one
+        from .qcache import filter_digest
+
+        filters = defaultdict(list)
+        for app_label, model_name, pk, data, group_id in rows:
+            filters['%s.%s' % (app_label, model_name)].append(
+                FilterGrant(pk, data, group_id, filter_digest(data)))
+        for grants in filters.values():
+            # the personal filter first, then the groups' ones
+            grants.sort(key=lambda grant: (grant.group_id is not None,
+                                           grant.group_id or 0))
+        return filters
+
+    def _load_filter_permissions(self):
+        """ Load the filters of the user and of their groups with a single
+        query. """
+        if self._is_anonymous():
+            return defaultdict(list)
+        return self._read_filter_permissions(self._filter_permissions_query())
+
+    async def _aload_filter_permissions(self):
+        if self._is_anonymous():
+            return defaultdict(list)
+        return self._read_filter_permissions(
+            [row async for row in self._filter_permissions_query()])
+
+    @property
+    def group_ids(self):
+        """ Primary keys of the groups of the user. """
+        if self._group_ids is None:
+            memberships = _get_memberships(self.user)
+            if memberships is None:
+                self._group_ids = frozenset()
+            else:
+                queryset, group = memberships
+                self._group_ids = frozenset(
+                    queryset.values_list(group, flat=True))
+        return self._group_ids
+
+    @property
+    def field_permissions(self):
+        if self._field_permissions is None:
+            cache = self._get_cache()
+            if cache is not None:
+                # read the token first, a change committed while loading
+                # then invalidates what is cached from the former rows
+                self._get_cache_generation(cache)
+            self._field_permissions = self._load_field_permissions()
+        return self._field_permissions
+
+    @property
+    def filter_permissions(self):
+        if self._filter_permissions is None:
+            self._filter_permissions = self._get_filter_permissions()
+        return self._filter_permissions
+
+    def _get_cache(self):
+        """ Return the cache shared between requests, ``None`` when disabled
+        or for an anonymous user. """
+        if self._is_anonymous():
+            return None
+        return permissions_cache.get_cache()
+
+    def _get_cache_generation(self, cache):
+        if self._cache_generation is None:
+            self._cache_generation = permissions_cache.get_generation(
+                cache, self.user.pk)
+        return self._cache_generation
+
+    def _get_filter_permissions(self):
+        """ Return the filters of the user, from the cache when enabled. """
+        cache = self._get_cache()
+        if cache is not None:
+            filters = permissions_cache.get_filter_permissions(
+                cache, self.user.pk, self._get_cache_generation(cache))
+            get_instrumentation().cache_event('filter_grants',
+                                              filters is not None)
+            if filters is not None:
+                return filters
+
+        filters = dict(self._load_filter_permissions())
+        if cache is not None:
+            permissions_cache.set_filter_permissions(
+                cache, self.user.pk, self._cache_generation, filters)
+        return filters
+
+    async def _aget_filter_permissions(self):
+        cache = self._get_cache()
+        if cache is not None:
+            if self._cache_generation is None:
+                self._cache_generation = \
+                    await permissions_cache.aget_generation(
+                        cache, self.user.pk)
+            filters = await permissions_cache.aget_filter_permissions(
+                cache, self.user.pk, self._cache_generation)
+            get_instrumentation().cache_event('filter_grants',
+                                              filters is not None)
+            if filters is not None:
+                return filters
+
+        filters = dict(await self._aload_filter_permissions())
+        if cache is not None:
+            await permissions_cache.aset_filter_permissions(
+                cache, self.user.pk, self._cache_generation, filters)
+        return filters
+
+    async def aload(self):
+        """ Load all the permissions of the user with the async ORM.
+
+        Allowed fields are then computed from memory, without reading the
+        cache, so that the snapshot can be used from async code.
+        """
+        if self._field_permissions is None:
+            self._field_permissions = await self._aload_field_permissions()
+        if self._filter_permissions is None:
+            self._filter_permissions = await self._aget_filter_permissions()
+        self._loaded = True
+        return self
+
+    async def aget_allowed_fields(self, model):
+        """ Async version of ``get_allowed_fields``. """
+        if not self._loaded:
+            await self.aload()
+        return self.get_allowed_fields(model)
+
+    async def aget_filter_permissions(self, model):
+        """ Async version of ``get_filter_permissions``. """
+        if not self._loaded:
+            await self.aload()
+        return self.get_filter_permissions(model)
+
+    def get_allowed_fields(self, model):
+        """ Return the frozenset of the names of the fields granted on a
+        model. """
+        label = get_model_label(model)
+        names = self._allowed_fields.get(label)
+        if names is not None:
+            return names
+
+        cache = self._get_cache() if not self._loaded else None
+        if cache is not None:
+            names = permissions_cache.get_allowed_fields(
+                cache, self.user.pk, self._get_cache_generation(cache), label)
+            get_instrumentation().cache_event('fields', names is not None)
+            if names is not None:
+                names = freeze_names(names)
+
+        if names is None:
+            names = freeze_names(self.field_permissions.get(label, ()))
+            if cache is not None:
+                permissions_cache.set_allowed_fields(
+                    cache, self.user.pk, self._cache_generation, label,
+                    tuple(sorted(names)))
+
+        self._allowed_fields[label] = names
+        return names
+
+    def preload(self):
+        """ Load all the permissions of the user, and store them in the cache
+        when enabled, so that their next requests don't query them.
+
+        Allowed fields are stored for every model having field permissions,
+        granted or not.
+        """
+        field_permissions = self.field_permissions
+        self.filter_permissions
+        cache = self._get_cache()
+        if cache is None:
+            return
+        generation = self._get_cache_generation(cache)
+        fields = {}
+        for label in get_field_permission_labels() | set(field_permissions):
+            names = freeze_names(field_permissions.get(label, ()))
+            self._allowed_fields[label] = names
+            fields[self.user.pk, generation, label] = tuple(sorted(names))
+        permissions_cache.set_many_allowed_fields(cache, fields)
+
+    def get_filter_permissions(self, model):
+        """ Return the filters of the user and of their groups defined on a
+        model, the user is granted the objects matching any of them. """
+        return self.filter_permissions.get(
+            get_model_label(model, for_concrete_model=True), [])
+
+    def is_for(self, user):
+        """ Check that the snapshot was built for this user. """
+        return self.user is user or (
+            self.user is not None and user is not None and
+            self.user.pk == user.pk)
+
+
+def get_permission_snapshot(request=None, user=None, context=None):
+    """ Return the permission snapshot shared along a request.
+
+    The snapshot is stored on the request when there is one, otherwise in
+    the serializer context, so that every component working on the same
+    request reuses it.
+    """
+    if user is None and request is not None:
+        user = request.user
+
+    if request is not None:
+        snapshot = getattr(request, SNAPSHOT_ATTRIBUTE, None)
+    elif context is not None:
+        snapshot = context.get(SNAPSHOT_ATTRIBUTE)
+    else:
+        snapshot = None
+
+    if snapshot is None or not snapshot.is_for(user):
+        snapshot = PermissionSnapshot(user)
+        if request is not None:
+            setattr(request, SNAPSHOT_ATTRIBUTE, snapshot)
+        elif context is not None:
+            context[SNAPSHOT_ATTRIBUTE] = snapshot
+    return snapshot
+
+
+async def aget_permission_snapshot(request=None, user=None, context=None):
+    """ Return the permission snapshot shared along a request, loaded with
+    the async ORM. """
+    return await get_permission_snapshot(request, user, context).aload()
@@ -5,8 +5,13 @@ from . import views
 
 urlpatterns = [
     # Export permissions
+    path('drffp/export/', views.permissions_export_jsonl, name='drffp-export-all'),
     path('drffp/export/<int:ufp_id>/', views.permissions_export_json, name='drffp-export'),
 
+    # Admin autocomplete
+    path('drffp/choices/fields/', views.field_permission_choices_json, name='drffp-field-choices'),
+    path('drffp/choices/content-types/', views.content_type_choices_json, name='drffp-content-type-choices'),
+
     # Import permissions
     path('drffp/import/', views.permissions_import_json, name='drffp-import'),
     path('drffp/import/<int:ufp_id>/', views.permissions_import_json, name='drffp-import-ufp'),
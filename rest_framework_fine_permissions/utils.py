@@ -5,6 +5,7 @@ import inspect
 import logging
 import string
 from collections import OrderedDict
+from functools import lru_cache
 from importlib import import_module
 from itertools import chain
 
@@ -75,7 +76,9 @@ def get_permitted_fields(model, serializer):
     return result
 
 
-def get_field_permissions():
+def build_field_permissions():
+    """ Scan the serializers of the installed apps for the fields that can be
+    granted, by model. """
     serializers = {}
 
     for app in settings.INSTALLED_APPS:
@@ -100,3 +103,59 @@ def get_field_permissions():
             continue
 
     return serializers
+
+
+def _choice(model, field, sep):
+    return '{model[0]}{sep}{model[1]}{sep}{field}'\
+        .format(model=model.split('.'), field=field, sep=sep)
+
+
+class FieldPermissionsRegistry(object):
+
+    """ Fields that can be granted and the admin choices built from them.
+    """
+
+    def __init__(self, field_permissions):
+        # the fields module imports this one
+        from .fields import ModelPermissionsField
+
+        self.field_permissions = field_permissions
+        choices = []
+        self.serializers = {}
+        # serializer of each ModelPermissionsField, by choice
+        self.nested_serializers = {}
+        for model, (fields, serializer) in field_permissions.items():
+            for field, value in fields.items():
+                choice = _choice(model, field, '.')
+                if isinstance(value, ModelPermissionsField):
+                    if value.serializer is None:
+                        logger.error('Serializer %s not found: %s skipped'
+                                     % (value._serializer, choice))
+                        continue
+                    self.nested_serializers[choice] = \
+                        '{0.__module__}.{0.__name__}'.format(value.serializer)
+                choices.append((choice, _choice(model, field, ' | ')))
+                self.serializers[choice] = serializer
+        self.choices = sorted(choices)
+        # choices by model, for the autocomplete of the admin
+        self.model_choices = {}
+        for choice in self.choices:
+            model = choice[0].rsplit('.', 1)[0]
+            self.model_choices.setdefault(model, []).append(choice)
+
+
+@lru_cache(maxsize=None)
+def get_registry():
+    """ Return the registry, built on first use and shared afterwards. """
+    return FieldPermissionsRegistry(build_field_permissions())
+
+
+def clear_registry():
+    """ Forget the registry, it is built again on next use. """
+    get_registry.cache_clear()
+
+
+def get_field_permissions():
+    """ Return the fields that can be granted and their serializer, by
+    model. The result is shared and must not be modified. """
+    return get_registry().field_permissions
@@ -1,55 +1,135 @@
+import io
 import json
 
-from rest_framework_fine_permissions.models import (
-    FieldPermission, UserFieldPermissions)
+from rest_framework_fine_permissions.bulk import (
+    CHUNK_SIZE, dump_records, load_records, read_records)
+from rest_framework_fine_permissions.models import UserFieldPermissions
+from rest_framework_fine_permissions.utils import get_registry
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
-from django.http import HttpResponse
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Q
 from django.shortcuts import get_object_or_404, redirect
 
+# choices in a page of the autocomplete views
+PAGE_SIZE = 100
+
+
+def _choices_page(request, choices):
+    """ Return a page of ``(id, text)`` choices in the select2 format. """
+    page = Paginator(choices, PAGE_SIZE).get_page(request.GET.get('page'))
+    return JsonResponse({
+        'results': [{'id': value, 'text': text} for value, text in page],
+        'pagination': {'more': page.has_next()},
+    })
+
+
+@staff_member_required
+def field_permission_choices_json(request):
+    """ Search the field permissions of the admin by ``term``, restricted to
+    an ``app_label`` and a ``model``. """
+    registry = get_registry()
+    app_label = request.GET.get('app_label')
+    model = request.GET.get('model')
+    if app_label and model:
+        choices = registry.model_choices.get('%s.%s' % (app_label, model), [])
+    elif app_label:
+        choices = [choice for choice in registry.choices
+                   if choice[0].startswith(app_label + '.')]
+    else:
+        choices = registry.choices
+    term = request.GET.get('term', '').strip().lower()
+    if term:
+        choices = [choice for choice in choices
+                   if term in choice[1].lower() or term in choice[0].lower()]
+    return _choices_page(request, choices)
+
+
+@staff_member_required
+def content_type_choices_json(request):
+    """ Search the content types by ``term``. """
+    content_types = ContentType.objects.order_by('app_label', 'model')
+    for word in request.GET.get('term', '').replace('|', ' ').split():
+        content_types = content_types.filter(
+            Q(app_label__icontains=word) | Q(model__icontains=word))
+    return _choices_page(request, [
+        (pk, '%s | %s' % (app_label, model))
+        for pk, app_label, model in content_types.values_list(
+            'pk', 'app_label', 'model')])
+
 
 @staff_member_required
 def permissions_export_json(request, ufp_id):
     ufp = get_object_or_404(UserFieldPermissions, pk=ufp_id)
     permissions = {
-        'username': ufp.user.username,
+        'username': ufp.user.get_username(),
         'fields_permissions': [{
             'app_label': permission.content_type.app_label,
             'model': permission.content_type.model,
             'name': permission.name
-        } for permission in ufp.permissions.all()]
+        } for permission in ufp.permissions.select_related('content_type')]
     }
     return HttpResponse(
         json.dumps(permissions), content_type='application/json')
 
 
+@staff_member_required
+def permissions_export_jsonl(request):
+    """ Stream the permissions of all the users, or of the ``username``
+    parameters, as JSON Lines. Filters are included with ``filters=1``. """
+    users = None
+    usernames = request.GET.getlist('username')
+    if usernames:
+        User = get_user_model()
+        users = User._default_manager.filter(**{
+            '%s__in' % User.USERNAME_FIELD: usernames})
+    filters = request.GET.get('filters', '').lower() in ('1', 'true', 'yes')
+    records = dump_records(users, filters=filters, chunk_size=CHUNK_SIZE)
+    response = StreamingHttpResponse(
+        (json.dumps(record) + '\n' for record in records),
+        content_type='application/x-ndjson')
+    response['Content-Disposition'] = \
+        'attachment; filename="fields_permissions.jsonl"'
+    return response
+
+
 @staff_member_required
 def permissions_import_json(request, ufp_id=0):
+    """ Import the permissions of a file created by fine_permissions_dump,
+    of a single user into ``ufp_id``, or of any number of users. """
     upload_file = request.FILES.get('perms_upload')
 
     if upload_file:
         try:
-            perms = json.loads(upload_file.read().decode('utf-8'))
-            username = perms.get('username')
+            records = list(read_records(
+                io.TextIOWrapper(upload_file, encoding='utf-8')))
 
             if ufp_id:
                 ufp = get_object_or_404(UserFieldPermissions, pk=ufp_id)
-                if username == ufp.user.username:
-                    # Clear the old field permissions
-                    ufp.permissions.clear()
-                else:
+                username = ufp.user.get_username()
+                # the old field permissions are replaced
+                replace = all(record.get('username') == username
+                              for record in records)
+                if not replace:
                     message = 'The wrong user is defined in the imported file'
                     messages.add_message(request, messages.ERROR, message)
+                load_records(records, username=username, replace=replace)
             else:
-                user = get_object_or_404(User, username=username)
-                ufp = UserFieldPermissions(user=user)
-                ufp.save()
+                load_records(records)
+                if len({record.get('username') for record in records}) == 1:
+                    ufp = UserFieldPermissions.objects.get(**{
+                        'user__%s' % get_user_model().USERNAME_FIELD:
+                        records[0]['username']})
+                    ufp_id = ufp.pk
+                else:
+                    ufp_id = ''
 
-            _add_permissions(request, ufp, perms)
-            ufp_id = ufp.pk
+            message = 'Permissions imported'
+            messages.add_message(request, messages.INFO, message)
         except Exception as e:
             message = 'Error in the import : %s' % e
             messages.add_message(request, messages.ERROR, message)
@@ -60,17 +140,3 @@ def permissions_import_json(request, ufp_id=0):
     return redirect(
         '/admin/rest_framework_fine_permissions/userfieldpermissions/%s'
         % ufp_id)
-
-
-def _add_permissions(request, ufp, perms):
-    # Create the new field permissions
-    fields = perms.get('fields_permissions')
-    for field in fields:
-        content_type = ContentType.objects.get(
-            app_label=field['app_label'], model=field['model'])
-        fp = FieldPermission.objects.get_or_create(
-            content_type=content_type, name=field['name'])[0]
-        ufp.permissions.add(fp)
-
-    message = 'Permissions imported'
-    messages.add_message(request, messages.INFO, message)
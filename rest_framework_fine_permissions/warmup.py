@@ -0,0 +1,111 @@
+""" Bulk loading of the permissions of many users into the cache.
+
+Used by the ``fine_permissions_warm`` command after a deploy or a cache
+flush, so that the first requests of the users don't pay the resolution of
+their permissions. Users are loaded by batches, with a few queries each.
+"""
+
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+
+from . import cache as permissions_cache
+from .materialized import _get_memberships, compute_effective_permissions
+from .models import FilterPermissionModel, GroupFilterPermissionModel
+from .qcache import filter_digest
+from .snapshot import (
+    FilterGrant, get_content_type_label, get_field_permission_labels)
+
+BATCH_SIZE = 500
+
+
+def get_users(since=None):
+    """ Return the ids of the users, only the ones who logged in since a
+    date when set. """
+    queryset = get_user_model()._default_manager.all()
+    if since is not None:
+        queryset = queryset.filter(last_login__gte=since)
+    return queryset.order_by('pk').values_list('pk', flat=True)
+
+
+def _label(ct_id):
+    return get_content_type_label(ContentType.objects.get_for_id(ct_id))
+
+
+def compute_filter_permissions(user_ids):
+    """ Compute the filters of some users, by user and model label, in the
+    order of the snapshot. """
+    filters = defaultdict(lambda: defaultdict(list))
+    for user_id, ct_id, pk, data in FilterPermissionModel.objects.filter(
+            user_id__in=user_ids).values_list(
+                'user_id', 'content_type_id', 'pk', 'filter'):
+        filters[user_id][_label(ct_id)].append(
+            FilterGrant(pk, data, None, filter_digest(data)))
+
+    memberships = _get_memberships()
+    if memberships is None:
+        return filters
+    through, user_column, group_column = memberships
+    groups = defaultdict(set)
+    for user_id, group_id in through.objects.filter(**{
+            '%s__in' % user_column: user_ids,
+            '%s__in' % group_column:
+            GroupFilterPermissionModel.objects.values('group_id'),
+    }).values_list(user_column, group_column):
+        groups[group_id].add(user_id)
+    if not groups:
+        return filters
+
+    for group_id, ct_id, pk, data in GroupFilterPermissionModel.objects\
+            .filter(group_id__in=groups).order_by('group_id').values_list(
+                'group_id', 'content_type_id', 'pk', 'filter'):
+        digest = filter_digest(data)
+        for user_id in groups[group_id]:
+            filters[user_id][_label(ct_id)].append(
+                FilterGrant(pk, data, group_id, digest))
+    return filters
+
+
+def _warm(cache, user_ids, labels):
+    # read the tokens first, entries computed before a later change are
+    # written under a token that is no longer current
+    generations = permissions_cache.get_generations(cache, user_ids)
+    effective = compute_effective_permissions(user_ids)
+    filters = compute_filter_permissions(user_ids)
+
+    fields = {}
+    for user_id in user_ids:
+        granted = {_label(ct_id): names
+                   for ct_id, names in effective.get(user_id, {}).items()}
+        for label in labels:
+            fields[user_id, generations[user_id], label] = tuple(
+                sorted(set(granted.get(label, ()))))
+    permissions_cache.set_many_allowed_fields(cache, fields)
+    permissions_cache.set_many_filter_permissions(cache, {
+        (user_id, generations[user_id]): dict(filters.get(user_id, {}))
+        for user_id in user_ids
+    })
+
+
+def warm(since=None, batch_size=BATCH_SIZE):
+    """ Store the permissions of the users in the cache, return the number
+    of users. """
+    cache = permissions_cache.get_cache()
+    if cache is None:
+        return 0
+
+    # the models having field permissions, the other ones are never asked
+    labels = get_field_permission_labels()
+    count = 0
+    batch = []
+    for user_id in get_users(since).iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) == batch_size:
+            _warm(cache, batch, labels)
+            count += len(batch)
+            batch = []
+    if batch:
+        _warm(cache, batch, labels)
+        count += len(batch)
+    return count
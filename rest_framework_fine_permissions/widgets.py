@@ -0,0 +1,81 @@
+""" Admin widgets searching their choices with the select2 autocomplete of
+the django admin, only the selected choices are rendered in the page.
+"""
+
+import json
+
+from django import forms
+from django.contrib.admin.widgets import (
+    AutocompleteMixin, get_select2_language)
+from django.contrib.contenttypes.models import ContentType
+from django.urls import reverse
+
+
+class ChoicesAutocompleteMixin(object):
+
+    """ Select widget mixin loading its choices from the ``url_name`` view.
+    """
+
+    url_name = None
+
+    def __init__(self, attrs=None, choices=()):
+        super(ChoicesAutocompleteMixin, self).__init__(attrs, choices)
+        self.i18n_name = get_select2_language()
+
+    media = AutocompleteMixin.media
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super(ChoicesAutocompleteMixin, self).build_attrs(
+            base_attrs, extra_attrs=extra_attrs)
+        attrs.setdefault('class', '')
+        attrs.update({
+            'data-ajax--cache': 'true',
+            'data-ajax--delay': 250,
+            'data-ajax--type': 'GET',
+            'data-ajax--url': reverse(self.url_name),
+            'data-theme': 'admin-autocomplete',
+            'data-allow-clear': json.dumps(not self.is_required),
+            'data-placeholder': '',
+            'lang': self.i18n_name,
+            'class': attrs['class'] + (' ' if attrs['class'] else '')
+            + 'admin-autocomplete',
+        })
+        return attrs
+
+    def get_labels(self, values):
+        """ Return the ``(value, label)`` of the selected values, labelled by
+        themselves by default. """
+        return [(value, str(value)) for value in values]
+
+    def optgroups(self, name, value, attrs=None):
+        default = (None, [], 0)
+        for index, (option_value, option_label) in enumerate(
+                self.get_labels([v for v in value if v])):
+            default[1].append(self.create_option(
+                name, option_value, option_label, True, index, attrs=attrs))
+        return [default]
+
+
+class FieldPermissionsAutocomplete(ChoicesAutocompleteMixin,
+                                   forms.SelectMultiple):
+
+    """ Field permissions, ``app_label.model.field`` """
+
+    url_name = 'drffp-field-choices'
+
+    def get_labels(self, values):
+        return [(value, value.replace('.', ' | ')) for value in values]
+
+
+class ContentTypeAutocomplete(ChoicesAutocompleteMixin, forms.Select):
+
+    """ Content types, by id """
+
+    url_name = 'drffp-content-type-choices'
+
+    def get_labels(self, values):
+        ids = [value for value in values if str(value).isdigit()]
+        return [
+            (pk, '%s | %s' % (app_label, model))
+            for pk, app_label, model in ContentType.objects.filter(
+                pk__in=ids).values_list('pk', 'app_label', 'model')]
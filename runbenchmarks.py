@@ -0,0 +1,47 @@
+import argparse
+import sys
+
+import runtests  # noqa: F401 configures the settings of the tests
+
+import django
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment)
+
+
+def runbenchmarks():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the permission hot paths.')
+    parser.add_argument('-k', dest='select',
+                        help='only run the scenarios matching this string')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs, the best one is kept')
+    parser.add_argument('--output', help='also write the results to a file')
+    args = parser.parse_args()
+
+    django.setup()
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        from benchmarks import bench_filters, bench_serializers  # noqa: F401
+        from benchmarks.utils import format_results, run
+
+        results = []
+        for result in run(repeat=args.repeat, select=args.select):
+            results.append(result)
+            sys.stderr.write('.')
+            sys.stderr.flush()
+        sys.stderr.write('\n')
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+    table = format_results(results)
+    print(table)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(table + '\n')
+
+
+if __name__ == '__main__':
+    runbenchmarks()
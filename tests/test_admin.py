@@ -1,8 +1,21 @@
-from rest_framework_fine_permissions.admin import UserFieldPermissionsForm
-from rest_framework_fine_permissions.models import UserFieldPermissions
+from rest_framework_fine_permissions.admin import (
+    GroupFieldPermissionsForm, GroupFilterPermissionsForm,
+    UserFieldPermissionsForm, UserFilterPermissionsForm)
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.models import (
+    FieldPermission, GroupFieldPermissions, UserFieldPermissions)
+from rest_framework_fine_permissions.resolver import resolve_filter
+from rest_framework_fine_permissions.serializers import QSerializer
+from rest_framework_fine_permissions.utils import get_registry
+from rest_framework_fine_permissions.widgets import ChoicesAutocompleteMixin
 
-from django.contrib.auth.models import User
-from django.test import TestCase
+from django import forms
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 
 class TestUserFieldPermissionsForm(TestCase):
@@ -36,3 +49,146 @@ class TestUserFieldPermissionsForm(TestCase):
         self.assertIn('Recursive ModelPermissionsField call between', error)
         self.assertIn('tests.account.cards', error)
         self.assertIn('tests.card.account', error)
+
+    def test_user_field_permissions_form_queries(self):
+        """ Permissions are resolved with the same queries however many. """
+        registry = get_registry()
+        permissions = [choice for choice, _ in registry.choices
+                       if choice not in registry.nested_serializers]
+        counts = []
+        for selected in (permissions[:1], permissions):
+            ContentType.objects.clear_cache()
+            form = UserFieldPermissionsForm(data={
+                'user': self.user.pk, 'permissions': selected})
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(form.is_valid(), form.errors)
+            counts.append(len(queries))
+            self.assertEqual(len(form.cleaned_data['permissions']),
+                             len(selected))
+        self.assertEqual(counts[0], counts[1])
+        self.assertGreater(len(permissions), 2)
+        self.assertEqual(FieldPermission.objects.count(), len(permissions))
+
+    @override_settings(FINE_PERMISSIONS_ADMIN_AUTOCOMPLETE=True)
+    def test_user_field_permissions_form_autocomplete(self):
+        """ Only the selected choices are rendered. """
+        form = UserFieldPermissionsForm(data={
+            'user': self.user.pk, 'permissions': ['tests.account.user']})
+        self.assertTrue(form.is_valid(), form.errors)
+        html = str(form['permissions'])
+        self.assertIn('data-ajax--url="/drffp/choices/fields/"', html)
+        self.assertIn('tests | account | user', html)
+        self.assertNotIn('tests.account.expired_date', html)
+
+        form = UserFieldPermissionsForm(data={
+            'user': self.user.pk, 'permissions': ['tests.account.unknown']})
+        self.assertFalse(form.is_valid())
+
+    def test_autocomplete_default_labels(self):
+        """ Selected values are their own labels by default. """
+        class Autocomplete(ChoicesAutocompleteMixin, forms.SelectMultiple):
+            url_name = 'drffp-field-choices'
+
+        html = Autocomplete().render('names', ['first', ''])
+        self.assertIn('<option value="first" selected>first</option>', html)
+        self.assertEqual(html.count('<option'), 1)
+
+    def test_changelist_queries(self):
+        """ The users of the changelist are read with the permissions. """
+        User.objects.create_superuser('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        url = '/admin/rest_framework_fine_permissions/userfieldpermissions/'
+        counts = []
+        for username in ('first', 'second', 'third'):
+            UserFieldPermissions.objects.create(
+                user=User.objects.create_user(username))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[2])
+
+
+class TestGroupFieldPermissionsForm(TestCase):
+
+    def test_group_field_permissions_form_save(self):
+        group = Group.objects.create(name='readers')
+        form = GroupFieldPermissionsForm(data={
+            'group': group.pk,
+            'permissions': ['tests.account.cards', 'tests.service.name']
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        self.assertEqual(
+            GroupFieldPermissions.objects.get(group=group)
+            .permissions.count(), 2)
+
+
+class TestUserFilterPermissionsForm(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test_user')
+        self.user_ct = ContentType.objects.get_for_model(User)
+
+    def test_save_compact_filter(self):
+        form = UserFilterPermissionsForm(data={
+            'user': self.user.pk,
+            'content_type': self.user_ct.pk,
+            'filter': QSerializer().dumps(Q(username='test_user')),
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        fpm = form.save(commit=False)
+        fpm.save()
+        q = Q(username='test_user')
+        self.assertEqual(fpm.filter, encode(q, resolve_filter(q, User)))
+
+        form = UserFilterPermissionsForm(instance=fpm)
+        self.assertEqual(form.initial['current_filter'],
+                         str(Q(username='test_user')))
+
+    def test_invalid_filter(self):
+        form = UserFilterPermissionsForm(data={
+            'user': self.user.pk,
+            'content_type': self.user_ct.pk,
+            'filter': 'username=test_user',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('filter', form.errors)
+
+    def test_unresolved_lookup(self):
+        form = UserFilterPermissionsForm(data={
+            'user': self.user.pk,
+            'content_type': self.user_ct.pk,
+            'filter': QSerializer().dumps(Q(usernme='test_user')),
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('usernme', str(form.errors['filter']))
+
+    @override_settings(FINE_PERMISSIONS_ADMIN_AUTOCOMPLETE=True)
+    def test_content_type_autocomplete(self):
+        form = UserFilterPermissionsForm(data={
+            'user': self.user.pk,
+            'content_type': self.user_ct.pk,
+            'filter': QSerializer().dumps(Q(username='test_user')),
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        html = str(form['content_type'])
+        self.assertIn('data-ajax--url="/drffp/choices/content-types/"', html)
+        self.assertEqual(html.count('<option'), 1)
+        self.assertIn('auth | user', html)
+
+
+class TestGroupFilterPermissionsForm(TestCase):
+
+    def test_save_compact_filter(self):
+        group = Group.objects.create(name='readers')
+        form = GroupFilterPermissionsForm(data={
+            'group': group.pk,
+            'content_type': ContentType.objects.get_for_model(User).pk,
+            'filter': QSerializer().dumps(Q(username='test_user')),
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        fpm = form.save(commit=False)
+        fpm.save()
+        self.assertEqual(fpm.group, group)
+        self.assertIn('p', fpm.filter)
@@ -0,0 +1,128 @@
+from asgiref.sync import async_to_sync
+from rest_framework import generics, serializers as drf_serializers
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.filters import FilterPermissionBackend
+from rest_framework_fine_permissions.materialized import rebuild
+from rest_framework_fine_permissions.models import FilterPermissionModel
+from rest_framework_fine_permissions.permissions import FilterPermission
+from rest_framework_fine_permissions.snapshot import (
+    PermissionSnapshot, aget_permission_snapshot, get_permission_snapshot)
+
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test import TestCase, override_settings
+
+from . import serializers
+from . import utils
+from .models import Account, Card
+
+
+class TestAsyncPermissions(TestCase):
+
+    """ Test the permission resolution with the async ORM. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = utils.create_user()
+        self.other = utils.create_user('other')
+        self.group = Group.objects.create(name='readers')
+        self.user.groups.add(self.group)
+        utils.add_field_permission(self.user, 'tests', 'account', 'user')
+        utils.add_group_field_permission(self.group, 'tests', 'card', 'id')
+        FilterPermissionModel.objects.create(
+            user=self.user,
+            content_type=ContentType.objects.get_for_model(User),
+            filter=encode(Q(username='other') | Q(groups__name='readers')))
+        self.request = HttpRequest()
+        self.request.user = self.user
+
+    def test_aload(self):
+        snapshot = PermissionSnapshot(self.user)
+        # grants and groups, grants of the groups, filters
+        with self.assertNumQueries(3):
+            async_to_sync(snapshot.aload)()
+        expected = PermissionSnapshot(self.user)
+        for model in (Account, Card, User):
+            with self.assertNumQueries(0):
+                names = snapshot.get_allowed_fields(model)
+            self.assertEqual(names, expected.get_allowed_fields(model))
+        self.assertEqual(
+            async_to_sync(snapshot.aget_filter_permissions)(User),
+            expected.get_filter_permissions(User))
+
+    @override_settings(FINE_PERMISSIONS_CACHE='default')
+    def test_aload_cached(self):
+        async_to_sync(PermissionSnapshot(self.user).aload)()
+        snapshot = PermissionSnapshot(self.user)
+        # the filters and the grants of the groups come from the cache
+        with self.assertNumQueries(1):
+            async_to_sync(snapshot.aload)()
+        self.assertEqual(len(snapshot.get_filter_permissions(User)), 1)
+        self.assertEqual(snapshot.get_allowed_fields(Card), {'id'})
+
+    @override_settings(FINE_PERMISSIONS_MATERIALIZE=True)
+    def test_aload_materialized(self):
+        rebuild()
+        snapshot = PermissionSnapshot(self.user)
+        with self.assertNumQueries(2):
+            async_to_sync(snapshot.aload)()
+        self.assertEqual(snapshot.get_allowed_fields(Account), {'user'})
+
+    async def test_anonymous(self):
+        snapshot = await PermissionSnapshot(None).aload()
+        self.assertEqual(snapshot.get_allowed_fields(Account), frozenset())
+
+    async def test_shared_by_request(self):
+        snapshot = await aget_permission_snapshot(self.request)
+        self.assertIs(get_permission_snapshot(self.request), snapshot)
+
+    async def test_object_permission(self):
+        permission = FilterPermission()
+        self.assertTrue(await permission.ahas_object_permission(
+            self.request, None, self.other))
+        # the groups can't be checked in memory
+        self.assertTrue(await permission.ahas_object_permission(
+            self.request, None, self.user))
+        nobody = await User.objects.acreate(username='nobody')
+        self.assertFalse(await FilterPermission().ahas_object_permission(
+            self.request, None, nobody))
+
+    async def test_filter_queryset(self):
+        await User.objects.acreate(username='nobody')
+        backend = FilterPermissionBackend()
+        queryset = await backend.afilter_queryset(
+            self.request, User.objects.order_by('username'), None)
+        self.assertEqual([user.username async for user in queryset],
+                         ['other', 'test'])
+        objects = [user async for user in User.objects.order_by('pk')]
+        self.assertEqual(
+            await backend.afilter_objects(self.request, objects + [1]),
+            [self.user, self.other, 1])
+
+    async def test_serializer(self):
+        serializer = serializers.AccountSerializer(
+            context={'request': self.request})
+        await serializer.aload_permissions()
+        # any query would raise SynchronousOnlyOperation
+        self.assertEqual(set(serializer.get_fields()), {'user'})
+
+    def test_view_object_permission(self):
+        """ The object permission is enforced by a rest framework view. """
+        class UserSerializer(drf_serializers.ModelSerializer):
+            class Meta:
+                model = User
+                fields = ('username',)
+
+        view = generics.RetrieveAPIView.as_view(
+            queryset=User.objects.all(), serializer_class=UserSerializer,
+            permission_classes=(FilterPermission,))
+        nobody = User.objects.create(username='nobody')
+        factory = APIRequestFactory()
+        for obj, status in ((self.other, 200), (nobody, 403)):
+            request = factory.get('/')
+            force_authenticate(request, user=self.user)
+            self.assertEqual(view(request, pk=obj.pk).status_code, status)
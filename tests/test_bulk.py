@@ -0,0 +1,186 @@
+import io
+import json
+import os
+import tempfile
+
+from rest_framework_fine_permissions import models
+from rest_framework_fine_permissions.bulk import (
+    dump_records, get_field_permission_ids, load_records, read_records)
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.models import FilterPermissionModel
+from rest_framework_fine_permissions.snapshot import PermissionSnapshot
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+from . import utils
+from .models import Account, Card
+
+
+def _record(username, *fields):
+    return {'username': username, 'fields_permissions': [
+        {'app_label': 'tests', 'model': model, 'name': name}
+        for model, name in fields]}
+
+
+class TestReadRecords(TestCase):
+
+    """ Test the reading of the permission files. """
+
+    def test_formats(self):
+        records = [_record('a', ('account', 'user')), _record('b')]
+        for text, expected in (
+                (json.dumps(records[0]), records[:1]),
+                (json.dumps(records[0], indent=2), records[:1]),
+                (json.dumps(records), records),
+                (json.dumps(records, indent=2), records),
+                (''.join(json.dumps(record) + '\n' for record in records),
+                 records)):
+            self.assertEqual(list(read_records(io.StringIO(text))), expected,
+                             text)
+        self.assertEqual(list(read_records(io.StringIO('\n'))), [])
+
+
+class TestLoadRecords(TestCase):
+
+    """ Test the bulk loading of field permissions. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = utils.create_user()
+        self.other = utils.create_user('other')
+        ContentType.objects.get_for_model(Account)
+        ContentType.objects.get_for_model(Card)
+
+    def test_load(self):
+        utils.add_field_permission(self.user, 'tests', 'account', 'id')
+        records = [
+            _record('test', ('account', 'user'), ('card', 'account')),
+            _record('other', ('account', 'user')),
+            _record('test', ('account', 'id')),
+        ]
+        # users, field permissions and their creation, user field
+        # permissions and their creation, m2m rows, in a savepoint
+        with self.assertNumQueries(8):
+            self.assertEqual(load_records(records), 2)
+        self.assertEqual(
+            PermissionSnapshot(self.user).get_allowed_fields(Account),
+            {'id', 'user'})
+        self.assertEqual(
+            PermissionSnapshot(self.other).get_allowed_fields(Account),
+            {'user'})
+        self.assertEqual(models.FieldPermission.objects.count(), 3)
+
+    def test_chunks(self):
+        records = [_record('test', ('account', 'user')),
+                   _record('other', ('account', 'user'))]
+        self.assertEqual(load_records(records, chunk_size=1), 2)
+        self.assertEqual(models.FieldPermission.objects.count(), 1)
+
+    def test_replace_and_username(self):
+        utils.add_field_permission(self.other, 'tests', 'account', 'id')
+        load_records([_record('test', ('card', 'id'))], username='other',
+                     replace=True)
+        self.assertEqual(
+            PermissionSnapshot(self.other).get_allowed_fields(Account), set())
+        self.assertEqual(
+            PermissionSnapshot(self.other).get_allowed_fields(Card), {'id'})
+
+    def test_unknown_user_rolled_back(self):
+        with self.assertRaises(User.DoesNotExist):
+            load_records([_record('test', ('card', 'id')),
+                          _record('nobody', ('card', 'id'))])
+        self.assertFalse(models.FieldPermission.objects.exists())
+
+    @override_settings(FINE_PERMISSIONS_CACHE='default')
+    def test_invalidates_cache(self):
+        snapshot = PermissionSnapshot(self.user)
+        self.assertEqual(snapshot.get_allowed_fields(Card), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            load_records([_record('test', ('card', 'id'))])
+        self.assertEqual(
+            PermissionSnapshot(self.user).get_allowed_fields(Card), {'id'})
+
+    @override_settings(FINE_PERMISSIONS_MATERIALIZE=True)
+    def test_materialized(self):
+        load_records([_record('test', ('card', 'id'))])
+        self.assertEqual(
+            PermissionSnapshot(self.user).get_allowed_fields(Card), {'id'})
+
+    def test_field_permission_ids(self):
+        ct_id = ContentType.objects.get_for_model(Card).pk
+        ids = get_field_permission_ids({(ct_id, 'id')})
+        self.assertEqual(get_field_permission_ids({(ct_id, 'id')}), ids)
+
+    def test_command(self):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as jsonl:
+            jsonl.write(json.dumps(_record('test', ('card', 'id'))) + '\n')
+            jsonl.write(json.dumps(_record('other', ('card', 'id'))) + '\n')
+        out = io.StringIO()
+        call_command('fine_permissions_load', path, stdout=out)
+        self.assertEqual(out.getvalue().strip(),
+                         'Fields permissions of 2 user(s) loaded')
+        with self.assertRaises(CommandError):
+            call_command('fine_permissions_load', path, user='nobody')
+
+
+class TestDumpRecords(TestCase):
+
+    """ Test the streaming dump of the permissions. """
+
+    def setUp(self):
+        self.user = utils.create_user()
+        self.other = utils.create_user('other')
+        utils.create_user('nobody')
+        utils.add_field_permission(self.user, 'tests', 'account', 'user')
+        utils.add_field_permission(self.user, 'tests', 'card', 'id')
+        utils.add_field_permission(self.other, 'tests', 'card', 'account')
+        self.filter = encode(Q(username='test'))
+        FilterPermissionModel.objects.create(
+            user=utils.create_user('filtered'),
+            content_type=ContentType.objects.get_for_model(User),
+            filter=self.filter)
+
+    def test_dump(self):
+        with self.assertNumQueries(1):
+            records = list(dump_records(chunk_size=2))
+        self.assertEqual(records, [
+            _record('test', ('account', 'user'), ('card', 'id')),
+            _record('other', ('card', 'account')),
+        ])
+
+    def test_filters(self):
+        with self.assertNumQueries(2):
+            records = list(dump_records(
+                User.objects.filter(username__in=['other', 'filtered']),
+                filters=True))
+        self.assertEqual(records, [
+            dict(_record('other', ('card', 'account')),
+                 filters_permissions=[]),
+            {'username': 'filtered', 'fields_permissions': [],
+             'filters_permissions': [{'app_label': 'auth', 'model': 'user',
+                                      'filter': self.filter}]},
+        ])
+
+    def test_roundtrip(self):
+        records = list(dump_records(filters=True))
+        models.UserFieldPermissions.objects.all().delete()
+        FilterPermissionModel.objects.all().delete()
+        load_records(records)
+        self.assertEqual(list(dump_records(filters=True)), records)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('fine_permissions_dump', 'test', 'nobody', stdout=out)
+        self.assertEqual(
+            [json.loads(line) for line in out.getvalue().splitlines()],
+            [_record('test', ('account', 'user'), ('card', 'id'))])
+        with self.assertRaises(CommandError):
+            call_command('fine_permissions_dump', 'unknown')
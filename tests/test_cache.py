@@ -0,0 +1,222 @@
+from rest_framework_fine_permissions import models
+from rest_framework_fine_permissions.cache import get_cache
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.snapshot import PermissionSnapshot
+
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+from . import utils
+from .models import Account, Card
+
+
+@override_settings(FINE_PERMISSIONS_CACHE='default')
+class TestFieldPermissionsCache(TestCase):
+
+    """ Test the field permissions shared between requests. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = utils.create_user()
+        utils.add_field_permission(self.user, 'tests', 'account', 'user')
+        utils.add_field_permission(self.user, 'tests', 'card', 'account')
+        self.ufp = models.UserFieldPermissions.objects.get(user=self.user)
+
+    def _allowed_fields(self, model):
+        return PermissionSnapshot(self.user).get_allowed_fields(model)
+
+    def _assert_cached(self, model, names):
+        with self.assertNumQueries(0):
+            self.assertEqual(set(self._allowed_fields(model)), names)
+
+    def test_disabled_by_default(self):
+        with self.settings(FINE_PERMISSIONS_CACHE=None):
+            self.assertIsNone(get_cache())
+
+    def test_cached_between_snapshots(self):
+        self.assertEqual(self._allowed_fields(Account), {'user'})
+        self._assert_cached(Account, {'user'})
+
+    def test_add_invalidates_model(self):
+        self._allowed_fields(Account)
+        self._allowed_fields(Card)
+        with self.captureOnCommitCallbacks(execute=True):
+            utils.add_field_permission(self.user, 'tests', 'account', 'id')
+        self.assertEqual(set(self._allowed_fields(Card)), {'account'})
+        self.assertEqual(set(self._allowed_fields(Account)), {'user', 'id'})
+
+    def test_remove_invalidates_model(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ufp.permissions.remove(
+                self.ufp.permissions.get(name='user'))
+        self.assertEqual(self._allowed_fields(Account), set())
+
+    def test_reverse_add_invalidates_model(self):
+        other = utils.create_user('other')
+        other_ufp = models.UserFieldPermissions.objects.create(user=other)
+        self.assertEqual(
+            PermissionSnapshot(other).get_allowed_fields(Account), set())
+        fp = models.FieldPermission.objects.get(name='user')
+        with self.captureOnCommitCallbacks(execute=True):
+            fp.user_field_permissions.add(other_ufp)
+        self.assertEqual(
+            PermissionSnapshot(other).get_allowed_fields(Account), {'user'})
+
+    def test_clear_invalidates_models(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ufp.permissions.clear()
+        self.assertEqual(self._allowed_fields(Account), set())
+
+    def test_field_permission_update(self):
+        self._allowed_fields(Account)
+        fp = models.FieldPermission.objects.get(name='user')
+        fp.name = 'expired_date'
+        with self.captureOnCommitCallbacks(execute=True):
+            fp.save()
+        self.assertEqual(self._allowed_fields(Account), {'expired_date'})
+
+    def test_field_permission_delete(self):
+        self._allowed_fields(Account)
+        self._allowed_fields(Card)
+        with self.captureOnCommitCallbacks(execute=True):
+            models.FieldPermission.objects.get(name='user').delete()
+        self.assertEqual(self._allowed_fields(Account), set())
+        self.assertEqual(set(self._allowed_fields(Card)), {'account'})
+
+    def test_invalidated_on_commit(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks() as callbacks:
+            utils.add_field_permission(self.user, 'tests', 'account', 'id')
+            # a request reading the former rows can't cache them again
+            self._assert_cached(Account, {'user'})
+        for callback in callbacks:
+            callback()
+        self.assertEqual(set(self._allowed_fields(Account)), {'user', 'id'})
+
+    def test_load_interleaved_with_commit(self):
+        snapshot = PermissionSnapshot(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            # a request reads the former rows...
+            snapshot.field_permissions
+            utils.add_field_permission(self.user, 'tests', 'account', 'id')
+        for callback in callbacks:
+            callback()
+        # ...and caches them once the change is committed
+        self.assertEqual(snapshot.get_allowed_fields(Account), {'user'})
+        self.assertEqual(set(self._allowed_fields(Account)), {'user', 'id'})
+
+    def test_user_field_permissions_delete(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            utils.remove_all_field_permissions(self.user)
+        self.assertEqual(self._allowed_fields(Account), set())
+
+
+@override_settings(FINE_PERMISSIONS_CACHE='default')
+class TestGroupFieldPermissionsCache(TestCase):
+
+    """ Test the invalidation of the field permissions of groups. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = utils.create_user()
+        self.group = Group.objects.create(name='readers')
+        utils.add_group_field_permission(self.group, 'tests', 'account',
+                                         'user')
+        self.user.groups.add(self.group)
+        self.gfp = models.GroupFieldPermissions.objects.get(group=self.group)
+
+    def _allowed_fields(self, model):
+        return PermissionSnapshot(self.user).get_allowed_fields(model)
+
+    def test_add_invalidates_members(self):
+        self.assertEqual(self._allowed_fields(Account), {'user'})
+        with self.captureOnCommitCallbacks(execute=True):
+            utils.add_group_field_permission(self.group, 'tests', 'account',
+                                             'id')
+        self.assertEqual(self._allowed_fields(Account), {'user', 'id'})
+
+    def test_remove_invalidates_members(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gfp.permissions.clear()
+        self.assertEqual(self._allowed_fields(Account), set())
+
+    def test_field_permission_delete(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            models.FieldPermission.objects.get(name='user').delete()
+        self.assertEqual(self._allowed_fields(Account), set())
+
+    def test_leave_group(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.group)
+        self.assertEqual(self._allowed_fields(Account), set())
+
+    def test_join_group(self):
+        other = Group.objects.create(name='writers')
+        utils.add_group_field_permission(other, 'tests', 'account', 'id')
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.user_set.add(self.user)
+        self.assertEqual(self._allowed_fields(Account), {'user', 'id'})
+
+    def test_group_delete(self):
+        self._allowed_fields(Account)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertEqual(self._allowed_fields(Account), set())
+
+
+@override_settings(FINE_PERMISSIONS_CACHE='default')
+class TestFilterPermissionsCache(TestCase):
+
+    """ Test the invalidation of the filters shared between requests. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = utils.create_user()
+        self.content_type = ContentType.objects.get_for_model(User)
+
+    def _filters(self):
+        return PermissionSnapshot(self.user).get_filter_permissions(User)
+
+    def _restrict(self):
+        return models.FilterPermissionModel.objects.create(
+            user=self.user, content_type=self.content_type,
+            filter=encode(Q(username='test')))
+
+    def test_create_invalidates(self):
+        self.assertEqual(self._filters(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self._restrict()
+        self.assertEqual(len(self._filters()), 1)
+
+    def test_delete_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            fp = self._restrict()
+        self.assertEqual(len(self._filters()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            fp.delete()
+        self.assertEqual(self._filters(), [])
+
+    def test_load_interleaved_with_commit(self):
+        snapshot = PermissionSnapshot(self.user)
+        load = snapshot._load_filter_permissions
+
+        def load_then_commit():
+            # the filters are restricted after the former rows are read
+            filters = load()
+            with self.captureOnCommitCallbacks(execute=True):
+                self._restrict()
+            return filters
+
+        snapshot._load_filter_permissions = load_then_commit
+        self.assertEqual(snapshot.get_filter_permissions(User), [])
+        self.assertEqual(len(self._filters()), 1)
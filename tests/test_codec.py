@@ -0,0 +1,92 @@
+import datetime
+
+from rest_framework_fine_permissions.codec import (
+    FORMAT_VERSION, decode, downgrade, encode, upgrade)
+from rest_framework_fine_permissions.filters import FilterPermissionBackend
+from rest_framework_fine_permissions.models import FilterPermissionModel
+from rest_framework_fine_permissions.serializers import QSerializer
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.base import SerializationError
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test import TestCase
+
+
+def make_q():
+    return Q(Q(username='arthur') | ~Q(id__in=[1, 2]),
+             date_joined__range=(datetime.datetime(2005, 1, 1),
+                                 datetime.datetime(2005, 3, 31)))
+
+
+class TestCodec(TestCase):
+
+    """ Test the storage format of the filters. """
+
+    def test_encode(self):
+        self.assertEqual(encode(Q(username='arthur') | ~Q(id__in=[1, 2])), {
+            'v': FORMAT_VERSION,
+            'q': {'o': 'OR', 'c': [
+                ['username', 'arthur'],
+                {'n': 1, 'c': [['id__in', [1, 2]]]}]},
+        })
+
+    def test_encode_not_q(self):
+        with self.assertRaises(SerializationError):
+            encode({'username': 'arthur'})
+
+    def test_round_trip(self):
+        self.assertEqual(decode(encode(make_q())), make_q())
+
+    def test_decode_legacy(self):
+        legacy = QSerializer(base64=True).dumps(make_q())
+        self.assertEqual(decode(legacy), make_q())
+        legacy = QSerializer().dumps(make_q())
+        self.assertEqual(decode(legacy), make_q())
+
+    def test_unsupported_version(self):
+        with self.assertRaises(SerializationError):
+            decode({'v': FORMAT_VERSION + 1, 'q': {'c': []}})
+
+    def test_upgrade_and_downgrade(self):
+        legacy = QSerializer(base64=True).dumps(make_q())
+        data = upgrade(legacy)
+        self.assertEqual(data, encode(make_q()))
+        self.assertIs(upgrade(data), data)
+        self.assertEqual(decode(downgrade(data)), make_q())
+        self.assertLess(len(str(data)), len(legacy) / 2)
+
+
+class TestStoredFilter(TestCase):
+
+    """ Test the filters stored in the JSON column. """
+
+    def setUp(self):
+        self.me = User.objects.create(username='morgan')
+        User.objects.create(username='arthur')
+        self.request = HttpRequest()
+        self.request.user = self.me
+        self.user_ct = ContentType.objects.get_for_model(User)
+
+    def _filter(self, data):
+        FilterPermissionModel.objects.create(
+            user=self.me, content_type=self.user_ct, filter=data)
+        return FilterPermissionBackend().filter_queryset(
+            self.request, User.objects.all(), None)
+
+    def test_compact(self):
+        queryset = self._filter(encode(Q(username='arthur')))
+        self.assertEqual(FilterPermissionModel.objects.get().filter,
+                         encode(Q(username='arthur')))
+        self.assertEqual([u.username for u in queryset], ['arthur'])
+
+    def test_legacy(self):
+        queryset = self._filter(
+            QSerializer(base64=True).dumps(Q(username='arthur')))
+        self.assertEqual([u.username for u in queryset], ['arthur'])
+
+    def test_queryable(self):
+        self._filter(encode(Q(username='arthur')))
+        self.assertTrue(FilterPermissionModel.objects.filter(
+            filter__v=FORMAT_VERSION).exists())
@@ -0,0 +1,183 @@
+import datetime
+from unittest import mock
+
+from rest_framework_fine_permissions.evaluator import evaluate, matches
+from rest_framework_fine_permissions.filters import FilterPermissionBackend
+from rest_framework_fine_permissions.models import FilterPermissionModel
+from rest_framework_fine_permissions.permissions import FilterPermission
+from rest_framework_fine_permissions.serializers import QSerializer
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test import TestCase
+
+from .models import Account, TestUser
+
+
+class TestEvaluate(TestCase):
+
+    """ Test the evaluation of Q objects in memory. """
+
+    def setUp(self):
+        self.test_user = TestUser.objects.create(username='Arthur')
+        self.account = Account.objects.create(
+            user=self.test_user,
+            expired_date=datetime.datetime(2005, 2, 1))
+
+    def test_lookups(self):
+        lookups = [
+            (Q(username='Arthur'), True),
+            (Q(username__exact='arthur'), False),
+            (Q(username__in=['Jean', 'Arthur']), True),
+            (Q(username__isnull=True), False),
+            (Q(pk=self.test_user.pk), True),
+            (Q(id__gt=self.test_user.pk), False),
+            (Q(id__lte=str(self.test_user.pk)), True),
+        ]
+        for q, expected in lookups:
+            self.assertIs(evaluate(q, self.test_user), expected, q)
+
+    def test_text_lookups(self):
+        """ Text is only compared in Python as the database would. """
+        lookups = [
+            (Q(username__iexact='arthur'), True),
+            (Q(username__startswith='Ar'), True),
+            (Q(username__istartswith='ar'), True),
+            (Q(username__endswith='ur'), True),
+            (Q(username__contains='rth'), True),
+            # LIKE ignores the case on SQLite
+            (Q(username__contains='RTH'), True),
+            (Q(username__icontains='RTH'), True),
+        ]
+        for q, expected in lookups:
+            self.assertIsNone(evaluate(q, self.test_user), q)
+            self.assertIs(matches(q, self.test_user), expected, q)
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertIs(evaluate(Q(username__contains='RTH'),
+                                   self.test_user), False)
+            self.assertIsNone(evaluate(Q(username__icontains='RTH'),
+                                       self.test_user))
+
+    def test_iexact_not_text(self):
+        """ iexact on other fields compares text, left to the database. """
+        q = Q(id__iexact=str(self.test_user.pk))
+        self.assertIsNone(evaluate(q, self.test_user))
+        self.assertIs(matches(q, self.test_user), True)
+
+    def test_local_relation_and_range(self):
+        self.assertTrue(evaluate(Q(user=self.test_user.pk), self.account))
+        self.assertTrue(evaluate(Q(user_id=self.test_user.pk), self.account))
+        self.assertTrue(evaluate(Q(expired_date__range=(
+            datetime.datetime(2005, 1, 1), datetime.datetime(2005, 3, 31))),
+            self.account))
+
+    def test_connectors(self):
+        obj = self.test_user
+        self.assertTrue(evaluate(Q(username='Jean') | Q(username='Arthur'),
+                                 obj))
+        self.assertFalse(evaluate(Q(username='Jean') & Q(id=obj.pk), obj))
+        self.assertFalse(evaluate(~Q(username='Arthur'), obj))
+        self.assertTrue(evaluate(Q(username='Arthur') ^ Q(id=0), obj))
+        self.assertTrue(evaluate(Q(), obj))
+
+    def test_unsupported_lookups(self):
+        self.assertIsNone(evaluate(Q(user__username='Arthur'), self.account))
+        self.assertIsNone(evaluate(Q(username__regex='^A'), self.test_user))
+        self.assertIsNone(evaluate(Q(cards__isnull=True), self.account))
+
+    def test_unknown_does_not_matter(self):
+        q = Q(user__username='Arthur')
+        self.assertFalse(evaluate(q & Q(pk=0), self.account))
+        self.assertTrue(evaluate(q | Q(pk=self.account.pk), self.account))
+
+    def test_deferred_field(self):
+        obj = TestUser.objects.only('id').get(pk=self.test_user.pk)
+        with self.assertNumQueries(0):
+            self.assertIsNone(evaluate(Q(username='Arthur'), obj))
+
+    def test_matches(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(matches(Q(username='Arthur'), self.test_user))
+        with self.assertNumQueries(1):
+            self.assertTrue(matches(Q(user__username='Arthur'),
+                                    self.account))
+
+
+class TestFilterObjects(TestCase):
+
+    """ Test filter permissions on objects in memory. """
+
+    def setUp(self):
+        self.me = User.objects.create(username='morgan')
+        self.userok = User.objects.create(username='arthur')
+        self.wrong = User.objects.create(username='jojo')
+        FilterPermissionModel.objects.create(
+            user=self.me,
+            content_type=ContentType.objects.get_for_model(User),
+            filter=QSerializer(base64=True).dumps(
+                Q(username='arthur') | Q(username='jean')))
+        self.request = HttpRequest()
+        self.request.user = self.me
+
+    def test_object_permission_without_query(self):
+        permission = FilterPermission()
+        permission.has_object_permission(self.request, None, self.userok)
+        with self.assertNumQueries(0):
+            self.assertTrue(permission.has_object_permission(
+                self.request, None, self.userok))
+            self.assertFalse(permission.has_object_permission(
+                self.request, None, self.wrong))
+
+    def test_filter_list(self):
+        backend = FilterPermissionBackend()
+        objects = [self.userok, self.wrong, 'other']
+        self.assertEqual(backend.filter_queryset(self.request, objects, None),
+                         [self.userok, 'other'])
+
+    def test_filter_iterator(self):
+        backend = FilterPermissionBackend()
+        objects = iter([self.wrong, self.userok])
+        self.assertEqual(backend.filter_queryset(self.request, objects, None),
+                         [self.userok])
+
+
+class TestFilterPermitted(TestCase):
+
+    """ Test the batch check of filter permissions. """
+
+    def setUp(self):
+        self.me = User.objects.create(username='morgan')
+        self.test_users = [TestUser.objects.create(username='user%s' % i)
+                           for i in range(20)]
+        self.accounts = [
+            Account.objects.create(user=test_user,
+                                   expired_date=datetime.datetime.now())
+            for test_user in self.test_users]
+        self._add_filter(TestUser, Q(username__in=['user1', 'user11']))
+        self._add_filter(Account, Q(user__username__endswith='2'))
+
+    def _add_filter(self, model, q):
+        FilterPermissionModel.objects.create(
+            user=self.me,
+            content_type=ContentType.objects.get_for_model(model),
+            filter=QSerializer(base64=True).dumps(q))
+
+    def test_filter_permitted(self):
+        objects = self.accounts + self.test_users + [self.me]
+        ContentType.objects.get_for_model(User)
+        with self.assertNumQueries(2):
+            permitted = FilterPermission.filter_permitted(self.me, objects)
+        self.assertEqual(
+            permitted,
+            [self.accounts[2], self.accounts[12], self.test_users[1],
+             self.test_users[11], self.me])
+
+    def test_superuser(self):
+        admin = User.objects.create_superuser('admin', '', 'admin')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                FilterPermission.filter_permitted(admin, self.accounts),
+                self.accounts)
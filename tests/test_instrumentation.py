@@ -0,0 +1,83 @@
+from rest_framework_fine_permissions import instrumentation
+from rest_framework_fine_permissions.instrumentation import (
+    BaseInstrumentation, PermissionStatsMiddleware, TimingInstrumentation,
+    get_instrumentation, get_stats, phase_finished, reset_stats)
+
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.test import TestCase, override_settings
+
+from . import serializers
+from . import utils
+
+TIMING = 'rest_framework_fine_permissions.instrumentation.TimingInstrumentation'
+
+
+class TestInstrumentation(TestCase):
+
+    """ Test the measure of the permission resolution. """
+
+    def setUp(self):
+        self.user = utils.create_user()
+        self.request = HttpRequest()
+        self.request.user = self.user
+        utils.add_field_permission(self.user, 'tests', 'account', 'user')
+        reset_stats()
+        cache.clear()
+
+    def tearDown(self):
+        instrumentation._instrumentation = None
+
+    def _get_fields(self):
+        return serializers.AccountSerializer(
+            context={'request': self.request}).get_fields()
+
+    def test_default_does_nothing(self):
+        instrumentation = get_instrumentation()
+        self.assertIs(type(instrumentation), BaseInstrumentation)
+        self.assertIs(instrumentation.phase('get_fields'),
+                      instrumentation.phase('object_check'))
+        self._get_fields()
+        self.assertEqual(get_stats().as_dict(),
+                         {'phases': {}, 'caches': {}})
+
+    @override_settings(FINE_PERMISSIONS_INSTRUMENTATION=TIMING)
+    def test_phases(self):
+        self.assertIsInstance(get_instrumentation(), TimingInstrumentation)
+        self._get_fields()
+        phases = get_stats().as_dict()['phases']
+        self.assertEqual(phases['get_fields']['calls'], 1)
+        self.assertEqual(phases['allowed_fields']['queries'], 1)
+        self.assertEqual(phases['get_fields']['queries'], 1)
+
+    @override_settings(FINE_PERMISSIONS_INSTRUMENTATION=TIMING,
+                       FINE_PERMISSIONS_CACHE='default')
+    def test_cache_hit_rate(self):
+        self._get_fields()
+        self.request = HttpRequest()
+        self.request.user = self.user
+        self._get_fields()
+        self.assertEqual(get_stats().hit_rate('fields'), 0.5)
+
+    @override_settings(FINE_PERMISSIONS_INSTRUMENTATION=TIMING)
+    def test_signal(self):
+        received = []
+
+        def receiver(sender, phase, duration, queries, **kwargs):
+            received.append((phase, queries))
+
+        phase_finished.connect(receiver)
+        try:
+            self._get_fields()
+        finally:
+            phase_finished.disconnect(receiver)
+        self.assertEqual(received,
+                         [('allowed_fields', 1), ('get_fields', 1)])
+
+    def test_middleware(self):
+        middleware = PermissionStatsMiddleware(lambda r: HttpResponse())
+        get_stats().phases['get_fields'][0] += 1
+        middleware(self.request)
+        self.assertIs(self.request.permission_stats, get_stats())
+        self.assertEqual(self.request.permission_stats.as_dict()['phases'],
+                         {})
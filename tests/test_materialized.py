@@ -0,0 +1,114 @@
+from io import StringIO
+
+from rest_framework_fine_permissions import models
+from rest_framework_fine_permissions.materialized import (
+    compute_effective_permissions, rebuild)
+from rest_framework_fine_permissions.snapshot import PermissionSnapshot
+
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from . import utils
+from .models import Account, Card
+
+
+@override_settings(FINE_PERMISSIONS_MATERIALIZE=True)
+class TestMaterializedPermissions(TestCase):
+
+    """ Test the table of the effective field permissions. """
+
+    def setUp(self):
+        self.user = utils.create_user()
+        self.group = Group.objects.create(name='readers')
+        self.user.groups.add(self.group)
+        utils.add_field_permission(self.user, 'tests', 'account', 'user')
+        utils.add_group_field_permission(self.group, 'tests', 'account',
+                                         'id')
+        utils.add_group_field_permission(self.group, 'tests', 'card', 'id')
+        self.account_ct = ContentType.objects.get_for_model(Account)
+        ContentType.objects.get_for_model(Card)
+
+    def _rows(self):
+        return {
+            (ct_id, tuple(names)) for ct_id, names in
+            models.EffectiveFieldPermissions.objects.filter(
+                user=self.user).values_list('content_type_id', 'names')}
+
+    def _allowed_fields(self, model):
+        return PermissionSnapshot(self.user).get_allowed_fields(model)
+
+    def test_single_query(self):
+        snapshot = PermissionSnapshot(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(snapshot.get_allowed_fields(Account),
+                             {'user', 'id'})
+            self.assertEqual(snapshot.get_allowed_fields(Card), {'id'})
+
+    def test_same_as_computed(self):
+        with self.settings(FINE_PERMISSIONS_MATERIALIZE=False):
+            expected = {model: self._allowed_fields(model)
+                        for model in (Account, Card)}
+        self.assertEqual({model: self._allowed_fields(model)
+                          for model in (Account, Card)}, expected)
+
+    def test_remove(self):
+        ufp = models.UserFieldPermissions.objects.get(user=self.user)
+        ufp.permissions.clear()
+        self.assertEqual(self._allowed_fields(Account), {'id'})
+        models.GroupFieldPermissions.objects.get(group=self.group).delete()
+        self.assertEqual(self._rows(), set())
+
+    def test_field_permission_changes(self):
+        fp = models.FieldPermission.objects.get(name='user')
+        fp.name = 'expired_date'
+        fp.save()
+        self.assertEqual(self._allowed_fields(Account),
+                         {'expired_date', 'id'})
+        models.FieldPermission.objects.filter(name='id').delete()
+        self.assertEqual(self._rows(),
+                         {(self.account_ct.pk, ('expired_date',))})
+
+    def test_membership_changes(self):
+        self.user.groups.clear()
+        self.assertEqual(self._allowed_fields(Account), {'user'})
+        self.group.user_set.add(self.user)
+        self.assertEqual(self._allowed_fields(Card), {'id'})
+        self.group.delete()
+        self.assertEqual(self._rows(), {(self.account_ct.pk, ('user',))})
+
+    def test_rebuild(self):
+        rows = self._rows()
+        models.EffectiveFieldPermissions.objects.all().delete()
+        self.assertEqual(rebuild(), 1)
+        self.assertEqual(self._rows(), rows)
+
+        models.EffectiveFieldPermissions.objects.all().delete()
+        out = StringIO()
+        call_command('fine_permissions_rebuild', '--batch-size', '1',
+                     stdout=out)
+        self.assertIn('1 user(s)', out.getvalue())
+        self.assertEqual(self._rows(), rows)
+
+    def test_compute(self):
+        other = utils.create_user('other')
+        other.groups.add(self.group)
+        effective = compute_effective_permissions([self.user.pk, other.pk])
+        self.assertEqual(effective[other.pk][self.account_ct.pk], ['id'])
+        self.assertEqual(effective[self.user.pk][self.account_ct.pk],
+                         ['user', 'id'])
+
+    def test_compute_groups(self):
+        """ The grants of several groups keep the order of the field
+        permissions, without duplicates. """
+        writers = Group.objects.create(name='writers')
+        utils.add_group_field_permission(writers, 'tests', 'account',
+                                         'expired_date')
+        utils.add_group_field_permission(writers, 'tests', 'account', 'id')
+        utils.add_group_field_permission(self.group, 'tests', 'account',
+                                         'cards')
+        self.user.groups.add(writers)
+        effective = compute_effective_permissions([self.user.pk])
+        self.assertEqual(effective[self.user.pk][self.account_ct.pk],
+                         ['user', 'id', 'expired_date', 'cards'])
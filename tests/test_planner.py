@@ -0,0 +1,154 @@
+from rest_framework import generics
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_fine_permissions.filters import RelatedPermissionBackend
+from rest_framework_fine_permissions.models import FilterPermissionModel
+from rest_framework_fine_permissions.planner import (
+    optimize_queryset, plan_relations)
+from rest_framework_fine_permissions.serializers import QSerializer
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test import TestCase, override_settings
+
+from . import serializers
+from . import utils
+from .models import Card, Service
+
+
+class TestRelationsPlanner(TestCase):
+
+    """ Test the relations planned from the fields a user sees. """
+
+    def setUp(self):
+        self.user = utils.create_user()
+        self.request = HttpRequest()
+        self.request.user = self.user
+        services = [utils.create_service(name) for name in ('a', 'b')]
+        for username in ('one', 'two', 'three'):
+            account = utils.create_account(utils.create_user(username))
+            card = utils.create_card(account)
+            card.services.set(services)
+
+    def _add_field_perms(self, app, model, *field_names):
+        for field_name in field_names:
+            utils.add_field_permission(self.user, app, model, field_name)
+
+    def _serializer(self, **kwargs):
+        return serializers.CardSerializer(context={'request': self.request},
+                                          **kwargs)
+
+    def test_plan(self):
+        self._add_field_perms('tests', 'card', 'account', 'service_names',
+                              'services')
+        self._add_field_perms('tests', 'account', 'user', 'cards')
+        plan = plan_relations(self._serializer())
+        self.assertEqual(plan.select_related, ['account', 'account__user'])
+        self.assertEqual(plan.prefetch_related,
+                         ['account__cards', 'services'])
+
+    def test_plan_only_visible_relations(self):
+        self._add_field_perms('tests', 'card', 'id')
+        plan = plan_relations(self._serializer())
+        self.assertEqual(plan.select_related, [])
+        self.assertEqual(plan.prefetch_related, [])
+
+    def test_primary_keys_need_no_join(self):
+        self._add_field_perms('tests', 'card', 'services')
+        self._add_field_perms('tests', 'account', 'user')
+        plan = plan_relations(serializers.AccountSerializer(
+            context={'request': self.request}))
+        self.assertEqual(plan.select_related, ['user'])
+        plan = plan_relations(self._serializer())
+        self.assertEqual(plan.prefetch_related, ['services'])
+
+    def test_no_n_plus_one(self):
+        self._add_field_perms('tests', 'card', 'account', 'service_names')
+        self._add_field_perms('tests', 'account', 'user')
+        self._add_field_perms('tests', 'service', 'name')
+        queryset = optimize_queryset(Card.objects.all(), self._serializer())
+        with self.assertNumQueries(2):
+            data = self._serializer(instance=queryset, many=True).data
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0]['service_names'],
+                         [{'name': 'a'}, {'name': 'b'}])
+
+    def test_backend(self):
+        self._add_field_perms('tests', 'card', 'account')
+        view = generics.ListAPIView.as_view(
+            queryset=Card.objects.all(),
+            serializer_class=serializers.CardSerializer,
+            filter_backends=[RelatedPermissionBackend])
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(2):
+            response = view(request)
+        self.assertEqual(response.data, [{'account': {}}] * 3)
+
+
+class TestColumnPruning(TestRelationsPlanner):
+
+    """ Test loading only the columns a user can see. """
+
+    def test_columns(self):
+        self._add_field_perms('tests', 'card', 'account', 'services')
+        self._add_field_perms('tests', 'account', 'expired_date', 'cards')
+        plan = plan_relations(self._serializer())
+        self.assertEqual(plan.columns, {
+            '': {'id', 'account'},
+            'account': {'id', 'expired_date'},
+            'account__cards': None,
+            'services': {'id'},
+        })
+        self.assertEqual(plan.get_only(), [
+            'account', 'account__expired_date', 'account__id', 'id'])
+
+    def test_computed_fields_are_not_pruned(self):
+        self._add_field_perms('tests', 'account', 'user', 'service_names')
+        plan = plan_relations(serializers.AccountSerializer(
+            context={'request': self.request}))
+        self.assertIsNone(plan.get_only())
+
+    def test_reverse_relation_keeps_foreign_key(self):
+        self._add_field_perms('tests', 'account', 'cards')
+        self._add_field_perms('tests', 'card', 'id')
+        plan = plan_relations(serializers.AccountSerializer(
+            context={'request': self.request}))
+        self.assertEqual(plan.columns['cards'], {'id', 'account'})
+
+    def test_pruned_queryset(self):
+        self._add_field_perms('tests', 'card', 'account', 'service_names')
+        self._add_field_perms('tests', 'account', 'expired_date')
+        self._add_field_perms('tests', 'service', 'name')
+        queryset = optimize_queryset(Card.objects.all(), self._serializer(),
+                                     only=True)
+        with self.assertNumQueries(2):
+            data = self._serializer(instance=queryset, many=True).data
+        self.assertEqual(len(data), 3)
+        self.assertEqual(queryset[0].get_deferred_fields(), set())
+        self.assertEqual(queryset[0].account.get_deferred_fields(),
+                         {'user_id'})
+
+    @override_settings(FINE_PERMISSIONS_PRUNE_COLUMNS=True)
+    def test_backend_keeps_filter_columns(self):
+        self._add_field_perms('tests', 'service', 'id')
+        FilterPermissionModel.objects.create(
+            user=self.user,
+            content_type=ContentType.objects.get_for_model(Service),
+            filter=QSerializer(base64=True).dumps(Q(name='a')))
+        for method, deferred_loading in (
+                ('GET', ({'id', 'name'}, False)),
+                # saving a pruned instance would drop the changes of the
+                # other columns
+                ('PUT', (frozenset(), True))):
+            self.request.method = method
+            request = Request(self.request)
+            request.user = self.user
+            view = generics.ListAPIView(
+                serializer_class=serializers.ServiceSerializer,
+                request=request, format_kwarg=None)
+            queryset = RelatedPermissionBackend().filter_queryset(
+                request, Service.objects.all(), view)
+            self.assertEqual(queryset.query.deferred_loading,
+                             deferred_loading, method)
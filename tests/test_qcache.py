@@ -0,0 +1,111 @@
+from unittest import mock
+
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.qcache import (
+    QCache, compiled_cache, copy_q, filter_digest, load_effective_filter,
+    load_filter, load_granted_filter, q_cache)
+from rest_framework_fine_permissions.serializers import QSerializer
+from rest_framework_fine_permissions.snapshot import FilterGrant
+
+from django.contrib.auth.models import User
+from django.core.exceptions import FieldError
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+
+class TestQCache(TestCase):
+
+    """ Test the cache of decoded filters. """
+
+    def setUp(self):
+        q_cache.clear()
+        self.q = Q(Q(username='arthur') | Q(id__in=[1, 2]))
+        self.data = QSerializer(base64=True).dumps(self.q)
+
+    def test_load_filter(self):
+        q = load_filter(self.data)
+        self.assertEqual(q, QSerializer(base64=True).loads(self.data))
+        self.assertEqual(q_cache.info().misses, 1)
+
+    def test_hits(self):
+        load_filter(self.data)
+        load_filter(self.data)
+        info = q_cache.info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+    def test_hits_are_copies(self):
+        q = load_filter(self.data)
+        q.children[0].children[1][1].append(3)
+        q.children[0].children.append(('username', 'jojo'))
+        self.assertEqual(load_filter(self.data),
+                         QSerializer(base64=True).loads(self.data))
+
+    def test_eviction(self):
+        cache = QCache(maxsize=2)
+        for key in ('a', 'b', 'a', 'c'):
+            cache.set(key, Q(pk=key))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), Q(pk='a'))
+        self.assertEqual(cache.info().currsize, 2)
+
+    @override_settings(FINE_PERMISSIONS_FILTER_CACHE_SIZE=0)
+    def test_disabled(self):
+        load_filter(self.data)
+        self.assertEqual(q_cache.info().currsize, 0)
+
+    def test_copy_q(self):
+        q = Q(Q(a=1) | ~Q(b__in=[2]), c=3)
+        clone = copy_q(q)
+        self.assertEqual(clone, q)
+        self.assertIsNot(clone.children[0], q.children[0])
+
+
+class TestEffectiveFilter(TestCase):
+
+    """ Test the combination of the filters of a user and their groups. """
+
+    def setUp(self):
+        compiled_cache.clear()
+        self.datas = [encode(Q(username='arthur')), encode(Q(pk=1))]
+
+    def test_combined(self):
+        q, plans = load_effective_filter(self.datas, User)
+        self.assertEqual(q, Q(username='arthur') | Q(pk=1))
+        self.assertEqual(set(plans), {'username', 'pk'})
+
+    def test_compiled_once(self):
+        load_effective_filter(self.datas, User)
+        q, _ = load_effective_filter(self.datas[::-1], User)
+        info = compiled_cache.info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+        q.children.append(('username', 'jojo'))
+        self.assertEqual(load_effective_filter(self.datas, User)[0],
+                         Q(username='arthur') | Q(pk=1))
+
+    def test_invalid_filter_grants_nothing(self):
+        invalid = encode(Q(usernme='arthur'))
+        q, _ = load_effective_filter(self.datas[:1] + [invalid], User)
+        self.assertEqual(q, Q(username='arthur'))
+        with self.assertRaises(FieldError):
+            load_effective_filter([invalid, encode(Q(foo=1))], User)
+
+    def test_unrestricted_filter_grants_everything(self):
+        """ An empty filter is not narrowed by the others. """
+        for datas in ([encode(Q())] + self.datas, self.datas + [encode(Q())]):
+            q, plans = load_effective_filter(datas, User)
+            self.assertEqual(q, Q())
+            self.assertEqual(plans, {})
+        User.objects.create(username='bob')
+        self.assertTrue(User.objects.filter(q).exists())
+
+    def test_granted_filter_keyed_by_digest(self):
+        """ The digest of a grant is computed once, when it is loaded. """
+        grants = [FilterGrant(1, data, None, filter_digest(data))
+                  for data in self.datas]
+        with mock.patch('rest_framework_fine_permissions.qcache'
+                        '.filter_digest') as digest:
+            q, _ = load_granted_filter(grants, User)
+        digest.assert_not_called()
+        self.assertEqual(q, Q(username='arthur') | Q(pk=1))
+        self.assertEqual(load_granted_filter(grants[:1] + [
+            FilterGrant(2, self.datas[1], None)], User)[0], q)
@@ -0,0 +1,142 @@
+from io import StringIO
+from unittest import mock
+
+from rest_framework_fine_permissions import qcache
+from rest_framework_fine_permissions.codec import decode_plans, encode
+from rest_framework_fine_permissions.evaluator import matches
+from rest_framework_fine_permissions.filters import FilterPermissionBackend
+from rest_framework_fine_permissions.models import (
+    FilterPermissionModel, GroupFilterPermissionModel)
+from rest_framework_fine_permissions.permissions import FilterPermission
+from rest_framework_fine_permissions.qcache import (
+    load_resolved_filter, plan_cache)
+from rest_framework_fine_permissions.resolver import (
+    LookupPlan, resolve_filter, resolve_lookup)
+from rest_framework_fine_permissions.serializers import QSerializer
+
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test import TestCase
+
+from tests.models import Account, Card
+
+
+class TestResolver(TestCase):
+
+    """ Test the resolution of the lookups. """
+
+    def test_resolve_lookup(self):
+        self.assertEqual(
+            resolve_lookup(Card, 'account__user__username__istartswith'),
+            LookupPlan(('account', 'user'), 'username', (), 'istartswith'))
+        self.assertEqual(resolve_lookup(Card, 'account__in'),
+                         LookupPlan((), 'account', (), 'in'))
+        self.assertEqual(resolve_lookup(Account, 'cards__id__gt'),
+                         LookupPlan(('cards',), 'id', (), 'gt'))
+        self.assertEqual(resolve_lookup(Account, 'expired_date__year'),
+                         LookupPlan((), 'expired_date', ('year',), 'exact'))
+        self.assertEqual(resolve_lookup(User, 'pk'),
+                         LookupPlan((), 'pk', (), 'exact'))
+
+    def test_invalid_lookup(self):
+        for lookup in ('usernme', 'username__foo', 'account__usr',
+                       'expired_date__year__foo'):
+            with self.assertRaises(FieldError):
+                resolve_lookup(Account, lookup)
+
+    def test_resolve_filter(self):
+        plans = resolve_filter(Q(username='a') | ~Q(id__in=[1]), User)
+        self.assertEqual(set(plans), {'username', 'id__in'})
+        self.assertEqual(decode_plans(encode(Q(), plans)), plans)
+
+    def test_evaluate_with_plans(self):
+        user = User(pk=1, username='a')
+        q = Q(username='a') | Q(groups__name='b')
+        plans = resolve_filter(q, User)
+        self.assertTrue(matches(q, user, plans))
+
+
+class TestResolvedFilter(TestCase):
+
+    """ Test the use of the plans at runtime. """
+
+    def setUp(self):
+        plan_cache.clear()
+        self.me = User.objects.create(username='morgan')
+        User.objects.create(username='arthur')
+        self.user_ct = ContentType.objects.get_for_model(User)
+        self.request = HttpRequest()
+        self.request.user = self.me
+
+    def _create(self, data):
+        return FilterPermissionModel.objects.create(
+            user=self.me, content_type=self.user_ct, filter=data)
+
+    def test_stored_plans(self):
+        q = Q(username='arthur')
+        data = encode(q, resolve_filter(q, User))
+        with mock.patch.object(qcache, 'resolve_filter') as resolve:
+            self.assertEqual(load_resolved_filter(data, User)[0], q)
+        resolve.assert_not_called()
+
+    def test_resolved_once(self):
+        data = QSerializer(base64=True).dumps(Q(username='arthur'))
+        with mock.patch.object(qcache, 'resolve_filter',
+                               wraps=resolve_filter) as resolve:
+            load_resolved_filter(data, User)
+            load_resolved_filter(data, User)
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_invalid_filter_denies(self):
+        self._create(encode(Q(usernme='arthur')))
+        queryset = FilterPermissionBackend().filter_queryset(
+            self.request, User.objects.all(), None)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(queryset), [])
+        self.assertFalse(FilterPermission().has_object_permission(
+            self.request, None, self.me))
+
+
+class TestCheckFiltersCommand(TestCase):
+
+    """ Test the fine_permissions_check_filters command. """
+
+    def setUp(self):
+        self.me = User.objects.create(username='morgan')
+        self.user_ct = ContentType.objects.get_for_model(User)
+
+    def test_valid(self):
+        fpm = FilterPermissionModel.objects.create(
+            user=self.me, content_type=self.user_ct,
+            filter=QSerializer(base64=True).dumps(Q(username='arthur')))
+        out = StringIO()
+        call_command('fine_permissions_check_filters', '--update', stdout=out)
+        self.assertIn('valid', out.getvalue())
+        fpm.refresh_from_db()
+        self.assertEqual(decode_plans(fpm.filter), {
+            'username': LookupPlan((), 'username', (), 'exact')})
+
+    def test_invalid(self):
+        FilterPermissionModel.objects.create(
+            user=self.me, content_type=self.user_ct,
+            filter=encode(Q(usernme='arthur')))
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('fine_permissions_check_filters', stderr=err)
+        self.assertIn('usernme', err.getvalue())
+
+    def test_invalid_group(self):
+        group = Group.objects.create(name='readers')
+        gfpm = GroupFilterPermissionModel.objects.create(
+            group=group, content_type=self.user_ct,
+            filter=encode(Q(usernme='arthur')))
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('fine_permissions_check_filters', stderr=err)
+        self.assertIn('Group filter permission %s' % gfpm.pk, err.getvalue())
+        self.assertIn('usernme', err.getvalue())
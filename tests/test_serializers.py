@@ -1,7 +1,9 @@
 import collections
+from unittest import mock
 
 from rest_framework.utils.model_meta import get_field_info
 from rest_framework_fine_permissions import fields
+from rest_framework_fine_permissions.serializers import _serializer_metadata
 
 from django.http import HttpRequest
 from django.test import TestCase
@@ -105,7 +107,7 @@ class TestModelSerializer(TestCase, ModelSerializerTestMixin):
         self._add_field_perms('tests', 'account', 'id', 'user', 'is_expired',
                               'cards')
         ser = self._get_serializer_instance()
-        fields = [field.name for field in ser._get_user_allowed_fields()]
+        fields = ser._get_user_allowed_fields()
         self.assertEqual(set(fields), {'user', 'is_expired', 'id', 'cards'})
 
     def test_get_field_for_superuser(self):
@@ -134,6 +136,51 @@ class TestModelSerializer(TestCase, ModelSerializerTestMixin):
         self.assertIsInstance(fields, collections.OrderedDict)
         self.assertEqual(set(fields), {'user'})
 
+    def test_only_allowed_fields_are_built(self):
+        """ Test that the fields the user can't access are never built. """
+        self._add_field_perms('tests', 'account', 'expired_date')
+        ser = self._get_serializer_instance()
+        with mock.patch.object(self.Serializer, 'build_field',
+                               wraps=ser.build_field) as build_field:
+            fields = ser.get_fields()
+        self.assertEqual(list(fields), ['expired_date'])
+        self.assertEqual(build_field.call_count, 1)
+
+    def test_serializer_metadata_cached(self):
+        """ Test that class metadata is computed once. """
+        self._add_field_perms('tests', 'account', 'user')
+        self._get_serializer_instance().get_fields()
+        info, field_names, extra_kwargs = \
+            _serializer_metadata[self.Serializer]
+        with mock.patch.object(self.Serializer, 'get_field_names') as names:
+            self._get_serializer_instance().get_fields()
+        names.assert_not_called()
+        self.assertIn('service_names', field_names)
+
+    def test_serializer_metadata_dynamic(self):
+        """ Test that overridden hooks are called for each instance. """
+        class DynamicSerializer(self.Serializer):
+            def get_field_names(self, declared_fields, info):
+                return self.context['fields']
+
+        self._add_field_perms('tests', 'account', 'user', 'expired_date')
+        self._auth_user()
+        for names in (['user'], ['expired_date']):
+            ser = DynamicSerializer(
+                context={'request': self.request, 'fields': names})
+            self.assertEqual(list(ser.get_fields()), names)
+        self.assertNotIn(DynamicSerializer, _serializer_metadata)
+
+    def test_depth_bounds(self):
+        """ Test that the depth is checked as by ModelSerializer. """
+        class DeepSerializer(self.Serializer):
+            class Meta(self.Serializer.Meta):
+                depth = 11
+
+        self._auth_user()
+        with self.assertRaises(AssertionError):
+            DeepSerializer(context={'request': self.request}).get_fields()
+
 
 class TestNestedRelations(TestCase, ModelSerializerTestMixin):
 
@@ -0,0 +1,148 @@
+import sys
+
+from rest_framework_fine_permissions.filters import FilterPermissionBackend
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.models import (
+    FilterPermissionModel, GroupFilterPermissionModel)
+from rest_framework_fine_permissions.permissions import FilterPermission
+from rest_framework_fine_permissions.serializers import QSerializer
+from rest_framework_fine_permissions.snapshot import (
+    PermissionSnapshot, get_permission_snapshot)
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test import TestCase, override_settings
+
+from . import serializers
+from . import utils
+from .models import Account, Card
+
+
+class TestPermissionSnapshot(TestCase):
+
+    """ Test the per-request permission snapshot. """
+
+    def setUp(self):
+        self.user = utils.create_user()
+        self.request = HttpRequest()
+        self.request.user = self.user
+        utils.add_field_permission(self.user, 'tests', 'account', 'user')
+        utils.add_field_permission(self.user, 'tests', 'card', 'account')
+        FilterPermissionModel.objects.create(
+            user=self.user,
+            content_type=ContentType.objects.get_by_natural_key(
+                'auth', 'user'),
+            filter=QSerializer(base64=True).dumps(Q(username='test')))
+        ContentType.objects.get_for_model(User)
+
+    def test_field_permissions(self):
+        snapshot = PermissionSnapshot(self.user)
+        with self.assertNumQueries(1):
+            account_perms = snapshot.get_allowed_fields(Account)
+            card_perms = snapshot.get_allowed_fields(Card)
+            self.assertEqual(snapshot.get_allowed_fields(User), set())
+        self.assertEqual(account_perms, {'user'})
+        self.assertEqual(card_perms, {'account'})
+
+    def test_group_field_permissions(self):
+        group = Group.objects.create(name='readers')
+        other_group = Group.objects.create(name='writers')
+        utils.add_group_field_permission(group, 'tests', 'account', 'id')
+        utils.add_group_field_permission(group, 'tests', 'account', 'user')
+        utils.add_group_field_permission(other_group, 'tests', 'card', 'id')
+        self.user.groups.add(group, other_group)
+
+        snapshot = PermissionSnapshot(self.user)
+        with self.assertNumQueries(2):
+            self.assertEqual(snapshot.get_allowed_fields(Account),
+                             {'user', 'id'})
+            self.assertEqual(snapshot.get_allowed_fields(Card),
+                             {'account', 'id'})
+        self.assertEqual(snapshot.group_ids, {group.pk, other_group.pk})
+
+    @override_settings(FINE_PERMISSIONS_CACHE='default')
+    def test_group_field_permissions_shared(self):
+        cache.clear()
+        group = Group.objects.create(name='readers')
+        utils.add_group_field_permission(group, 'tests', 'account', 'id')
+        self.user.groups.add(group)
+        other = utils.create_user('other')
+        other.groups.add(group)
+
+        PermissionSnapshot(self.user).get_allowed_fields(Account)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                PermissionSnapshot(other).get_allowed_fields(Account), {'id'})
+
+    def test_allowed_fields_shared(self):
+        other = utils.create_user('other')
+        utils.add_field_permission(other, 'tests', 'account', 'user')
+        names = PermissionSnapshot(self.user).get_allowed_fields(Account)
+        self.assertIsInstance(names, frozenset)
+        self.assertIs(PermissionSnapshot(other).get_allowed_fields(Account),
+                      names)
+        self.assertIs(next(iter(names)), sys.intern(''.join(['us', 'er'])))
+
+    def test_filter_permissions(self):
+        snapshot = PermissionSnapshot(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(snapshot.get_filter_permissions(User)), 1)
+            self.assertEqual(snapshot.get_filter_permissions(Account), [])
+
+    def test_group_filter_permissions(self):
+        user_ct = ContentType.objects.get_for_model(User)
+        group = Group.objects.create(name='readers')
+        other_group = Group.objects.create(name='writers')
+        for name, g in (('other', group), ('another', other_group)):
+            GroupFilterPermissionModel.objects.create(
+                group=g, content_type=user_ct, filter=encode(Q(username=name)))
+        self.user.groups.add(group, other_group)
+        other = utils.create_user('other')
+        utils.create_user('another')
+        utils.create_user('nobody')
+
+        snapshot = get_permission_snapshot(self.request)
+        with self.assertNumQueries(1):
+            grants = snapshot.get_filter_permissions(User)
+        self.assertEqual([grant.group_id for grant in grants],
+                         [None, group.pk, other_group.pk])
+
+        queryset = FilterPermissionBackend().filter_queryset(
+            self.request, User.objects.order_by('username'), None)
+        self.assertEqual([u.username for u in queryset],
+                         ['another', 'other', 'test'])
+        self.assertTrue(FilterPermission().has_object_permission(
+            self.request, None, other))
+
+    def test_shared_by_request(self):
+        snapshot = get_permission_snapshot(self.request)
+        self.assertIs(get_permission_snapshot(self.request), snapshot)
+
+    def test_rebuilt_for_another_user(self):
+        snapshot = get_permission_snapshot(self.request)
+        self.request.user = utils.create_user('other')
+        self.assertIsNot(get_permission_snapshot(self.request), snapshot)
+
+    def test_shared_by_context(self):
+        context = {'user': self.user}
+        snapshot = get_permission_snapshot(user=self.user, context=context)
+        self.assertIs(
+            get_permission_snapshot(user=self.user, context=context),
+            snapshot)
+
+    def test_shared_by_components(self):
+        """ Filters, permissions and serializers share the same queries. """
+        backend = FilterPermissionBackend()
+        permission = FilterPermission()
+        with self.assertNumQueries(2):
+            queryset = backend.filter_queryset(
+                self.request, User.objects.all(), None)
+            self.assertTrue(permission.has_object_permission(
+                self.request, None, self.user))
+            ser = serializers.AccountSerializer(
+                context={'request': self.request})
+            self.assertEqual(set(ser.get_fields()), {'user'})
+        self.assertEqual(list(queryset), [self.user])
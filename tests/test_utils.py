@@ -1,6 +1,10 @@
+from pathlib import Path
+
 from rest_framework_fine_permissions import utils
+from rest_framework_fine_permissions.fields import ModelPermissionsField
 
 from django.test import TestCase
+from django.utils.autoreload import file_changed
 
 from . import serializers as test_serializers
 from .models import Account
@@ -50,3 +54,29 @@ class TestUtilities(TestCase):
                 'user', 'expired_date', 'cards', 'is_expired', 'expired_date',
                 'full_name', 'service_names'
             })
+
+    def test_registry_built_once(self):
+        """ Test the registry is shared until it is cleared. """
+        registry = utils.get_registry()
+        self.assertIs(utils.get_registry(), registry)
+        self.assertIs(utils.get_field_permissions(),
+                      registry.field_permissions)
+        self.assertIn(
+            ('tests.account.user', 'tests | account | user'),
+            registry.choices)
+        self.assertEqual(registry.serializers['tests.account.user'],
+                         'tests.serializers.AccountSerializer')
+
+        file_changed.send(sender=None, file_path=Path('serializers.py'))
+        self.assertIsNot(utils.get_registry(), registry)
+
+    def test_registry_nested_serializer_not_found(self):
+        """ Test a nested serializer that can't be loaded is skipped. """
+        fields = {'user': None,
+                  'cards': ModelPermissionsField('tests.NoSuchSerializer')}
+        with self.assertLogs(utils.logger, 'ERROR'):
+            registry = utils.FieldPermissionsRegistry({'tests.account': (
+                fields, 'tests.serializers.AccountSerializer')})
+        self.assertEqual(registry.choices,
+                         [('tests.account.user', 'tests | account | user')])
+        self.assertEqual(registry.nested_serializers, {})
@@ -1,5 +1,7 @@
 import json
+from unittest import mock
 
+from rest_framework_fine_permissions import views
 from rest_framework_fine_permissions.models import UserFieldPermissions
 
 from django.contrib import messages
@@ -7,11 +9,13 @@ from django.contrib.messages.storage.cookie import (
     CookieStorage, MessageDecoder, MessageEncoder,
 )
 from django.contrib.messages import get_messages
+from django.contrib.contenttypes.models import ContentType
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpRequest
 from django.test import TestCase
 
 from . import utils
+from .models import Account
 
 
 class TestViews(TestCase):
@@ -70,6 +74,81 @@ class TestViews(TestCase):
             ]
         )
 
+    def test_permissions_export_jsonl(self):
+        self._add_field_perms('tests', 'account', 'id', 'user')
+        other = utils.create_user('other')
+        utils.add_field_permission(other, 'tests', 'card', 'id')
+        self.client.login(username='supertest', password='pass')
+
+        response = self.client.get('/drffp/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(
+            response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([record['username'] for record in records],
+                         ['test', 'other'])
+
+        response = self.client.get('/drffp/export/?username=other&filters=1')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), {
+            'username': 'other',
+            'fields_permissions': [
+                {'app_label': 'tests', 'model': 'card', 'name': 'id'}],
+            'filters_permissions': [],
+        })
+
+        response = self.client.get('/drffp/export/?username=other&filters=0')
+        self.assertNotIn('filters_permissions',
+                         json.loads(b''.join(response.streaming_content)))
+
+    def test_permissions_export_jsonl_unauthorized(self):
+        self.client.login(username='test', password='pass')
+        response = self.client.get('/drffp/export/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_field_permission_choices(self):
+        self.client.login(username='supertest', password='pass')
+
+        response = self.client.get('/drffp/choices/fields/',
+                                   {'app_label': 'tests', 'model': 'account'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertIn({'id': 'tests.account.user',
+                       'text': 'tests | account | user'}, results)
+        self.assertTrue(all(result['id'].startswith('tests.account.')
+                            for result in results))
+
+        response = self.client.get('/drffp/choices/fields/',
+                                   {'term': 'account | exp'})
+        self.assertEqual(
+            [result['id'] for result in response.json()['results']],
+            ['tests.account.expired_date'])
+
+    def test_field_permission_choices_pages(self):
+        self.client.login(username='supertest', password='pass')
+        with mock.patch.object(views, 'PAGE_SIZE', 2):
+            first = self.client.get('/drffp/choices/fields/').json()
+            second = self.client.get('/drffp/choices/fields/',
+                                     {'page': 2}).json()
+        self.assertTrue(first['pagination']['more'])
+        self.assertEqual(len(first['results']), 2)
+        self.assertNotEqual(first['results'], second['results'])
+
+    def test_field_permission_choices_unauthorized(self):
+        self.client.login(username='test', password='pass')
+        response = self.client.get('/drffp/choices/fields/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_content_type_choices(self):
+        self.client.login(username='supertest', password='pass')
+        response = self.client.get('/drffp/choices/content-types/',
+                                   {'term': 'tests | acc'})
+        self.assertEqual(response.json(), {
+            'results': [{
+                'id': ContentType.objects.get_for_model(Account).pk,
+                'text': 'tests | account'}],
+            'pagination': {'more': False},
+        })
+
     def test_permissions_import_json_missing_file(self):
         self.client.login(username='supertest', password='pass')
         self._add_field_perms('tests', 'account', 'expired_date')
@@ -186,3 +265,24 @@ class TestViews(TestCase):
             [str(p) for p in permissions],
             ['tests | account | id', 'tests | account | user']
         )
+
+    def test_permissions_import_jsonl(self):
+        self.client.login(username='supertest', password='pass')
+        utils.create_user('other')
+        permissions_str = ''.join(json.dumps({
+            'username': username,
+            'fields_permissions': [
+                {'app_label': 'tests', 'model': 'account', 'name': name}
+                for name in ('id', 'user', 'expired_date')],
+        }) + '\n' for username in ('test', 'other'))
+        f = SimpleUploadedFile('file.jsonl', permissions_str.encode('utf-8'),
+                               content_type='application/x-ndjson')
+        response = self.client.post('/drffp/import/', {'perms_upload': f})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            response.url,
+            '/admin/rest_framework_fine_permissions/userfieldpermissions/')
+        for username in ('test', 'other'):
+            ufp = UserFieldPermissions.objects.get(user__username=username)
+            self.assertEqual(ufp.permissions.count(), 3)
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from io import StringIO
+
+from rest_framework_fine_permissions.codec import encode
+from rest_framework_fine_permissions.models import (
+    FilterPermissionModel, GroupFilterPermissionModel)
+from rest_framework_fine_permissions.snapshot import PermissionSnapshot
+from rest_framework_fine_permissions.warmup import warm
+
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import utils
+from .models import Account, Card
+
+
+@override_settings(FINE_PERMISSIONS_CACHE='default')
+class TestWarmUp(TestCase):
+
+    """ Test the loading of the permissions into the cache. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = utils.create_user()
+        self.other = utils.create_user('other')
+        self.group = Group.objects.create(name='readers')
+        self.user.groups.add(self.group)
+        utils.add_field_permission(self.user, 'tests', 'account', 'user')
+        utils.add_group_field_permission(self.group, 'tests', 'account', 'id')
+        utils.add_field_permission(self.other, 'tests', 'card', 'account')
+        user_ct = ContentType.objects.get_for_model(User)
+        FilterPermissionModel.objects.create(
+            user=self.user, content_type=user_ct,
+            filter=encode(Q(username='test')))
+        GroupFilterPermissionModel.objects.create(
+            group=self.group, content_type=user_ct,
+            filter=encode(Q(username='other')))
+
+    def _assert_cached(self, user):
+        expected = PermissionSnapshot(user)
+        fields = {model: set(expected.field_permissions.get(
+            model._meta.label_lower, ())) for model in (Account, Card)}
+        filters = expected._load_filter_permissions()['auth.user']
+        snapshot = PermissionSnapshot(user)
+        with self.assertNumQueries(0):
+            for model, names in fields.items():
+                self.assertEqual(snapshot.get_allowed_fields(model), names)
+            self.assertEqual(snapshot.get_filter_permissions(User), filters)
+
+    def test_warm(self):
+        self.assertEqual(warm(batch_size=1), 2)
+        self._assert_cached(self.user)
+        with self.assertNumQueries(0):
+            snapshot = PermissionSnapshot(self.other)
+            self.assertEqual(snapshot.get_allowed_fields(Account), set())
+            self.assertEqual(snapshot.get_allowed_fields(Card), {'account'})
+            self.assertEqual(snapshot.get_filter_permissions(User), [])
+
+    def test_since(self):
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now())
+        self.assertEqual(warm(since=timezone.now() - timedelta(days=1)), 1)
+        self._assert_cached(self.user)
+        with self.assertNumQueries(1):
+            PermissionSnapshot(self.other).get_allowed_fields(Card)
+
+    def test_filter_change(self):
+        warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            GroupFilterPermissionModel.objects.get(group=self.group).delete()
+        with self.assertNumQueries(1):
+            grants = PermissionSnapshot(self.user).get_filter_permissions(
+                User)
+        self.assertEqual([grant.group_id for grant in grants], [None])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('fine_permissions_warm', '--since', '2000-01-01',
+                     stdout=out)
+        self.assertEqual(out.getvalue().strip(),
+                         'Permissions of 0 user(s) cached')
+        with self.settings(FINE_PERMISSIONS_CACHE=None):
+            with self.assertRaises(CommandError):
+                call_command('fine_permissions_warm')
+
+    @override_settings(FINE_PERMISSIONS_PRELOAD_ON_LOGIN=True)
+    def test_preload_on_login(self):
+        self.client.force_login(self.user)
+        self._assert_cached(self.user)
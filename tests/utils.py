@@ -43,6 +43,15 @@ def add_field_permission(user, app_label, model_name, field_name):
     ufp.permissions.add(fp)
 
 
+def add_group_field_permission(group, app_label, model_name, field_name):
+    """ Add permissions for field on an app model to a group. """
+    ct = ContentType.objects.get_by_natural_key(app_label, model_name)
+    fp = models.FieldPermission.objects.get_or_create(content_type=ct,
+                                                      name=field_name)[0]
+    gfp = models.GroupFieldPermissions.objects.get_or_create(group=group)[0]
+    gfp.permissions.add(fp)
+
+
 def remove_all_field_permissions(user):
     """ Remove all field permissions for user. """
     ufp = models.UserFieldPermissions.objects.filter(user=user)